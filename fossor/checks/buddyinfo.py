@@ -1,29 +1,96 @@
 # Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
 # See LICENSE in the project root for license information.
 
+import os
+
+from collections import namedtuple
+
 from fossor.checks.check import Check
 import humanfriendly
 
+Zone = namedtuple('Zone', 'node, name, free_counts')
+
 
 class BuddyInfo(Check):
-    '''Checks for memory fragmentation using the /proc/buddyinfo file'''
+    '''
+    Checks for memory fragmentation using the /proc/buddyinfo file.
+
+    For each node and zone the kernel's fragmentation index is calculated for an allocation of one page block
+    (e.g. a 2 MiB huge page), the same value as /sys/kernel/debug/extfrag/extfrag_index. Values towards 1 mean such an
+    allocation would fail due to fragmentation, values towards 0 mean it would fail due to a lack of free memory and
+    -1 means the allocation can be satisfied from free memory.
+    '''
+
+    BUDDYINFO_PATH = '/proc/buddyinfo'
+    PAGETYPEINFO_PATH = '/proc/pagetypeinfo'
+    VMSTAT_PATH = '/proc/vmstat'
+
+    ZONES = ('DMA32', 'Normal', 'Movable')
+    FRAGMENTATION_ALERT = 0.5  # Same as the kernel's default vm.extfrag_threshold of 500
+    DEFAULT_PAGE_BLOCK_ORDER = 9  # Used when /proc/pagetypeinfo is not readable, it is only readable by root on newer kernels
+    COMPACTION_COUNTERS = ('compact_stall', 'compact_fail', 'compact_success')
+    lightweight = True
+
     def __init__(self):
-        self.zero_threshold = 9
+        self.zones = []
+        self.buddy_info_raw = ''
+        self.page_block_order = self.DEFAULT_PAGE_BLOCK_ORDER
 
     def run(self, variables):
-        out, err, return_code = self.shell_call('cat /proc/buddyinfo')
-        self.buddy_info_raw = out
-        self.buddy_info_lines = [line for line in self.buddy_info_raw.split('\n') if 'Normal' in line]
+        with open(self.BUDDYINFO_PATH) as f:
+            self.buddy_info_raw = f.read()
+        self.zones = self.parse_buddyinfo(self.buddy_info_raw)
+        self.page_block_order = order = self._get_page_block_order()
+        page_size = self._getpagesize()
+
         result = ''
         if self.fragmentation():
             result += "Possible memory fragmentation\n"
         else:
             result += "No significant memory fragmentation\n"
-        result += f"Smallest Page Size for system is {self._getpagesize()}\n" \
+        result += f"Smallest Page Size for system is {page_size}\n" \
                   f"Therefore, each columns pagesize is: {self._get_column_sizes_human_readable()}\n"
-        result += "Output of 'cat /proc/buddyinfo' is:\n" + self.buddy_info_raw
+        result += f"Fragmentation index for {humanfriendly.format_size((2**order) * page_size, binary=True)} (order {order}) allocations:\n"
+        for zone in self.zones:
+            if zone.name in self.ZONES:
+                result += f"Node {zone.node}, zone {zone.name}: fragmentation index={self.fragmentation_index(zone.free_counts, order):.3f}, " \
+                          f"unusable free space index={self.unusable_index(zone.free_counts, order):.3f}\n"
+        compaction = self._get_compaction_counters()
+        if compaction:
+            result += "Compaction: " + ', '.join(f"{name}={value}" for name, value in compaction.items()) + "\n"
+        result += f"Contents of {self.BUDDYINFO_PATH}:\n" + self.buddy_info_raw
         return result
 
+    def parse_buddyinfo(self, text):
+        '''Return a Zone for each line, e.g. 'Node 0, zone   Normal   1372  95320  85260  28831  45988  38962 ...' '''
+        zones = []
+        for line in text.splitlines():
+            node, _, rest = line.partition(',')
+            fields = rest.split()
+            if len(fields) < 2 or fields[0] != 'zone':
+                continue
+            zones.append(Zone(node=int(node.split()[1]), name=fields[1], free_counts=[int(value) for value in fields[2:]]))
+        return zones
+
+    def fragmentation_index(self, free_counts, order) -> float:
+        '''Port of the kernel's __fragmentation_index from mm/vmstat.c, scaled to -1..1 instead of -1000..1000'''
+        requested = 2**order
+        free_blocks_total = sum(free_counts)
+        if not free_blocks_total:
+            return 0
+        if sum(free_counts[order:]):
+            return -1
+        free_pages = sum(count << o for o, count in enumerate(free_counts))
+        return (1000 - (1000 + free_pages * 1000 // requested) // free_blocks_total) / 1000
+
+    def unusable_index(self, free_counts, order) -> float:
+        '''Fraction of free memory that is in blocks too small for an allocation of the given order'''
+        free_pages = sum(count << o for o, count in enumerate(free_counts))
+        if not free_pages:
+            return 1
+        suitable_pages = sum(count << o for o, count in enumerate(free_counts) if o >= order)
+        return (free_pages - suitable_pages) / free_pages
+
     def _get_column_sizes_human_readable(self):
         column_count = self._get_columns_len()
         page_size = self._getpagesize()
@@ -36,26 +103,47 @@ class BuddyInfo(Check):
 
     def _getpagesize(self):
         '''Return int of the page size for OS'''
-        out, err, return_code = self.shell_call('getconf PAGE_SIZE')
-        return int(out.strip())
+        return os.sysconf('SC_PAGE_SIZE')
+
+    def _get_page_block_order(self):
+        '''Return the page block order from the first line of /proc/pagetypeinfo, e.g. 'Page block order: 9' '''
+        try:
+            with open(self.PAGETYPEINFO_PATH) as f:
+                name, _, value = f.readline().partition(':')
+            if name == 'Page block order':
+                return int(value)
+        except (OSError, ValueError) as e:
+            self.log.debug(f"Unable to read the page block order from {self.PAGETYPEINFO_PATH}: {e}")
+        return self.DEFAULT_PAGE_BLOCK_ORDER
+
+    def _get_compaction_counters(self):
+        '''Return compaction counters from /proc/vmstat if compaction has stalled allocations since boot'''
+        counters = {}
+        try:
+            with open(self.VMSTAT_PATH) as f:
+                for line in f:
+                    name, _, value = line.partition(' ')
+                    if name in self.COMPACTION_COUNTERS:
+                        counters[name] = int(value)
+        except (OSError, ValueError) as e:
+            self.log.debug(f"Unable to read compaction counters from {self.VMSTAT_PATH}: {e}")
+            return {}
+        if not counters.get('compact_stall'):
+            return {}
+        return {name: counters[name] for name in self.COMPACTION_COUNTERS if name in counters}
 
     def _get_columns_len(self):
         '''Get number of columns for first row'''
-        for line in self.buddy_info_lines:
-            values_str = line.split('Normal')[1]
-            columns = values_str.split()
-            return len(columns)
+        for zone in self.zones:
+            return len(zone.free_counts)
+        return 0
 
     def should_notify(self):
         return self.fragmentation()
 
     def fragmentation(self):
-        for line in self.buddy_info_lines:
-            # line example 'Node 0, zone   Normal   1372  95320  85260  28831  45988  38962  24612  15433   8342     85   2723 '
-            values_str = line.split('Normal')[1]
-            values = [int(value) for value in values_str.split()]
-            zero_values = [value for value in values if value < 1]
-            if len(zero_values) >= self.zero_threshold:
+        for zone in self.zones:
+            if zone.name in self.ZONES and self.fragmentation_index(zone.free_counts, self.page_block_order) > self.FRAGMENTATION_ALERT:
                 return True
         return False
 
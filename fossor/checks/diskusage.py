@@ -1,30 +1,236 @@
 # Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
 # See LICENSE in the project root for license information.
 
+import os
+import re
+import json
+import math
+import time
+import psutil
+
+from threading import Thread
+from collections import OrderedDict, namedtuple
+
 from fossor.checks.check import Check
+from fossor.utils.misc import get_state_dir
+
+Mount = namedtuple('Mount', 'device, mount_point, fs_type, source')
+Usage = namedtuple('Usage', 'size, used, available, percentage, inodes, inodes_used, inode_percentage')
 
 
 class DiskUsage(Check):
-    """DiskUsage ensures that disk utilization percentage for any mounted partitions
-    remains under PERCENTAGE_ALERT ."""
+    """DiskUsage ensures that disk and inode utilization percentage for any mounted partitions
+    remains under PERCENTAGE_ALERT and INODE_PERCENTAGE_ALERT, and that no partition is projected to fill up
+    within FILL_ALERT_HOURS based on the usage history kept between runs.
+
+    Filesystems are read from /proc/self/mountinfo, or psutil where there is no /proc such as on macOS, and checked with
+    statvfs concurrently, a mount that does not answer within STATFS_TIMEOUT seconds (e.g. a stale NFS mount) is
+    reported instead of blocking the check."""
+
+    lightweight = True
 
     PERCENTAGE_ALERT = 98
+    INODE_PERCENTAGE_ALERT = 95
+    STATFS_TIMEOUT = 5
+    FILL_ALERT_HOURS = 24
+
+    HISTORY_FILE = 'diskusage_history.json'
+    HISTORY_MAX_SAMPLES = 50
+    HISTORY_MAX_AGE = 7 * 24 * 3600
+    HISTORY_MIN_SPAN = 600  # Samples must cover at least this many seconds before a fill rate is projected
+
+    MOUNTINFO_PATH = '/proc/self/mountinfo'
+
+    # Filesystems without meaningful disk usage, or that are always full like squashfs images.
+    IGNORED_FS_TYPES = {'autofs', 'binfmt_misc', 'bpf', 'cgroup', 'cgroup2', 'configfs', 'debugfs', 'devpts', 'efivarfs',
+                        'fusectl', 'hugetlbfs', 'iso9660', 'mqueue', 'nsfs', 'proc', 'pstore', 'ramfs', 'rpc_pipefs',
+                        'securityfs', 'selinuxfs', 'squashfs', 'sysfs', 'tracefs'}
 
     def run(self, variables):
+        mounts = self.get_mounts()
+        usages, hung_mounts = self.get_usages(mounts)
 
-        out, err, return_code = self.shell_call('df')
-        disk_free = out.splitlines()[1:]
         exceeded = []
-        for row in disk_free:
-            mount = row.split()
-            partition = mount[0]
-            percentage = int(mount[4].replace('%', ''))
+        inodes_exceeded = []
+        for mount, usage in usages.items():
+            if usage.percentage >= DiskUsage.PERCENTAGE_ALERT:
+                exceeded.append('partition={0} at utilization={1}%'.format(mount.source, usage.percentage))
+            if usage.inode_percentage is not None and usage.inode_percentage >= DiskUsage.INODE_PERCENTAGE_ALERT:
+                inodes_exceeded.append(f'partition={mount.source} at inode utilization={usage.inode_percentage}%')
 
-            if percentage >= DiskUsage.PERCENTAGE_ALERT:
-                exceeded.append('partition={0} at utilization={1}%'.format(partition, percentage))
+        filling = self.get_fill_projections(usages, variables)
 
+        result = []
         if exceeded:
-            return 'Disk utilization is at critical state (> {0}). {1}'.format(DiskUsage.PERCENTAGE_ALERT, ','.join(exceeded))
+            result.append('Disk utilization is at critical state (> {0}). {1}'.format(DiskUsage.PERCENTAGE_ALERT, ','.join(exceeded)))
+        if inodes_exceeded:
+            result.append(f"Inode utilization is at critical state (> {DiskUsage.INODE_PERCENTAGE_ALERT}). {','.join(inodes_exceeded)}")
+        for mount, hours in filling:
+            result.append(f'partition={mount.source} mounted on {mount.mount_point} is projected to be full in {hours:.1f} hours')
+        for mount in hung_mounts:
+            result.append(f'partition={mount.source} mounted on {mount.mount_point} ({mount.fs_type}) did not respond to statfs '
+                          f'within {self.STATFS_TIMEOUT} seconds')
+        if result:
+            return '\n'.join(result)
+
+    def get_mounts(self):
+        '''
+        Return a Mount for each filesystem in mountinfo. Skips pseudo filesystems, mounts hidden by a later mount on the same
+        mount point, and repeated (bind) mounts of a device.
+        '''
+        mount_points = OrderedDict()
+        try:
+            f = open(self.MOUNTINFO_PATH)
+        except FileNotFoundError:
+            return self.get_partitions()
+        with f:
+            for line in f:
+                # Example: 36 35 98:0 /mnt1 /mnt2 rw,noatime master:1 - ext3 /dev/root rw,errors=continue
+                fields, separator, fs_fields = line.partition(' - ')
+                fields = fields.split()
+                fs_fields = fs_fields.split()
+                if not separator or len(fields) < 5 or len(fs_fields) < 2:
+                    continue
+                device = fields[2]
+                mount_point = self._unescape(fields[4])
+                fs_type, source = fs_fields[0], fs_fields[1]
+                mount_points.pop(mount_point, None)
+                mount_points[mount_point] = Mount(device=device, mount_point=mount_point, fs_type=fs_type, source=self._unescape(source))
+
+        mounts = []
+        devices = set()
+        for mount in mount_points.values():
+            if mount.fs_type in self.IGNORED_FS_TYPES or mount.device in devices:
+                continue
+            devices.add(mount.device)
+            mounts.append(mount)
+        return mounts
+
+    def get_partitions(self):
+        '''Return a Mount for each physical filesystem psutil lists, for platforms without mountinfo'''
+        mounts = []
+        devices = set()
+        for partition in psutil.disk_partitions(all=False):
+            if partition.fstype in self.IGNORED_FS_TYPES or partition.device in devices:
+                continue
+            devices.add(partition.device)
+            mounts.append(Mount(device=partition.device, mount_point=partition.mountpoint, fs_type=partition.fstype, source=partition.device))
+        return mounts
+
+    def _unescape(self, path):
+        '''mountinfo escapes spaces, tabs, newlines and backslashes as octal, e.g. \\040'''
+        return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), path)
+
+    def get_usages(self, mounts):
+        '''
+        Run statvfs on every mount concurrently. Returns a dict of Mount: Usage and a list of Mounts that did not respond in time.
+        Daemon threads are used since a thread stuck in statvfs can not be cancelled, this way it can't hold up the plugin exiting.
+        '''
+        results = {}
+
+        def _statvfs(mount):
+            try:
+                results[mount] = os.statvfs(mount.mount_point)
+            except OSError as e:
+                self.log.debug(f"statvfs failed for {mount.mount_point}: {e}")
+                results[mount] = None
+
+        threads = []
+        for mount in mounts:
+            t = Thread(target=_statvfs, args=(mount,), name=f'statvfs {mount.mount_point}', daemon=True)
+            t.start()
+            threads.append(t)
+
+        deadline = time.time() + self.STATFS_TIMEOUT
+        for t in threads:
+            t.join(timeout=max(0, deadline - time.time()))
+
+        usages = {}
+        hung_mounts = []
+        for mount in mounts:
+            if mount not in results:
+                hung_mounts.append(mount)
+                continue
+            usage = self._get_usage(results[mount])
+            if usage:
+                usages[mount] = usage
+        return usages, hung_mounts
+
+    def _get_usage(self, stat):
+        '''Usage from a statvfs result, percentages are calculated and rounded up the same way df does.'''
+        if not stat or not stat.f_blocks:
+            return None
+        size = stat.f_blocks * stat.f_frsize
+        used = (stat.f_blocks - stat.f_bfree) * stat.f_frsize
+        available = stat.f_bavail * stat.f_frsize
+        percentage = math.ceil(used * 100 / (used + available)) if used + available else 0
+
+        inodes_used = inode_percentage = None
+        if stat.f_files:
+            inodes_used = stat.f_files - stat.f_ffree
+            inode_percentage = math.ceil(inodes_used * 100 / stat.f_files)
+        return Usage(size=size, used=used, available=available, percentage=percentage,
+                     inodes=stat.f_files, inodes_used=inodes_used, inode_percentage=inode_percentage)
+
+    def get_fill_projections(self, usages, variables):
+        '''
+        Record the current usage of each mount in the history file, then return (Mount, hours) for mounts projected to
+        fill up within FILL_ALERT_HOURS. The fill rate is a least squares fit over the recorded samples.
+        '''
+        now = time.time()
+        try:
+            history_path = os.path.join(get_state_dir(variables), self.HISTORY_FILE)
+        except OSError as e:
+            self.log.warning(f"Unable to create a state directory, skipping fill rate projections: {e}")
+            return []
+        history = self._load_history(history_path)
+
+        projections = []
+        for mount, usage in usages.items():
+            samples = [s for s in history.get(mount.mount_point, []) if now - s[0] < self.HISTORY_MAX_AGE]
+            samples.append([now, usage.used])
+            samples = samples[-self.HISTORY_MAX_SAMPLES:]
+            history[mount.mount_point] = samples
+
+            rate = self._get_fill_rate(samples)
+            if rate and rate > 0:
+                hours = usage.available / rate / 3600
+                if hours < self.FILL_ALERT_HOURS:
+                    projections.append((mount, hours))
+
+        self._save_history(history_path, history)
+        return projections
+
+    def _get_fill_rate(self, samples):
+        '''Return bytes per second from [timestamp, used] samples, or None if there isn't enough history'''
+        if len(samples) < 2 or samples[-1][0] - samples[0][0] < self.HISTORY_MIN_SPAN:
+            return None
+        count = len(samples)
+        mean_time = sum(s[0] for s in samples) / count
+        mean_used = sum(s[1] for s in samples) / count
+        variance = sum((s[0] - mean_time) ** 2 for s in samples)
+        if not variance:
+            return None
+        return sum((s[0] - mean_time) * (s[1] - mean_used) for s in samples) / variance
+
+    def _load_history(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.log.warning(f"Ignoring unreadable disk usage history {path}: {e}")
+            return {}
+
+    def _save_history(self, path, history):
+        tmp_path = f'{path}.{os.getpid()}'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(history, f)
+            os.replace(tmp_path, path)  # Atomic, so concurrent runs never read a partially written file
+        except OSError as e:
+            self.log.warning(f"Unable to save disk usage history {path}: {e}")
 
 
 if __name__ == '__main__':
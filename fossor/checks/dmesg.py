@@ -1,7 +1,6 @@
 # Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
 # See LICENSE in the project root for license information.
 
-import re
 import sys
 import time
 import logging
@@ -9,11 +8,13 @@ import logging
 from datetime import datetime, timedelta
 from fossor.checks.check import Check
 from fossor.utils.misc import iswithintimerange, common_path
+from fossor.utils.kmsg import KMSG_PATH, records_in_time_range, parse_dmesg_output
 
 TIME_FORMAT = '%b %d %H:%M:%S'
 
 
 class Dmesg(Check):
+    snapshot_sources = ('kernel_log',)
 
     def run(self, variables):
         start_time = variables.get('start_time', None)
@@ -25,25 +26,31 @@ class Dmesg(Check):
 
     def _getdmesgoutput(self, start_time=None, end_time=None):
         result = []
-        out, err, returncode = self.shell_call(common_path(['/usr/bin/dmesg', '/bin/dmesg']), stream=True)
-        boot_time = self._get_boot_time()
-
-        dmesg_pattern = re.compile('\[(.*?)\] (.*)')
-
-        for line in out:
-            m = dmesg_pattern.match(line)
-            dmesg_time = m.group(1).strip()
-            timestamp = boot_time + float(dmesg_time)
-            if iswithintimerange(timestamp, start_time, end_time):
-                message = m.group(2)
-                dt = datetime.fromtimestamp(timestamp)
-                date_str = dt.strftime('%Y/%m/%d %H:%M:%S')
-                result.append(' '.join([date_str, message]))
+        for timestamp, record in self._get_kernel_log_records(start_time=start_time, end_time=end_time):
+            dt = datetime.fromtimestamp(timestamp)
+            date_str = dt.strftime('%Y/%m/%d %H:%M:%S')
+            result.append(' '.join([date_str, record.message]))
 
         if result:
             result.reverse()
             return '\n'.join(result)
 
+    def _get_kernel_log_records(self, start_time=None, end_time=None):
+        '''Return (timestamp, record) tuples from /dev/kmsg, falls back to the dmesg binary if /dev/kmsg is not readable.'''
+        try:
+            return list(records_in_time_range(self.snapshot('kernel_log'), start_time=start_time, end_time=end_time))
+        except OSError as e:
+            self.log.debug(f"Unable to read {KMSG_PATH}, falling back to dmesg. Exception: {e}")
+
+        boot_time = self._get_boot_time()
+        result = []
+        with self.shell_stream(common_path(['/usr/bin/dmesg', '/bin/dmesg'])) as out:
+            for record in parse_dmesg_output(out):
+                timestamp = boot_time + record.uptime
+                if iswithintimerange(timestamp, start_time, end_time):
+                    result.append((timestamp, record))
+        return result
+
     def _get_boot_time(self):
         with open('/proc/uptime') as f:
                 uptime = float(f.read().split()[0])
@@ -2,33 +2,148 @@
 # See LICENSE in the project root for license information.
 
 import os
+import time
 from fossor.checks.check import Check
+from fossor.utils import cgroup
+from fossor.utils.proc import read_stat
+from fossor.utils.pressure import read_pressure, format_pressure
 
 
 class LoadAvg(Check):
     '''this Check will compare the current load average summaries against the count of CPU cores
-    in play, and will alert the user if there are more processes waiting'''
+    in play, and will alert the user if there are more processes waiting.
+
+    The load average is host wide, so it is compared with the CPUs of the host. The view of the Pid's (or fossor's own)
+    cgroup comes from its cpu pressure stall information, which includes waiting on its CPU quota, with the quota and
+    throttling from cpu.stat shown alongside. It also alerts when the host cpu PSI shows tasks waiting on CPU. Findings
+    include a short /proc/stat sample splitting load into runnable tasks and tasks blocked on io, plus cpu and io PSI.'''
+    snapshot_sources = ('loadavg',)
+    lightweight = True
+
+    PRESSURE_THRESH = 25  # Critical % of the last 60 seconds that some tasks were waiting for a CPU
+    STAT_SAMPLE_INTERVAL = 0.25  # Seconds between the two /proc/stat samples
+
     def run(self, variables):
         ON_LINUX = os.path.isdir('/proc')
-        if ON_LINUX:
-            with open('/proc/loadavg') as f:
-                contents = f.read().strip()
-                load_summaries = [float(i) for i in contents.split()[:3]]
-            with open('/proc/cpuinfo') as f:
-                cpu_count = len([c for c in f.read().splitlines() if c.startswith('processor')])
-        else:
+        if not ON_LINUX:
             uptime, err, return_code = self.shell_call('uptime')
             contents = uptime.strip()
             load_summaries = [float(i.replace(',', '')) for i in contents.split()[-3:]]
 
             cpu, err, return_code = self.shell_call('sysctl -n hw.ncpu')
             cpu_count = int(cpu.strip())
+            if any(c / cpu_count > 1 for c in load_summaries):
+                return self._format_load(cpu_count, load_summaries)
+            return
+
+        pid = variables.get('Pid', None)
+        load_summaries = list(self.snapshot('loadavg'))
+        cpu_count = os.cpu_count()
+
+        pressure = {resource: read_pressure(resource) for resource in ('cpu', 'io')}
+        high_pressure = pressure['cpu'] is not None and pressure['cpu']['some']['avg60'] >= self.PRESSURE_THRESH
+        cgroup_cpu = self.get_cgroup_cpu(pid)
+        cgroup_pressure = cgroup_cpu['pressure'] if cgroup_cpu else None
+        high_cgroup_pressure = cgroup_pressure is not None and cgroup_pressure['some']['avg60'] >= self.PRESSURE_THRESH
+
         # Alert the user if any of the 1, 5, or 15-minute load averages is greater than the processor count to handle them
-        if any(c / cpu_count > 1 for c in load_summaries):
-            return 'Load average shows processes queued beyond CPU count!\nCPU Count: {0}\nLoad averages: {1}'.format(
-                cpu_count,
-                ' '.join(str(x) for x in load_summaries)
-            )
+        if not any(c / cpu_count > 1 for c in load_summaries) and not high_pressure and not high_cgroup_pressure:
+            return
+
+        result = self._format_load(cpu_count, load_summaries)
+        quota = self.get_cpu_quota(pid)
+        if quota:
+            result += f'\nCPU limits: {self.get_affinity_count(pid)} CPUs in affinity mask, cgroup quota of {quota:g} CPUs'
+        if cgroup_cpu:
+            result += '\n' + self.format_cgroup_cpu(cgroup_cpu)
+        breakdown = self.get_load_breakdown()
+        if breakdown:
+            result += '\n' + breakdown
+        for resource, values in pressure.items():
+            if values is not None:
+                result += f'\n{resource} pressure: {format_pressure(values)}'
+        return result
+
+    def _format_load(self, cpu_count, load_summaries):
+        return 'Load average shows processes queued beyond CPU count!\nCPU Count: {0:g}\nLoad averages: {1}'.format(
+            cpu_count,
+            ' '.join(str(x) for x in load_summaries)
+        )
+
+    def get_affinity_count(self, pid=None) -> int:
+        '''Number of CPUs pid, or this process, is allowed to run on'''
+        try:
+            return len(os.sched_getaffinity(int(pid) if pid else 0))
+        except (AttributeError, OSError) as e:
+            self.log.debug(f"Unable to read the cpu affinity of {pid}: {e}")
+            return os.cpu_count()
+
+    def get_cgroup_cpu(self, pid=None):
+        '''Return a dict with the path, cpu pressure and cpu.stat of the cgroup v2 of pid, or this process, or None'''
+        directory = cgroup.get_cgroup_dir(pid or 'self')
+        if not directory:
+            return None
+        pressure = read_pressure('cpu', path=f'{directory}/cpu.pressure')
+        try:
+            stat = cgroup.read_keyed(directory, 'cpu.stat')
+        except (OSError, ValueError) as e:
+            self.log.debug(f"Unable to read cpu.stat of {directory}: {e}")
+            stat = {}
+        if pressure is None and not stat:
+            return None
+        return {'path': directory, 'pressure': pressure, 'stat': stat}
+
+    def format_cgroup_cpu(self, cgroup_cpu):
+        result = f"cgroup: {cgroup_cpu['path']}"
+        if cgroup_cpu['pressure'] is not None:
+            result += f"\ncgroup cpu pressure: {format_pressure(cgroup_cpu['pressure'])}"
+        stat = cgroup_cpu['stat']
+        if stat.get('nr_periods'):
+            result += '\ncgroup throttled in {0} of {1} periods, {2:.1f} seconds in total since it was created'.format(
+                stat.get('nr_throttled', 0), stat['nr_periods'], stat.get('throttled_usec', 0) / 1000000)
+        return result
+
+    def get_cpu_quota(self, pid=None):
+        '''Return the cgroup CPU quota of pid, or this process, as a number of CPUs or None if there is no quota'''
+        pid = pid or 'self'
+        try:
+            directory = cgroup.get_cgroup_dir(pid)
+            if directory and os.path.exists(os.path.join(directory, 'cpu.max')):
+                # cgroup v2 cpu.max contains "$MAX $PERIOD", MAX is "max" without a quota
+                with open(os.path.join(directory, 'cpu.max')) as f:
+                    quota, period = f.read().split()
+                if quota == 'max':
+                    return None
+                return int(quota) / int(period)
+            directory = cgroup.get_cgroup_dir(pid, controller='cpu')
+            if directory:
+                quota = cgroup.read_value(directory, 'cpu.cfs_quota_us')
+                if quota is None or quota < 0:
+                    return None
+                return quota / cgroup.read_value(directory, 'cpu.cfs_period_us')
+        except (OSError, ValueError, ZeroDivisionError) as e:
+            self.log.debug(f"Unable to read the cpu quota of {pid}: {e}")
+        return None
+
+    def get_load_breakdown(self):
+        '''Sample /proc/stat twice to show what the load consists of, returns None if /proc/stat is not readable'''
+        try:
+            first = read_stat()
+            time.sleep(self.STAT_SAMPLE_INTERVAL)
+            last = read_stat()
+        except (OSError, ValueError) as e:
+            self.log.debug(f"Unable to read /proc/stat: {e}")
+            return None
+
+        deltas = {name: last['cpu'][name] - first['cpu'].get(name, 0) for name in last['cpu']}
+        total = sum(deltas.values())
+        result = f"Tasks runnable: {last.get('procs_running')}, blocked on io: {last.get('procs_blocked')}"
+        if total > 0:
+            busy = deltas.get('user', 0) + deltas.get('nice', 0) + deltas.get('system', 0) + deltas.get('irq', 0) + deltas.get('softirq', 0)
+            result += '\nCPU time: busy {0:.0f}%, iowait {1:.0f}%, steal {2:.0f}%, idle {3:.0f}%'.format(
+                busy / total * 100, deltas.get('iowait', 0) / total * 100, deltas.get('steal', 0) / total * 100,
+                deltas.get('idle', 0) / total * 100)
+        return result
 
 
 if __name__ == '__main__':
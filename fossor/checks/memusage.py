@@ -1,48 +1,181 @@
 # Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
 # See LICENSE in the project root for license information.
 
+import os
+import json
 import time
-import re
 import platform
 from fossor.checks.check import Check
-from fossor.utils.misc import common_path
+from fossor.utils import cgroup
+from fossor.utils.misc import common_path, get_state_dir
+from fossor.utils.kmsg import KMSG_PATH, parse_dmesg_output
+from fossor.utils.pressure import read_pressure, format_pressure
 
 
 class MemUsage(Check):
     """This Check inspects the current memory usage and will alert the
-    user if it seems excessive"""
+    user if it seems excessive.
+
+    Usage is based on MemAvailable, memory pressure on the PSI averages in /proc/pressure/memory and if a Pid is known,
+    the usage, limit and oom kills of its cgroup v2 memory controller are checked too. The oom counters of a cgroup count
+    for its whole lifetime, so only oom events since the last run, kept in the state dir, are alerted on.
+    The kernel log is only searched for oom-killer messages when /proc/vmstat shows the oom killer has run."""
+
+    snapshot_sources = ('meminfo', 'vmstat', 'kernel_log')
+    lightweight = True
+
+    CRITICAL_THRESH = 90  # Critical memory-in-use threshold %
+    PRESSURE_THRESH = 10  # Critical % of the last 60 seconds that some tasks were stalled waiting on memory
+
+    OOM_EVENTS = ('oom', 'oom_kill')
+    EVENTS_FILE = 'memusage_cgroup_events.json'
 
     def run(self, variables):
         os_name = platform.system()
         if os_name != "Linux":
             return
 
-        # Critical memory-in-use threshold %
-        CRITICAL_THRESH = 90
         meminfo = self.get_meminfo()
-
-        act_free = meminfo['MemFree'] + meminfo['Buffers'] + meminfo['Cached']
-        used = meminfo['MemTotal'] - act_free
+        used = meminfo['MemTotal'] - self.get_available(meminfo)
         perc_used = (used/meminfo['MemTotal'])*100
 
-        out, err, return_code = self.shell_call(common_path(['/usr/bin/dmesg', '/bin/dmesg']))
+        pressure = self.get_pressure()
+        high_pressure = pressure is not None and pressure['some']['avg60'] >= self.PRESSURE_THRESH
+
+        oom_records = []
+        oom_kills = self.get_oom_kill_count()
+        if oom_kills is None or oom_kills > 0:
+            oom_records = [record for record in self.get_kernel_log_records() if 'oom-killer' in record.message]
 
-        if perc_used >= CRITICAL_THRESH or 'oom-killer' in out:
+        pid = variables.get('Pid', None)
+        cgroup_memory = self.get_cgroup_memory(pid) if pid else None
+        if cgroup_memory is not None:
+            cgroup_memory['new_events'] = self.get_new_oom_events(cgroup_memory, variables)
+        cgroup_alert = cgroup_memory is not None and self.cgroup_alert(cgroup_memory)
+
+        if perc_used >= self.CRITICAL_THRESH or oom_records or high_pressure or cgroup_alert:
             res = 'High Memory Use!\nMemTotal: {0:.0f} kib\nUsed: {1:.0f} kib ({2:.0f}%)'.format(
                 meminfo['MemTotal'], used, perc_used)
 
-            if 'oom-killer' in out:
-                res = res + '\n\noom-killer present in dmesg | tail!\n{}'.format(self.get_ooms(out))
+            if pressure is not None:
+                res = res + f'\nPressure: {format_pressure(pressure)}'
+
+            if cgroup_memory is not None:
+                res = res + '\n\n' + self.format_cgroup_memory(pid, cgroup_memory)
+
+            if oom_records:
+                res = res + '\n\noom-killer present in dmesg | tail!\n{}'.format(self.get_ooms(oom_records))
 
             return res
 
-    def get_meminfo(self):
-        meminfo = {}
-        with open('/proc/meminfo') as m:
-            for i in m.readlines():
-                meminfo[i.split()[0].rstrip(':')] = int(i.split()[1])
+    def get_available(self, meminfo):
+        '''MemAvailable accounts for caches that can't be reclaimed, kernels older than 3.14 don't provide it'''
+        if 'MemAvailable' in meminfo:
+            return meminfo['MemAvailable']
+        return meminfo['MemFree'] + meminfo['Buffers'] + meminfo['Cached']
+
+    def get_pressure(self):
+        return read_pressure('memory')
+
+    def get_oom_kill_count(self):
+        '''Return the number of oom kills since boot from /proc/vmstat, or None if the kernel doesn't count them (before 4.13)'''
+        try:
+            return self.snapshot('vmstat').get('oom_kill')
+        except OSError as e:
+            self.log.debug(f"Unable to read /proc/vmstat: {e}")
+            return None
+
+    def get_cgroup_memory(self, pid):
+        '''Return a dict with the memory usage, limit, events and pressure of pid's cgroup v2, or None if it is not available'''
+        directory = cgroup.get_cgroup_dir(pid)
+        if not directory:
+            return None
+        try:
+            cgroup_memory = {'path': directory,
+                             'current': cgroup.read_value(directory, 'memory.current'),
+                             'max': cgroup.read_value(directory, 'memory.max'),
+                             'events': cgroup.read_keyed(directory, 'memory.events')}
+        except (OSError, ValueError) as e:
+            # The root cgroup has no memory.current or memory.max
+            self.log.debug(f"Unable to read the memory controller of {directory}: {e}")
+            return None
+        cgroup_memory['pressure'] = read_pressure('memory', path=f'{directory}/memory.pressure')
+        return cgroup_memory
+
+    def cgroup_alert(self, cgroup_memory):
+        if cgroup_memory['max'] and cgroup_memory['current'] / cgroup_memory['max'] * 100 >= self.CRITICAL_THRESH:
+            return True
+        if any(cgroup_memory.get('new_events', {}).values()):
+            return True
+        pressure = cgroup_memory['pressure']
+        return pressure is not None and pressure['some']['avg60'] >= self.PRESSURE_THRESH
+
+    def get_new_oom_events(self, cgroup_memory, variables):
+        '''Return {event: count} of the oom events of a cgroup since the last run, and record the current counters'''
+        try:
+            path = os.path.join(get_state_dir(variables), self.EVENTS_FILE)
+        except OSError as e:
+            self.log.warning(f"Unable to create a state directory, reporting all oom events of the cgroup: {e}")
+            path = None
+        history = self._load_events(path) if path else {}
+        previous = history.get(cgroup_memory['path'], {})
+        new_events = {}
+        for event in self.OOM_EVENTS:
+            count = cgroup_memory['events'].get(event, 0)
+            last = previous.get(event, 0)
+            new_events[event] = count - last if count >= last else count  # Lower than before if the cgroup was recreated
+        if path:
+            history[cgroup_memory['path']] = {event: cgroup_memory['events'].get(event, 0) for event in self.OOM_EVENTS}
+            self._save_events(path, history)
+        return new_events
+
+    def _load_events(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.log.warning(f"Ignoring unreadable cgroup event history {path}: {e}")
+            return {}
+
+    def _save_events(self, path, history):
+        tmp_path = f'{path}.{os.getpid()}'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(history, f)
+            os.replace(tmp_path, path)  # Atomic, so concurrent runs never read a partially written file
+        except OSError as e:
+            self.log.warning(f"Unable to save cgroup event history {path}: {e}")
+
+    def format_cgroup_memory(self, pid, cgroup_memory):
+        current_kib = cgroup_memory['current'] / 1024
+        if cgroup_memory['max']:
+            limit = '{0:.0f} kib ({1:.0f}% used)'.format(cgroup_memory['max'] / 1024, cgroup_memory['current'] / cgroup_memory['max'] * 100)
+        else:
+            limit = 'unlimited'
+        events = cgroup_memory['events']
+        res = f"cgroup of pid {pid}: {cgroup_memory['path']}\n" \
+              f"Used: {current_kib:.0f} kib\nLimit: {limit}\n" \
+              f"Events: oom={events.get('oom', 0)} oom_kill={events.get('oom_kill', 0)} max={events.get('max', 0)} high={events.get('high', 0)}"
+        new_events = cgroup_memory.get('new_events', {})
+        if any(new_events.values()):
+            res = res + '\nSince the last run: ' + ' '.join(f'{event}={count}' for event, count in new_events.items())
+        if cgroup_memory['pressure'] is not None:
+            res = res + f"\nPressure: {format_pressure(cgroup_memory['pressure'])}"
+        return res
+
+    def get_kernel_log_records(self):
+        '''Return kernel log records from /dev/kmsg, falls back to the dmesg binary if /dev/kmsg is not readable.'''
+        try:
+            return self.snapshot('kernel_log')
+        except OSError as e:
+            self.log.debug(f"Unable to read {KMSG_PATH}, falling back to dmesg. Exception: {e}")
+        out, err, return_code = self.shell_call(common_path(['/usr/bin/dmesg', '/bin/dmesg']))
+        return parse_dmesg_output(out.splitlines())
 
-        return meminfo
+    def get_meminfo(self):
+        return self.snapshot('meminfo')
 
     def get_time(self):
         now = time.time()
@@ -51,20 +184,14 @@ class MemUsage(Check):
         cutoff = up - 86400
         return booted, cutoff
 
-    def get_ooms(self, out):
+    def get_ooms(self, records):
         booted, cutoff = self.get_time()
         newline = ""
 
-        for line in out.split('\n'):
-            if 'oom-killer' in line:
-                t = re.match("^\[(\d+.\d+)\]", line)
-                if t:
-                    human_time = time.strftime("%a, %d %b %Y %H:%M:%S", time.gmtime(booted + float(t.group(1))))
-                    if float(t.group(1)) > cutoff:
-                        newline = newline + human_time + line + "\n"
-
-                else:
-                    return '\n'.join([line for line in out.split('\n') in line])
+        for record in records:
+            if record.uptime > cutoff:
+                human_time = time.strftime("%a, %d %b %Y %H:%M:%S", time.gmtime(booted + record.uptime))
+                newline = newline + human_time + f"[{record.uptime:.6f}] {record.message}" + "\n"
 
         return newline
 
@@ -1,20 +1,59 @@
 # Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
 # See LICENSE in the project root for license information.
 
+import os
+import time
 import platform
 
 from datetime import datetime, timedelta
 from collections import namedtuple
 
 from fossor.checks.check import Check
+from fossor.utils.sampler import get_sampler
+
+PROC_NET_DEV_PATH = '/proc/net/dev'
+SYS_CLASS_NET_PATH = '/sys/class/net'
+
+# Column names of /proc/net/dev, named after the sar EDEV statistics where one exists
+PROC_NET_DEV_FIELDS = ['rxbyt', 'rxpck', 'rxerr', 'rxdrop', 'rxfifo', 'rxfram', 'rxcmp', 'rxmcst',
+                       'txbyt', 'txpck', 'txerr', 'txdrop', 'txfifo', 'coll', 'txcarr', 'txcmp']
+
+# Detailed driver error counters from /sys/class/net/<interface>/statistics, like ethtool -S shows
+SYS_CLASS_NET_STATS = ['rx_crc_errors', 'rx_frame_errors', 'rx_fifo_errors', 'rx_missed_errors', 'rx_over_errors',
+                       'rx_length_errors', 'tx_aborted_errors', 'tx_fifo_errors', 'tx_heartbeat_errors', 'tx_window_errors']
+
+
+def read_net_counters(proc_net_dev_path=PROC_NET_DEV_PATH, sys_class_net_path=SYS_CLASS_NET_PATH):
+    '''Return a dict of interface: {counter: value} from /proc/net/dev and /sys/class/net/<interface>/statistics'''
+    counters = {}
+    with open(proc_net_dev_path) as f:
+        for line in f.readlines()[2:]:  # Skip the two header lines
+            nic, _, values = line.partition(':')
+            counters[nic.strip()] = dict(zip(PROC_NET_DEV_FIELDS, (int(v) for v in values.split())))
+
+    for nic, nic_counters in counters.items():
+        for stat in SYS_CLASS_NET_STATS:
+            try:
+                with open(os.path.join(sys_class_net_path, nic, 'statistics', stat)) as f:
+                    nic_counters[stat] = int(f.read())
+            except (OSError, ValueError):
+                continue
+    return counters
 
 
 class NetIFace(Check):
-    """NetIFace polls SARs EDEV (network error) statistics and notifies if
+    """NetIFace checks network interface error and drop rates and notifies if
     stat > ERROR_THRESHOLD.
 
+    By default every interface in /proc/net/dev and its /sys/class/net statistics are sampled twice, netiface_interval
+    seconds apart, and per second rates are calculated from the difference. If a 'netiface' sampler
+    (fossor.utils.sampler) is running, its oldest sample is used instead so no time is spent waiting.
+
+    With netiface_mode=sar, SARs EDEV (network error) statistics are used instead, this requires sysstat history.
     EDEV: statistics on failures (errors) from the network devices are reported"""
 
+    DEFAULT_INTERVAL = 1
+
     NIC_STATS = {
         # Total number of bad packets received per second
         'rxerr': 0,
@@ -38,6 +77,55 @@ class NetIFace(Check):
         return Sar(*stdout.split()[2:8])
 
     def run(self, variables: dict):
+        """Check for Network Interface Errors"""
+        # this check relies on Linux only interfaces.
+        if platform.system() != 'Linux':
+            return
+
+        if variables.get('netiface_mode', 'native') == 'sar':
+            return self.run_sar(variables)
+
+        interval = float(variables.get('netiface_interval', NetIFace.DEFAULT_INTERVAL))
+        (first_time, first), (last_time, last) = self.get_samples(interval)
+        elapsed = last_time - first_time
+        if elapsed <= 0:
+            return
+
+        result = ''
+        for nic in sorted(last):
+            if nic not in first:
+                continue  # Interface appeared between samples
+            for stat, threshold in self._get_thresholds(last[nic]):
+                delta = last[nic][stat] - first[nic].get(stat, last[nic][stat])
+                if delta < 0:
+                    continue  # Counter was reset, e.g. the driver was reloaded
+                val = round(delta / elapsed, 2)
+                if val > threshold:
+                    result += f'stat={stat}, interface={nic} has surpassed threshold. value={val}/s\n'
+        if result:
+            return result
+
+    def _get_thresholds(self, counters):
+        for stat, threshold in NetIFace.NIC_STATS.items():
+            if stat in counters:
+                yield stat, threshold
+        for stat in SYS_CLASS_NET_STATS:
+            if stat in counters:
+                yield stat, 0
+
+    def get_samples(self, interval):
+        '''Return two (timestamp, counters) samples, from the background sampler if one is running'''
+        sampler = get_sampler('netiface')
+        if sampler:
+            samples = sampler.samples
+            if samples:
+                return samples[0], (time.time(), read_net_counters())
+
+        first = (time.time(), read_net_counters())
+        time.sleep(interval)
+        return first, (time.time(), read_net_counters())
+
+    def run_sar(self, variables: dict):
         """Check for Network Interface Errors using Sar data"""
 
         # pull in global variables or configure sane defaults for SAR time window.
@@ -51,10 +139,6 @@ class NetIFace(Check):
         start_time = (datetime.now() + timedelta(minutes=-minutes)).strftime('%H:%M:%S')
         end_time = datetime.now().strftime('%H:%M:%S')
 
-        # this check relies on data massaged via SAR and therefore Linux only.
-        if platform.system() != 'Linux':
-            return
-
         cmd = f'/usr/bin/sar -n EDEV -s {start_time} -e {end_time}'
         self.log.debug(f'executing cmd={cmd}')
 
@@ -67,9 +151,9 @@ class NetIFace(Check):
         if not nic_stats:
             self.log.debug("No nics found.")
             return
+        result = ''
         for line in nic_stats:
             sar = self._parse_sar(line)
-            result = ''
 
             nic = line.split()[1]
 
@@ -77,4 +161,5 @@ class NetIFace(Check):
                 val = float(getattr(sar, stat))
                 if val > NetIFace.NIC_STATS[stat]:
                     result += f'stat={stat}, interface={nic} has surpassed threshold. value={val}\n'
+        if result:
             return result
@@ -6,6 +6,8 @@ from fossor.checks.check import Check
 
 class OtherUsers(Check):
     """Checks for other users logged into the host box other than the current user."""
+    lightweight = True
+
     def run(self, variables):
         other_users = variables.get('OtherUsers', None)
         if other_users:
@@ -8,6 +8,7 @@ from fossor.checks.check import Check
 
 
 class RaidStatus(Check):
+    lightweight = True
 
     def run(self, variables: dict):
         '''Check if there are any drives down in a Raid Array.'''
@@ -38,27 +38,31 @@ class SimilarLogErrors(Check):
         self.log.debug(f"log_files: {log_files}")
 
         max_pool_threads = cpu_count() * 2
-        pool = Pool(max_pool_threads)
-        pool_results = pool.map(self.get_error_pattern_counts, log_files)
-
-        for filename, common_lines in pool_results:
-            lines = []
-            for line, values in common_lines.items():  # Sort by count
-                count = values['count']
-                first_seen = values.get('first_seen', None)
-                first_seen_text = ''
-                if first_seen:
-                    first_seen_text = f"First seen: {first_seen}, "
-                count_text = f"Count: {count}, "
-                line_text = f"{line.strip()}"
-                text = first_seen_text + count_text + line_text
-                lines.append(text)
-            if lines:
-                result += f"filename: {filename}\n"
-                result += '\n'.join(lines) + '\n\n'
-
-        if result:
-            return result
+        with Pool(max_pool_threads) as pool:
+            # Report the files processed so far, so a timeout still shows the errors found until then
+            for filename, common_lines in pool.imap(self.get_error_pattern_counts, log_files):
+                text = self._format_common_lines(filename, common_lines)
+                if text:
+                    result += text
+                    yield result
+
+    def _format_common_lines(self, filename, common_lines):
+        result = ''
+        lines = []
+        for line, values in common_lines.items():  # Sort by count
+            count = values['count']
+            first_seen = values.get('first_seen', None)
+            first_seen_text = ''
+            if first_seen:
+                first_seen_text = f"First seen: {first_seen}, "
+            count_text = f"Count: {count}, "
+            line_text = f"{line.strip()}"
+            text = first_seen_text + count_text + line_text
+            lines.append(text)
+        if lines:
+            result += f"filename: {filename}\n"
+            result += '\n'.join(lines) + '\n\n'
+        return result
 
     def _remove_blacklisted_logs(self, log_files):
         '''Remove blacklisted log_files'''
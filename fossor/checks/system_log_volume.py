@@ -27,10 +27,10 @@ class SystemLogVolume(Check):
         end_time = variables.get('end_time', None)
         max_width = variables.get('MaxPluginOutputWidth', None)
 
-        file_line_counts = self.get_line_counts(start_time, end_time)
         g = Grapher()
         result = ''
-        for file_path, timestamped_values in file_line_counts:
+        # Files are read one at a time, reporting the graphs so far, so a timeout still shows the files already read
+        for file_path, timestamped_values in self.get_line_counts(start_time, end_time):
             if not timestamped_values:
                 continue
 
@@ -43,15 +43,13 @@ class SystemLogVolume(Check):
             graph = g.asciigraph(values=timestamped_values, max_width=max_width, max_height=7, label=True)
             tmp = f"{file_path}:\n{graph}"
             result = '\n'.join([result, tmp])
-
-        return result
+            yield result
 
     def get_line_counts(self, start_time, end_time):
-        file_line_counts = []
+        '''Yields (file_path, line_counts) as each file is read'''
         for file_path, date_format in self.log_files:
             line_counts = self.get_file_line_counts(file_path=file_path, date_format=date_format, start_time=start_time, end_time=end_time)
-            file_line_counts.append((file_path, line_counts))
-        return file_line_counts
+            yield file_path, line_counts
 
     def get_file_line_counts(self, file_path, date_format, start_time=None, end_time=None):
         line_counts = {}
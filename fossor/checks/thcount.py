@@ -6,21 +6,30 @@ from collections import defaultdict
 
 
 class Thcount(Check):
-    '''Simple thread count via ps.  Arbitrarily set to 10k threads'''
+    '''Thread count per user from the process table snapshot.  Arbitrarily set to 10k threads'''
+    snapshot_sources = ('processes',)
+    lightweight = True
+
+    MAX_THREADS = 10000
+    TOP_PROCESSES = 5  # Number of processes with the most threads to list for each user over the limit
+
     def run(self, variables):
         tc = defaultdict(int)
+        user_processes = defaultdict(list)
+        for process in self.snapshot('processes'):
+            if process.username and process.num_threads:
+                tc[process.username] += process.num_threads
+                user_processes[process.username].append(process)
+
         rd = ""
-        out, err, return_code = self.shell_call('ps -e -o thcount,user')
-        ps = out.splitlines()
-        for pid in ps:
-            count, user = pid.split()
-            if count.isdigit():
-                tc[user] += int(count)
-
-        for user in tc:
-            if tc[user] > 10000:
-                rd = rd + 'user {0} currently has {1} threads\n'.format(user, tc[user])
-                return rd
+        for user in sorted(tc, key=tc.get, reverse=True):
+            if tc[user] > self.MAX_THREADS:
+                rd += 'user {0} currently has {1} threads\n'.format(user, tc[user])
+                top_processes = sorted(user_processes[user], key=lambda p: p.num_threads, reverse=True)[:self.TOP_PROCESSES]
+                for p in top_processes:
+                    rd += f'    pid {p.pid} ({p.name}) has {p.num_threads} threads\n'
+        if rd:
+            return rd
 
 
 if __name__ == '__main__':
@@ -16,6 +16,7 @@ from functools import wraps
 from datetime import datetime, timedelta
 
 from fossor.engine import Fossor
+from fossor.utils.run_status import STATS_COLUMNS, DEFAULT_STATS_SORT
 
 default_plugin_dir = '/opt/fossor'
 
@@ -85,6 +86,14 @@ def fossor_cli_flags(f):
     csv_list = CsvList()
     f = click.option('--black-list', 'blacklist', type=csv_list, help='Do not run these plugins.')(f)
     f = click.option('--white-list', 'whitelist', type=csv_list, help='Only run these plugins.')(f)
+    f = click.option('--trace', 'trace', type=click.Path(dir_okay=False, writable=True),
+                     help='Write a timeline of the run to this file, for chrome://tracing or ui.perfetto.dev.')(f)
+    f = click.option('--profile-memory', 'profile_memory', is_flag=True, help='Also trace memory allocations of profiled plugins with tracemalloc.')(f)
+    f = click.option('--profile-dir', 'profile_dir', help='Write profiles here. Defaults to a new directory in ~/.cache/fossor/profiles.')(f)
+    f = click.option('--profile-plugins', 'profile_plugins', type=csv_list, help='Profile these plugins with cProfile.')(f)
+    f = click.option('--profile', 'profile', is_flag=True, help='Profile all plugins with cProfile.')(f)
+    f = click.option('--stats-sort', 'stats_sort', type=click.Choice(list(STATS_COLUMNS)), show_default=True, default=DEFAULT_STATS_SORT,
+                     help='Column to sort the plugin stats of the report by.')(f)
     f = click.option('--truncate/--no-truncate', 'truncate', show_default=True, default=True, is_flag=True)(f)
     f = click.option('-v', '--verbose', is_flag=True)(f)
     f = click.option('-d', '--debug', is_flag=True, callback=setup_logging)(f)
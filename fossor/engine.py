@@ -2,7 +2,9 @@
 # See LICENSE in the project root for license information.
 
 import os
+import sys
 import time
+import asyncio
 import psutil
 import signal
 import logging
@@ -10,6 +12,9 @@ import importlib
 import setproctitle
 import inspect
 import pkgutil
+import selectors
+import threading
+import concurrent.futures
 import multiprocessing as mp
 
 from requests.structures import CaseInsensitiveDict
@@ -21,8 +26,14 @@ import fossor.checks
 import fossor.checks.check
 import fossor.reports
 import fossor.reports.report
+import fossor.utils.snapshot
 
-from fossor.utils.misc import psutil_exceptions
+from fossor.plugin import PluginResult
+from fossor.utils import shm, profiling, limits, admission, history
+from fossor.utils.misc import psutil_exceptions, run_coroutine
+from fossor.utils.run_status import RunStatus, QUEUED, STARTED, FINISHED, TIMED_OUT, RUNNER_FINISHED, DELIVERED, SIGNALED, get_own_usage, get_process_usage, \
+    get_thread_usage
+from fossor.utils.trace import Trace
 
 
 class Fossor(object):
@@ -49,6 +60,17 @@ class Fossor(object):
         self.check_plugins = set()
         self.report_plugins = set()
 
+        # Plugin lifecycle events published by plugin runners, created on first use
+        self.run_status = None
+        # Set by cancel(), plugin runners end their plugins when they see it
+        self.cancelled = mp.Event()
+        # Phases of a run, written out with the plugin events when the trace variable holds a path
+        self.trace = Trace()
+        # Durations of plugins on previous runs, loaded by run
+        self.history = None
+        # Profile directory created by the last run, a later run of this instance creates its own
+        self.created_profile_dir = None
+
         self.add_plugins()  # Adds all plugins located within the fossor module recursively
 
     def _import_submodules_by_module(self, module) -> set:
@@ -140,8 +162,8 @@ class Fossor(object):
         reports = list(self.report_plugins)
         return variables + checks + reports
 
-    def _terminate_process_group(self, process):
-        '''Kill a process group leader and its process group'''
+    def _terminate_process_group(self, process, reason='it has run for too long'):
+        '''Kill a process group leader and its process group, reason is logged with the signals issued'''
         pid = process.pid
         pgid = os.getpgid(pid)
         if pid != pgid:
@@ -156,7 +178,9 @@ class Fossor(object):
 
             if len(children) > 0:
                 try:
-                    self.log.warning(f"Issuing signal {s} to process group {pgid} because it has run for too long.")
+                    self.log.warning(f"Issuing signal {s} to process group {pgid} because {reason}.")
+                    if self.run_status is not None:
+                        self.run_status.publish(process.name, SIGNALED, pid=pid, details={'signal': s.name})
                     os.killpg(pgid, s)
                     time.sleep(1)
                 except psutil_exceptions:
@@ -167,57 +191,274 @@ class Fossor(object):
         process.terminate()
         process.join()
 
-    def _run_plugins_parallel(self, plugins):
+    def _run_plugins_parallel(self, plugins, all_results=False, partial_results=False):
         '''
         Accepts function to run, and a dictionary of plugins to run. Format is name:module
         Returns an output queue which outputs two values: plugin-name, output. Queue ends when plugin-name is EOF.
-
+        Values are PluginResult tuples, with all_results a PluginResult is queued for every plugin, even without output.
+        With partial_results the PARTIAL results of plugins that yield their output so far are queued as they arrive.
+        Either way a plugin ended early is reported with the last partial result it sent.
+        Large outputs travel through shared memory, the returned queue reads them back, see fossor.utils.shm.
         '''
 
         def _run_plugins_parallel_helper(timeout):
             setproctitle.setproctitle('Plugin-Runner')
             processes = []
-            queue_lock = mp.Lock()
+            terminators = []
+            forwarded_segments = set()  # Shared memory segments the report is responsible for
+            received = {}  # process: PluginResult it sent
+            partials = {}  # plugin name: output of the last PARTIAL result it sent, until its result arrives
+            breaches = {}  # process: description of the resource limit it was killed for
+            plugin_limits = {}  # process: resource limits it runs under
+            # Each plugin sends its results over its own pipe, only this process writes to the output queue
+            selector = selectors.DefaultSelector()
+            readers = {}  # process: read end of its result pipe
+            # Plugins waiting for the admission controller to let them start, the first in line starts next
+            controller = admission.AdmissionController(max_concurrency=self.variables.get('max_concurrency'))
+            pending = admission.admission_order(plugins, run_status.predictions)
+            # Lightweight plugins share a single worker process, which starts right away
+            lightweight = [Plugin for Plugin in pending if self.runs_lightweight(Plugin)]
+            pending = [Plugin for Plugin in pending if Plugin not in lightweight]
+            worker_plugins = {}  # worker process: names of the plugins it has not sent a result for yet
+            # Results carry the plugin name, run status is kept under the full name as a variable and a check may share a name
+            full_names = {Plugin.get_name(): Plugin.get_full_name() for Plugin in plugins}
+
+            for Plugin in lightweight + pending:
+                run_status.publish(Plugin.get_full_name(), QUEUED)
+
+            def start(Plugin):
+                reader, writer = mp.Pipe(duplex=False)
+                process = mp.Process(target=self.run_plugin, name=Plugin.get_name(), args=(Plugin, writer))
+                process.start()
+                try:
+                    plugin_limits[process] = limits.get_limits(Plugin)
+                except ValueError:
+                    plugin_limits[process] = {}  # The plugin process reports this as a crash
+                writer.close()  # The plugin process holds the only write end, so the pipe reaches EOF when it exits
+                selector.register(reader, selectors.EVENT_READ, data=process)
+                readers[process] = reader
+                run_status.publish(Plugin.get_full_name(), STARTED, pid=process.pid)
+                processes.append(process)
 
-            for Plugin in plugins:
-                process = mp.Process(target=self.run_plugin, name=Plugin.get_name(), args=(Plugin, output_queue, queue_lock))
+            def start_worker(plugins, timeout):
+                reader, writer = mp.Pipe(duplex=False)
+                process = mp.Process(target=self.run_lightweight_plugins, name='Lightweight-Plugins', args=(plugins, writer, timeout))
                 process.start()
+                plugin_limits[process] = limits.DEFAULT_LIMITS
+                writer.close()
+                selector.register(reader, selectors.EVENT_READ, data=process)
+                readers[process] = reader
+                worker_plugins[process] = {Plugin.get_name() for Plugin in plugins}
+                for Plugin in plugins:
+                    run_status.publish(Plugin.get_full_name(), STARTED, pid=process.pid)
                 processes.append(process)
 
+            def get_end_output(name, message):
+                '''Output for a plugin that was ended early, the last partial result it sent is kept'''
+                partial = partials.pop(name, None)
+                if partial:
+                    return self._with_partial(partial, message)
+                return message if self.variables.get('verbose') else None
+
+            def end_worker_plugins(process, outcome, message=None):
+                '''Publish the end of the plugins of a worker process that exited or timed out without sending their result'''
+                for name in sorted(worker_plugins.pop(process)):
+                    if outcome in (PluginResult.TIMED_OUT, PluginResult.CANCELLED):
+                        if outcome == PluginResult.TIMED_OUT:
+                            self.log.error(f"Plugin {name} in the lightweight worker ran longer than its timeout period: {worker_timeout}")
+                        output = get_end_output(name, message)
+                        if output or all_results:
+                            output_queue.put(PluginResult(name, output, duration=time.time() - start_time, status=outcome))
+                        run_status.publish(full_names[name], TIMED_OUT, pid=process.pid, details={'outcome': outcome})
+                    else:
+                        partials.pop(name, None)
+                        run_status.publish(full_names[name], FINISHED, pid=process.pid, details={'outcome': outcome})
+
+            def forward_results(process) -> bool:
+                '''Move results waiting in the result pipe of process to the output queue. Returns False once the plugin closed the pipe.'''
+                reader = readers[process]
+                try:
+                    while reader.poll():
+                        result = reader.recv()
+                        if result.status == PluginResult.PARTIAL:
+                            forward_partial(process, result)
+                            continue
+                        partials.pop(result.name, None)
+                        received[process] = result
+                        if result.output or all_results:
+                            forwarded_segments.update(shm.payload_names(result))
+                            output_queue.put(result)
+                            run_status.publish(full_names[result.name], DELIVERED, pid=process.pid)
+                        if process in worker_plugins:  # The worker goes on with its other plugins
+                            worker_plugins[process].discard(result.name)
+                            event = TIMED_OUT if result.status == PluginResult.TIMED_OUT else FINISHED
+                            run_status.publish(full_names[result.name], event, pid=process.pid, details=dict(result.stats or {}, outcome=result.status))
+                except (EOFError, OSError):  # OSError if the plugin was killed while sending a result
+                    return False
+                return True
+
+            def forward_partial(process, result):
+                '''Keep the output of a PARTIAL result, copied out of shared memory, and queue it with partial_results'''
+                if process in worker_plugins and result.name not in worker_plugins[process]:
+                    shm.unpack_result(result)  # Sent by the thread of a plugin that timed out in the worker
+                    return
+                result = shm.unpack_result(result)
+                partials[result.name] = result.output
+                if partial_results:
+                    output_queue.put(shm.pack_result(result))  # A segment of this process, removed by the reader
+                    run_status.publish(full_names[result.name], DELIVERED, pid=process.pid)
+
+            def close_reader(process):
+                '''Forward the results left in the result pipe of process and close it, unless it was closed already'''
+                if process not in readers:
+                    return
+                forward_results(process)
+                reader = readers.pop(process)
+                selector.unregister(reader)
+                reader.close()
+
+            def get_stats(process):
+                '''Outcome, resource usage and output size of a plugin process that exited'''
+                result = received.get(process)
+                if process in breaches:
+                    return dict((result.stats or {}) if result else {}, outcome=PluginResult.LIMIT_EXCEEDED)
+                if result is None:  # Exited without sending a result, e.g. killed by a signal
+                    return {'outcome': PluginResult.CRASHED}
+                return dict(result.stats or {}, outcome=result.status)
+
+            def remove_cgroup(process) -> list:
+                '''Remove the leaf cgroup of a plugin process that exited, returns the cgroup limits it breached'''
+                if plugin_limits[process].get('cgroup_memory_max') is None and plugin_limits[process].get('cgroup_cpu_max') is None:
+                    return []
+                leaf = limits.get_cgroup_leaf(process.pid)
+                if not leaf or not os.path.isdir(leaf):
+                    return []
+                found = limits.get_cgroup_breaches(leaf)
+                limits.remove_cgroup_leaf(leaf)
+                return found
+
+            def check_limits(process):
+                '''Find out whether an exited plugin process was killed for breaching its resource limits and remove its cgroup'''
+                cgroup_breaches = remove_cgroup(process)
+                breach = limits.describe_exit(plugin_limits[process], process.exitcode) or next(iter(cgroup_breaches), None)
+                if breach:
+                    breaches[process] = breach
+                    self.log.error(f"Plugin {process.name} was {breach}")
+                    result = received.get(process)
+                    verbose = self.variables.get('verbose')
+                    if (result is None or result.status != PluginResult.LIMIT_EXCEEDED) and (verbose or all_results):
+                        output = f'Resource limit exceeded, the plugin was {breach}' if verbose else None
+                        output_queue.put(PluginResult(process.name, output, duration=time.time() - start_time, status=PluginResult.LIMIT_EXCEEDED))
+
+            def terminate(process, reason):
+                self._terminate_process_group(process, reason)
+                # Remove the outputs the plugin placed in shared memory but did not get to send
+                shm.remove_segments(process.pid, keep=forwarded_segments)
+                remove_cgroup(process)
+
             start_time = time.time()
             should_end = False
-            while len(processes) > 0:
+            # Plugins in the worker time out a little earlier, so it can still report them before it is killed
+            worker_timeout = max(timeout - 1, timeout / 2)
+            if lightweight:
+                start_worker(lightweight, worker_timeout)
+            while len(processes) > 0 or len(pending) > 0:
 
                 time_spent = time.time() - start_time
-                should_end = time_spent > timeout
+                cancelled = self.cancelled.is_set()
+                should_end = time_spent > timeout or cancelled
+                # Plugins that are ended early are reported as timed out, or as cancelled after Fossor.cancel()
+                end_outcome = PluginResult.CANCELLED if cancelled else PluginResult.TIMED_OUT
+                end_message = 'Cancelled' if cancelled else 'Timed out (use --time-out to increase timeout)'
+                end_reason = 'the run was cancelled' if cancelled else 'it has run for too long'
 
                 try:
                     os.kill(os.getppid(), 0)  # Check if the parent process is alive
                 except ProcessLookupError:
                     should_end = True
-
-                for process in processes:  # Using list so I can delete while iterating
+                    end_reason = 'the fossor process exited'
+
+                if should_end:
+                    verbose = self.variables.get('verbose')
+                    for Plugin in pending:
+                        if not cancelled:
+                            self.log.error(f"Plugin {Plugin.get_name()} was still waiting to start after the timeout period: {timeout}")
+                        if verbose or all_results:
+                            output = 'Cancelled' if cancelled else 'Timed out waiting to start (use --time-out to increase timeout)'
+                            output_queue.put(PluginResult(Plugin.get_name(), output if verbose else None, duration=0, status=end_outcome))
+                        run_status.publish(Plugin.get_full_name(), TIMED_OUT, details={'outcome': end_outcome})
+                    pending = []
+                # Start waiting plugins as far as the host can take them, this re-evaluates as plugins complete
+                while pending and controller.may_start(len(processes)):
+                    start(pending.pop(0))
+
+                for process in list(processes):  # Copy so processes can be removed while iterating
                     process_is_dead = not process.is_alive() and process.exitcode is not None
                     if process_is_dead:
                         process.join()
+                        close_reader(process)  # Everything the plugin sent is in the pipe now
+                        if process in worker_plugins:
+                            end_worker_plugins(process, PluginResult.CRASHED)
+                        else:
+                            check_limits(process)
+                            run_status.publish(full_names[process.name], FINISHED, pid=process.pid, details=get_stats(process))
                         processes.remove(process)
                         continue
-                    if should_end:
-                        with queue_lock:
+                    if should_end and process in worker_plugins:
+                        close_reader(process)
+                        end_worker_plugins(process, end_outcome, end_message)
+                        terminator = threading.Thread(target=terminate, args=(process, end_reason), name=f'Terminate-{process.name}')
+                        terminator.start()
+                        terminators.append(terminator)
+                        processes.remove(process)
+                    elif should_end:
+                        if not cancelled:
                             self.log.error(f"Process {process} for plugin {process.name} ran longer than the timeout period: {timeout}")
-                            if self.variables.get('verbose'):
-                                output_queue.put((process.name, 'Timed out (use --time-out to increase timeout)'))
-                            self._terminate_process_group(process)
-                            processes.remove(process)
-                time.sleep(.1)
+                        close_reader(process)
+                        output = get_end_output(process.name, end_message)
+                        if output or all_results:
+                            output_queue.put(PluginResult(process.name, output, duration=time_spent, status=end_outcome))
+                        usage = get_process_usage(process.pid)
+                        run_status.publish(full_names[process.name], TIMED_OUT, pid=process.pid, details=dict(usage, outcome=end_outcome))
+                        # Terminating sleeps between signals, do it in the background so other results are still forwarded
+                        terminator = threading.Thread(target=terminate, args=(process, end_reason), name=f'Terminate-{process.name}')
+                        terminator.start()
+                        terminators.append(terminator)
+                        processes.remove(process)
 
-            with queue_lock:
-                output_queue.put(('Stats', f'Ran {len(plugins)} plugins.'))
-                output_queue.put(('EOF', 'EOF'))  # Indicate the queue is finished
+                # Wait for results, this is also the polling interval for process exits and the timeout
+                if readers:
+                    for key, events in selector.select(timeout=.1):
+                        if not forward_results(key.data):
+                            close_reader(key.data)  # The plugin exited or closed its pipe
+                else:
+                    time.sleep(.1)
+
+            for terminator in terminators:
+                terminator.join()
+            selector.close()
+
+            run_status.publish(None, RUNNER_FINISHED)
+            names = {Plugin.get_full_name() for Plugin in plugins}
+            # Count the plugins the Stats box lists, which includes the variable plugins that ended before this runner started
+            stats = f'Ran {len(names | {status.name for status in run_status.stats()})} plugins.'
+            suggestion = history.suggest_timeout({name: estimate for name, estimate in run_status.predictions.items() if name in names}, timeout)
+            if suggestion:
+                stats += f'\nPlugins usually need longer than the timeout of {timeout}s on this host, consider --time-out {suggestion}.'
+            if self.variables.get('profile_dir'):
+                stats += '\nProfiles written to {0}:\n{1}'.format(self.variables['profile_dir'], '\n'.join(profiling.list_profiles(self.variables['profile_dir'])))
+            output_queue.put(('Stats', stats))
+            output_queue.put(('EOF', 'EOF'))  # Indicate the queue is finished
 
             return output_queue
 
         timeout = int(self.variables.get('timeout'))
+        if self.run_status is None:
+            self.run_status = RunStatus()
+        run_status = self.run_status
+        run_status.runner_started()
+        if self.history is not None:
+            run_status.predictions = self.history.estimates()
 
         # Run plugins in parallel
         # This child process will spawn child processes for each plugin, and then do the final termination and clean-up.
@@ -227,22 +468,136 @@ class Fossor(object):
         parallel_plugins_helper_process = mp.Process(target=_run_plugins_parallel_helper, name='parallel_plugins_helper_process', args=(timeout, ))
         parallel_plugins_helper_process.start()
 
-        return output_queue
+        return shm.SharedMemoryQueue(output_queue)
+
+    def run_plugin(self, Plugin, result_pipe):
+        '''Runs in the plugin process, sends a PluginResult with the output, outcome and resource usage of the plugin'''
+        start_time = time.time()
+        output = None
+        status = PluginResult.NO_OUTPUT
+
+        def send_partial(partial):
+            result = PluginResult(Plugin.get_name(), partial, duration=time.time() - start_time, status=PluginResult.PARTIAL)
+            result_pipe.send(shm.pack_result(result))
 
-    def run_plugin(self, Plugin, output_queue, queue_lock):
         try:
             os.setsid()  # Causes this plugin to become a process group leader, we can then kill that process group to kill all potential subprocesses
+            plugin_limits = limits.get_limits(Plugin)
+            applied = limits.apply_limits(plugin_limits)
+            self.log.debug(f"Running {Plugin.get_name()} with resource limits: {', '.join(applied) or 'none'}")
             p = Plugin()
             setproctitle.setproctitle(p.get_name())
-            output = ''
             if p.should_run():
-                output = p.run_helper(variables=self.variables)
-                if output:
-                    with queue_lock:  # Prevents the queue from becoming corrupt on process termination
-                        output_queue.put((p.get_name(), output))
+                with profiling.profile_plugin(Plugin, self.variables):
+                    if inspect.iscoroutinefunction(p.run):
+                        output = run_coroutine(p.run_helper_async(variables=self.variables)) or None
+                    else:
+                        output = p.run_helper(variables=self.variables, partial=send_partial) or None
+                if isinstance(p.exception, MemoryError) and plugin_limits['max_address_space'] is not None:
+                    status = PluginResult.LIMIT_EXCEEDED  # Ran into its RLIMIT_AS
+                elif p.error:
+                    status = PluginResult.CRASHED
+                elif output:
+                    status = PluginResult.OK
         except Exception as e:
             # This ensures that any plugins that fail to initialize show up properly in the report and don't output errors mid report.
-            self.log.exception(f"Plugin {p} failed to initialize", e)
+            self.log.exception(f"Plugin {Plugin.get_name()} failed to initialize: {e}")
+            status = PluginResult.CRASHED
+        try:
+            stats = dict(get_own_usage(), output_size=len(str(output)) if output is not None else 0)
+            result = PluginResult(Plugin.get_name(), output, duration=time.time() - start_time, status=status, stats=stats)
+            result_pipe.send(shm.pack_result(result))  # Large outputs are sent as a shared memory handle
+        finally:
+            result_pipe.close()
+
+    def _with_partial(self, partial, message):
+        '''Output of a plugin ended early after it yielded partial, its output so far'''
+        return f'{partial}\n{message}, the output above is the last partial result'
+
+    def runs_lightweight(self, Plugin) -> bool:
+        '''Whether Plugin runs in the lightweight worker process shared with other plugins, instead of a process of its own'''
+        if Plugin.resource_limits or profiling.should_profile(Plugin.get_name(), self.variables):
+            return False
+        return Plugin.lightweight or inspect.iscoroutinefunction(Plugin.run)
+
+    def run_lightweight_plugins(self, plugins, result_pipe, timeout):
+        '''
+        Runs in the lightweight worker process, sends a PluginResult for each plugin as it completes.
+        A plugin running longer than timeout seconds is reported as timed out, the worker exits without waiting for it.
+        '''
+        try:
+            os.setsid()
+            limits.apply_limits(limits.DEFAULT_LIMITS)
+            setproctitle.setproctitle('Lightweight-Plugins')
+            run_coroutine(self._run_lightweight_plugins(plugins, result_pipe, timeout))
+        finally:
+            result_pipe.close()
+        # Threads of timed out plugins can not be stopped, exit without joining them
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(0)
+
+    async def _run_lightweight_plugins(self, plugins, result_pipe, timeout):
+        '''Plugins with an async def run are tasks of the event loop, the others run in a thread each'''
+        loop = asyncio.get_event_loop()
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(plugins), thread_name_prefix='lightweight')
+
+        def run_in_thread(p, partial):
+            before = get_thread_usage()
+            output = p.run_helper(variables=self.variables, partial=partial)
+            after = get_thread_usage()
+            return output, {field: after[field] - before[field] for field in after}
+
+        async def run_one(Plugin):
+            start_time = time.time()
+            output = None
+            status = PluginResult.NO_OUTPUT
+            usage = {}
+
+            def send_partial(partial):
+                result = shm.pack_result(PluginResult(Plugin.get_name(), partial, duration=time.time() - start_time, status=PluginResult.PARTIAL))
+                loop.call_soon_threadsafe(result_pipe.send, result)  # Sent from the event loop, like the results
+
+            try:
+                p = Plugin()
+                if p.should_run():
+                    if inspect.iscoroutinefunction(p.run):
+                        output = await asyncio.wait_for(p.run_helper_async(variables=self.variables), timeout)
+                    else:
+                        output, usage = await asyncio.wait_for(loop.run_in_executor(executor, run_in_thread, p, send_partial), timeout)
+                    output = output or None
+                    if p.error:
+                        status = PluginResult.CRASHED
+                    elif output:
+                        status = PluginResult.OK
+            except asyncio.TimeoutError:
+                self.log.error(f"Plugin {Plugin.get_name()} ran longer than its timeout period in the lightweight worker: {timeout}")
+                message = 'Timed out (use --time-out to increase timeout)'
+                output = message if self.variables.get('verbose') else None
+                if p.output:  # The last value a generator run yielded
+                    output = self._with_partial(p.output, message)
+                status = PluginResult.TIMED_OUT
+            except Exception as e:
+                self.log.exception(f"Plugin {Plugin.get_name()} failed to initialize: {e}")
+                status = PluginResult.CRASHED
+            stats = dict(usage, output_size=len(str(output)) if output is not None else 0)
+            result = PluginResult(Plugin.get_name(), output, duration=time.time() - start_time, status=status, stats=stats)
+            result_pipe.send(shm.pack_result(result))
+
+        await asyncio.gather(*(run_one(Plugin) for Plugin in plugins))
+        executor.shutdown(wait=False)
+
+    def capture_snapshots(self):
+        '''
+        Capture the snapshot sources used by the variable and check plugins about to run.
+        This happens once per run in this process, plugin processes are forked from it and share the captured values.
+        '''
+        names = set()
+        for plugin in list(self.variable_plugins) + list(self.check_plugins):
+            names.update(plugin.snapshot_sources)
+        snapshot = fossor.utils.snapshot.get_snapshot()
+        snapshot.ttl = self.variables.get('snapshot_ttl', fossor.utils.snapshot.DEFAULT_TTL)
+        snapshot.capture(names)
 
     def get_variables(self):
         '''
@@ -251,18 +606,22 @@ class Fossor(object):
               until no new variables have appeared after a run
             - Can be run again if new variables are added to fill in any blanks
         '''
+        rounds = 0
         while True:
             variable_count = len(self.variables)
-            output_queue = self._run_plugins_parallel(self.variable_plugins)
-            while True:
-                name, output = output_queue.get()
-                if 'EOF' in name:
-                    break
-                if name in self.variables:
-                    self.log.debug("Skipping variable plugin because it has already been found: {vp}".format(vp=name))
-                    continue
-                self.add_variable(name, output)
-            output_queue.close()
+            rounds += 1
+            with self.trace.span(f'variable round {rounds}'):
+                output_queue = self._run_plugins_parallel(self.variable_plugins)
+                while True:
+                    name, output = output_queue.get()
+                    if 'EOF' in name:
+                        break
+                    if name in self.variables:
+                        self.log.debug("Skipping variable plugin because it has already been found: {vp}".format(vp=name))
+                        continue
+                    self.add_variable(name, output)
+                output_queue.close()
+                self.run_status.join()
 
             if variable_count == len(self.variables):
                 self.log.debug("Done finding variables: {variables}".format(variables=self.variables))
@@ -316,26 +675,60 @@ class Fossor(object):
             self.variable_plugins = {plugin for plugin in self.variable_plugins if plugin.get_name().casefold() not in blacklist}
             self.check_plugins = {plugin for plugin in self.check_plugins if plugin.get_name().casefold() not in blacklist}
 
-    def run(self, report='StdOut', **kwargs):
-        '''Runs Fossor with the given report. Method returns a string of the report output.'''
-        self.log.debug("Starting Fossor")
-
+    def _prepare_run(self, **kwargs):
+        '''Everything a run does before the checks start: select plugins, add variables, capture snapshots and gather variables'''
         self._process_whitelist(kwargs.get('whitelist'))
         self._process_blacklist(kwargs.get('blacklist'))
 
         # Add kwargs as variables
         self.add_variables(**kwargs)
 
+        if profiling.get_profiled(self.variables):
+            if self.created_profile_dir and self.variables.get('profile_dir') == self.created_profile_dir:
+                del self.variables['profile_dir']
+            if not self.variables.get('profile_dir'):
+                self.created_profile_dir = profiling.create_profile_dir(self.variables)
+                self.add_variable('profile_dir', self.created_profile_dir)
+            else:
+                profiling.create_profile_dir(self.variables)
+
         # Add directory plugins
         self.add_plugins(kwargs.get('plugin_dir'))
 
+        try:
+            self.history = history.RuntimeHistory.load(self.variables)
+        except OSError as e:
+            self.log.warning(f"Unable to create a state directory, not using runtime history: {e}")
+
+        # Read shared sources once for all plugins
+        with self.trace.span('capture snapshots'):
+            self.capture_snapshots()
+
         # Gather Variables
-        self.get_variables()
+        with self.trace.span('get variables'):
+            self.get_variables()
 
-        # Run checks
-        output_queue = self._run_plugins_parallel(self.check_plugins)
+    def _finish_run(self):
+        '''Record the durations of the plugins that ran and write the trace'''
+        self.run_status.join()
+
+        if self.history is not None:
+            self.history.record_run(self.run_status)
+            self.history.save()
+
+        trace_path = self.variables.get('trace')
+        if trace_path:
+            try:
+                self.trace.write(trace_path, self.run_status)
+            except OSError as e:
+                self.log.error(f"Unable to write the trace to {trace_path}: {e}")
+
+    def run(self, report='StdOut', **kwargs):
+        '''Runs Fossor with the given report. Method returns a string of the report output.'''
+        self.log.debug("Starting Fossor")
+        self.cancelled.clear()
+        self._prepare_run(**kwargs)
 
-        # Run Report
         try:
             Report_Plugin = [plugin for plugin in self.report_plugins if report.lower() == plugin.get_name().lower()].pop()
         except IndexError:
@@ -343,5 +736,74 @@ class Fossor(object):
             self.log.critical(message)
             raise ValueError(message)
 
-        report_plugin = Report_Plugin()
-        return report_plugin.run(variables=self.variables, report_input=output_queue)
+        # Run checks
+        with self.trace.span('start checks'):
+            output_queue = self._run_plugins_parallel(self.check_plugins, all_results=Report_Plugin.streams_all_results,
+                                                      partial_results=Report_Plugin.streams_partial_results)
+
+        # Run Report, which renders results while the checks run
+        with self.trace.span('report', report=Report_Plugin.get_name()):
+            report_plugin = Report_Plugin()
+            result = report_plugin.run(variables=self.variables, report_input=output_queue, run_status=self.run_status)
+        self._finish_run()
+        return result
+
+    def iter_results(self, partial_results=False, **kwargs):
+        '''
+        Run the checks and yield a fossor.plugin.PluginResult with the name, output, duration and status of every check as
+        it finishes, including checks without output. Accepts the same variables as run. Stats are left out, the resource
+        usage of each plugin is in result.stats and self.run_status.
+        With partial_results the output so far of checks that yield it is also yielded, with the PluginResult.PARTIAL status.
+        Closing the generator early, e.g. by breaking out of a for loop, cancels the run: the plugins still running are
+        killed along with their process groups before close() returns.
+        '''
+        self.log.debug("Starting Fossor")
+        self.cancelled.clear()
+        self._prepare_run(**kwargs)
+
+        with self.trace.span('start checks'):
+            output_queue = self._run_plugins_parallel(self.check_plugins, all_results=True, partial_results=partial_results)
+        ended = False
+        try:
+            while True:
+                result = output_queue.get()
+                if result[0] == 'EOF':
+                    ended = True
+                    break
+                if isinstance(result, PluginResult):
+                    yield result
+        finally:
+            if not ended:
+                self.cancel()
+                while output_queue.get()[0] != 'EOF':  # The runner reports the plugins it killed, then ends the queue
+                    pass
+            output_queue.close()
+            self._finish_run()
+
+    async def stream(self, **kwargs):
+        '''
+        Asynchronous iter_results, for use with async for. The run happens in a thread of its own.
+        Leaving the async for early or cancelling the task consuming it cancels the run and kills the running plugins.
+        '''
+        loop = asyncio.get_event_loop()
+        # A single thread, so closing the results waits for a next() that is still in progress
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='fossor-stream')
+        results = self.iter_results(**kwargs)
+        end = object()
+        ended = False
+        try:
+            while True:
+                result = await asyncio.wrap_future(executor.submit(next, results, end))
+                if result is end:
+                    ended = True
+                    break
+                yield result
+        finally:
+            if not ended:
+                self.cancel()  # A next() in progress returns once the runner has ended the plugins
+            await loop.run_in_executor(executor, results.close)
+            executor.shutdown(wait=False)
+
+    def cancel(self):
+        '''End the current run early, running plugins are killed and reported with the cancelled status'''
+        self.cancelled.set()
@@ -2,17 +2,69 @@
 # See LICENSE in the project root for license information.
 
 import logging
-import subprocess
 import io
+import inspect
 import traceback
 
+import fossor.utils.shell
+import fossor.utils.snapshot
 from fossor.utils.misc import get_traceback_variables
 from abc import ABCMeta, abstractmethod
 
 
+class PluginResult(tuple):
+    '''
+    A (name, output) tuple as put on the report queue, so reports can keep unpacking it as two values.
+    Also carries how long the plugin ran for in seconds, how it ended and stats, a dict with the resource usage and
+    output size the plugin process measured, see fossor.utils.run_status.USAGE_FIELDS.
+    A PARTIAL result carries the output a plugin yielded so far, a later result for the same plugin supersedes it.
+    '''
+    OK = 'ok'
+    NO_OUTPUT = 'no_output'
+    CRASHED = 'crashed'
+    TIMED_OUT = 'timed_out'
+    LIMIT_EXCEEDED = 'limit_exceeded'
+    CANCELLED = 'cancelled'
+    PARTIAL = 'partial'
+
+    def __new__(cls, name, output, duration=None, status=OK, stats=None):
+        result = super().__new__(cls, (name, output))
+        result.duration = duration
+        result.status = status
+        result.stats = stats
+        return result
+
+    def __getnewargs__(self):
+        return (self[0], self[1], self.duration, self.status, self.stats)
+
+    @property
+    def name(self):
+        return self[0]
+
+    @property
+    def output(self):
+        return self[1]
+
+
 class Plugin(metaclass=ABCMeta):
     '''Super class for Variable and Check plugins'''
 
+    # Names of fossor.utils.snapshot sources this plugin reads, the engine captures these once per run before plugins start.
+    snapshot_sources = ()
+
+    # Overrides of the resource limits the plugin process runs under, see fossor.utils.limits.DEFAULT_LIMITS.
+    resource_limits = {}
+
+    # When the host is under pressure fossor runs fewer plugins at once, see fossor.utils.admission. Plugins with a higher
+    # priority start first, among plugins of equal priority those with a lower relative cost start first.
+    priority = 0
+    cost = 1
+
+    # Lightweight plugins, e.g. those reading a few files, run in a thread of a worker process shared with the other
+    # lightweight plugins instead of a process of their own. Plugins with an async def run always run in that worker,
+    # as a task of its event loop. Plugins with resource_limits or selected by --profile keep their own process.
+    lightweight = False
+
     def should_run(self):
         '''By default always run'''
         return True
@@ -29,56 +81,118 @@ class Plugin(metaclass=ABCMeta):
     def log(self):
         return logging.getLogger(self.get_full_name())
 
-    def shell_call(self, cmd, stream=False):
+    def snapshot(self, name):
+        '''Return the read-only value captured for a snapshot source during this run, see fossor.utils.snapshot'''
+        return fossor.utils.snapshot.get(name)
+
+    def shell_call(self, cmd, stream=False, timeout=None):
         '''
-        Cmd accept a string to run in the shell
-        return_code=False
+        Cmd accept a string to run, split on whitespace, or a list. It does not run in a shell.
+        timeout is in seconds, a command running longer is killed and subprocess.TimeoutExpired is raised.
 
         Output:
         out (string), err (string), returncode (int)
 
         Output if stream=True:
-        out (string stream), err (string stream), returncode (int)
+        out (string stream), err (string stream), returncode (None, the command is still running)
+        Prefer shell_stream, reading out to the end blocks if the command fills the err pipe meanwhile.
         '''
-        if type(cmd) == str:
-            cmd = cmd.split()
         self.log.debug(f"Executing shell command: {cmd}")
-        p = subprocess.Popen(cmd,
-                             stderr=subprocess.PIPE,
-                             stdout=subprocess.PIPE,
-                             close_fds=True,
-                             shell=False,
-                             encoding='utf-8',
-                             start_new_session=False)
         if stream:
             self.log.debug(f"Not printing output since command being streamed: {cmd}")
-            return p.stdout, p.stderr, p.returncode
-        out, err = p.communicate()
+            return fossor.utils.shell.open_streams(cmd, timeout=timeout)
+        out, err, returncode = fossor.utils.shell.shell_call(cmd, timeout=timeout)
         self.log.debug(f"Command: {cmd}, had a stdout of: {out}")
         if err:
             self.log.warning(f"Command: {cmd}, had a stderr of: {err}")
-        return out, err, p.returncode
+        return out, err, returncode
+
+    def shell_stream(self, cmd, timeout=None):
+        '''
+        Run cmd like shell_call and return a fossor.utils.shell.ShellStream, iterate over it for the lines of stdout as
+        they are written. err and returncode are set once it has been read to the end. Use it in a with block so the
+        command is killed if the plugin stops reading early, e.g.
+            with self.shell_stream('dmesg') as lines:
+                errors = [line for line in lines if 'error' in line]
+        '''
+        self.log.debug(f"Streaming shell command: {cmd}")
+        return fossor.utils.shell.ShellStream(cmd, timeout=timeout)
+
+    async def shell_call_async(self, cmd, timeout=None):
+        '''
+        Same as shell_call, for running several commands concurrently, e.g. in an async def run
+            (uptime, _, _), (users, _, _) = await asyncio.gather(self.shell_call_async('uptime'), self.shell_call_async('users'))
+        '''
+        self.log.debug(f"Executing shell command: {cmd}")
+        out, err, returncode = await fossor.utils.shell.shell_call_async(cmd, timeout=timeout)
+        self.log.debug(f"Command: {cmd}, had a stdout of: {out}")
+        if err:
+            self.log.warning(f"Command: {cmd}, had a stderr of: {err}")
+        return out, err, returncode
 
     @abstractmethod
     def run(self, variables: dict):
-        '''By default, this will only report if something is outputted.'''
+        '''
+        By default, this will only report if something is outputted.
+        A long running plugin can make run a generator that yields its output so far, e.g. after each file it read.
+        Every value yielded replaces the previous one, when the plugin times out the last value yielded is reported.
+        '''
         pass
 
-    def run_helper(self, variables: dict):
-        '''Helper method, tracks output for plugins that want to use run as their only method. Returns a string as output.'''
-        self.error = None
-        self.output = None
-        self.log.debug("Starting")
+    def run_helper(self, variables: dict, partial=None):
+        '''
+        Helper method, tracks output for plugins that want to use run as their only method. Returns a string as output.
+        When run is a generator partial is called with every value it yields, a value it returns is the final output.
+        '''
+        self._start_helper()
+        try:
+            output = self.run(variables)
+            if inspect.isgenerator(output):
+                output = self._run_generator(output, partial)
+            self.output = output
+            self.log.debug("Finished")
+        except Exception as e:
+            self._record_crash(e)
+        return self._get_helper_output(variables)
+
+    async def run_helper_async(self, variables: dict):
+        '''Same as run_helper, for plugins with an async def run'''
+        self._start_helper()
         try:
-            self.output = self.run(variables)
+            self.output = await self.run(variables)
             self.log.debug("Finished")
         except Exception as e:
-            with io.StringIO() as output:
-                traceback.print_tb(e.__traceback__, file=output)
-                output.seek(0)
-                trace = output.read()
-            trace_variables = get_traceback_variables()
-            self.error = f"Crash Report (Execution Failed)\n---exception---\n{e}\n---traceback---\n{trace}\n---variables---\n{trace_variables}"
+            self._record_crash(e)
+        return self._get_helper_output(variables)
+
+    def _run_generator(self, generator, partial=None):
+        '''Keep the latest value yielded in self.output, so it survives a crash or timeout, and return the final output'''
+        while True:
+            try:
+                output = next(generator)
+            except StopIteration as e:
+                return self.output if e.value is None else e.value
+            self.output = output
+            if output and partial is not None:
+                partial(output)
+
+    def _start_helper(self):
+        self.error = None
+        self.exception = None
+        self.output = None
+        self.log.debug("Starting")
+
+    def _record_crash(self, e):
+        '''Called in the except clause that caught e, as it reads the variables of the current traceback'''
+        self.exception = e
+        with io.StringIO() as output:
+            traceback.print_tb(e.__traceback__, file=output)
+            output.seek(0)
+            trace = output.read()
+        trace_variables = get_traceback_variables()
+        self.error = f"Crash Report (Execution Failed)\n---exception---\n{e}\n---traceback---\n{trace}\n---variables---\n{trace_variables}"
+
+    def _get_helper_output(self, variables):
         if self.should_notify():
             return self.output
         if not variables.get('verbose'):
@@ -0,0 +1,32 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+# Prints one compact json record per line as each plugin finishes, so partial results of an interrupted run are kept.
+# Plugins that yield their output so far also get a record with the partial status each time, superseded by later records.
+
+import json
+
+from fossor.reports.report import Report
+
+
+class NDJson(Report):
+    streams_all_results = True
+    streams_partial_results = True
+
+    def run(self, variables, report_input, **kwargs):
+        lines = []
+        while True:
+            result = report_input.get()
+            name, output = result
+            if name == 'EOF':
+                break
+            duration = getattr(result, 'duration', None)
+            record = {'name': name,
+                      'output': output,
+                      'duration': round(duration, 3) if duration is not None else None,
+                      'status': getattr(result, 'status', None)}
+            line = json.dumps(record, sort_keys=True, separators=(',', ':'))
+            print(line, flush=True)
+            lines.append(line)
+        report_input.close()
+        return '\n'.join(lines)
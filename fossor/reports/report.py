@@ -2,24 +2,72 @@
 # See LICENSE in the project root for license information.
 
 # Template Report Class
-import prettytable
+import re
+import math
+import textwrap
+import unicodedata
+
+from collections import Counter
+from functools import lru_cache
 
 from fossor.utils.misc import StatusPrinter
 from fossor.plugin import Plugin
+from fossor.utils.run_status import STATS_COLUMNS, DEFAULT_STATS_SORT
 
 
 TABLE_FORMATTING_WIDTH = 4  # Global so other plugins can know the width of the table formatting and truncate themselves appropriately if needed.
 
+ANSI_ESCAPE = re.compile('\033\\[[0-9;]*m')
+
+
+@lru_cache(maxsize=4096)
+def _char_width(char) -> int:
+    '''Number of terminal columns a character takes up, the same estimate the PTable package uses'''
+    code = ord(char)
+    if 0x0021 <= code <= 0x007e:  # Basic Latin
+        return 1
+    if 0x4e00 <= code <= 0x9fff or 0xac00 <= code <= 0xd7af:  # Common Chinese, Japanese and Korean, Hangul
+        return 2
+    if unicodedata.combining(char):
+        return 0
+    if 0x3040 <= code <= 0x30ff or 0xff01 <= code <= 0xff60 or 0x3000 <= code <= 0x303e:  # Kana, full width Latin, CJK punctuation
+        return 2
+    if code in (0x0008, 0x007f):  # Backspace and delete
+        return -1
+    if code in (0x0000, 0x000f, 0x001f):
+        return 0
+    return 1
+
+
+def text_width(text) -> int:
+    '''Number of terminal columns a line of text takes up, ignoring ANSI color codes'''
+    if text.isprintable():
+        try:
+            text.encode('ascii')  # str.isascii() needs Python 3.7
+            return len(text)
+        except UnicodeEncodeError:
+            pass
+    return sum(_char_width(char) for char in ANSI_ESCAPE.sub('', text))
+
+
 # TODO Add start/end times to the report
 
 
 class Report(Plugin):
+    # When True the engine also queues a PluginResult for checks that had nothing to report, crashed or timed out,
+    # with None as output unless running verbose.
+    streams_all_results = False
+    # When True the engine also queues the output so far of checks that yield it as they run, as PluginResults with the
+    # PluginResult.PARTIAL status. A later result for the same check replaces it.
+    streams_partial_results = False
+
     def run(self, variables, report_input, **kwargs):
         '''Expects a queue holding tuples like these ('name', 'output'). Expects EOF in name or value for queue termination.'''
         pass
 
-    def create_report_text(self, input_queue, timeout, width=None, max_lines_per_plugin=None, truncate=True, stdout=False):
-        '''Default report format, can be overridden'''
+    def create_report_text(self, input_queue, timeout, width=None, max_lines_per_plugin=None, truncate=True, stdout=False, run_status=None,
+                           stats_sort=DEFAULT_STATS_SORT):
+        '''Default report format, can be overridden. With a run_status the Stats box lists every plugin that ran, sorted by stats_sort.'''
         # TODO add an option to table remove formatting
 
         if not width:
@@ -37,7 +85,7 @@ class Report(Plugin):
         add_line(self._create_box_middle(text='Report', width=width, align='c'))
         add_line(seperator)
 
-        status_printer = StatusPrinter(max_width=width, timeout=timeout)
+        status_printer = StatusPrinter(max_width=width, timeout=timeout, run_status=run_status)
         while True:
             status_printer.start()
             name, output = input_queue.get()
@@ -46,16 +94,24 @@ class Report(Plugin):
             if name == 'EOF':
                 break
 
+            if name == 'Stats' and run_status is not None:
+                run_status.join()  # The runner published its last events before queueing Stats
+                output = output + '\n' + self._format_stats(run_status, stats_sort)
+
             if truncate:
                 max_width = width - TABLE_FORMATTING_WIDTH
-                output = self._truncate(text=output, max_width=max_width, max_height=max_lines_per_plugin)
+                # The Stats box lists every plugin that ran, it is never cut short
+                max_height = None if name == 'Stats' else max_lines_per_plugin
+                output = self._truncate(text=output, max_width=max_width, max_height=max_height)
 
             # Plugin Name
-            add_line(self._create_box_middle(text=f"Plugin: {name}", width=width, height=max_lines_per_plugin))
+            for line in self._iter_box_middle(text=f"Plugin: {name}", width=width, height=max_lines_per_plugin):
+                add_line(line)
 
             # Plugin Output
             add_line(seperator)
-            add_line(self._create_box_middle(text=output, width=width, height=max_lines_per_plugin))
+            for line in self._iter_box_middle(text=output, width=width, height=max_lines_per_plugin):
+                add_line(line)
             add_line(seperator)
 
         # Close the queue
@@ -63,6 +119,26 @@ class Report(Plugin):
 
         return '\n'.join(result)
 
+    def _format_stats(self, run_status, sort=DEFAULT_STATS_SORT):
+        '''Table of the outcome, timing, resource usage and output size of every plugin that ran'''
+        def number(value, scale=1, precision=2):
+            return '' if value is None else f'{value / scale:.{precision}f}'
+
+        rows = [[heading for heading, attribute in STATS_COLUMNS.values()]]
+        statuses = run_status.stats(sort)
+        short_names = Counter(status.short_name for status in statuses)
+        for status in statuses:
+            name = status.short_name if short_names[status.short_name] == 1 else status.name  # E.g. a variable and a check
+            rows.append([name, status.outcome or '', number(status.queue_wait()), number(status.elapsed()), number(status.user_cpu),
+                         number(status.system_cpu), number(status.max_rss, scale=1024 * 1024, precision=1),
+                         number(status.output_size, precision=0)])
+        widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+        lines = [f"Sorted by {sort}, use --stats-sort to sort by one of: {', '.join(STATS_COLUMNS)}"]
+        for row in rows:
+            cells = [cell.ljust(width) if column < 2 else cell.rjust(width) for column, (cell, width) in enumerate(zip(row, widths))]
+            lines.append('  '.join(cells).rstrip())
+        return '\n'.join(lines)
+
     def _create_box(self, text, width, align='l'):
         result = ''
         result += self._create_box_seperator(width=width) + "\n"
@@ -75,38 +151,68 @@ class Report(Plugin):
 
     def _create_box_middle(self, text, width=None, height=None, align='l'):
         '''Default report format, can be overridden'''
-
-        t = prettytable.PrettyTable()
-        t.hrules = prettytable.NONE
-        t.header = False
-        t.field_names = ['foo']
-        t.align = align
-        # max width must be set after field_names
-        t.min_width = width
-        t.max_width = width
-        t.min_table_width = width
-        t.max_table_width = width
-        t.add_row([text])
-        return t.get_string()
+        return '\n'.join(self._iter_box_middle(text=text, width=width, height=height, align=align))
+
+    def _iter_box_middle(self, text, width=None, height=None, align='l'):
+        '''
+        Yield the lines of a box without top or bottom borders, e.g. '| foo    |'.
+        Lines wider than the box are wrapped, everything else is padded to the width of the box. The output is the same as a
+        single column PrettyTable without header or horizontal rules, but costs a single pass over the text.
+        '''
+        content_width = self._get_box_content_width(width)
+        for line in str(text).split('\n'):
+            if text_width(line) > content_width:
+                for wrapped_line in textwrap.fill(line, content_width).split('\n'):
+                    yield '| ' + self._justify(wrapped_line, content_width, align) + ' |'
+            else:
+                yield '| ' + self._justify(line, content_width, align) + ' |'
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _get_box_content_width(width) -> int:
+        '''Width available for text inside a box of the given total width, calculated the same way PrettyTable shrinks columns'''
+        border_width = 4  # '| ' and ' |'
+        content_width = int(math.floor(width * (1.0 * width / (width + border_width))))
+        if content_width + border_width < width:
+            content_width = int(math.ceil(content_width * (1.0 * width / (content_width + border_width))))
+        return content_width
+
+    def _justify(self, text, width, align):
+        excess = width - text_width(text)
+        if align == 'l':
+            return text + excess * ' '
+        elif align == 'r':
+            return excess * ' ' + text
+        # Center, putting the uneven space on the right for text of odd width and on the left otherwise, like str.center()
+        if excess % 2:
+            if text_width(text) % 2:
+                return (excess // 2) * ' ' + text + (excess // 2 + 1) * ' '
+            return (excess // 2 + 1) * ' ' + text + (excess // 2) * ' '
+        return (excess // 2) * ' ' + text + (excess // 2) * ' '
 
     def _truncate(self, text, max_width=None, max_height=None):
+        lines = None
         if max_height:
             # Truncate line count
-            text_lines = [x for x in text.splitlines()]
-            original_height = len(text_lines)
-            if len(text_lines) > max_height:
-                text_lines = text_lines[:max_height]
-            new_height = len(text_lines)
-            text = '\n'.join(text_lines)
-            if new_height != original_height:
-                text += f'\nTruncated line count from {original_height} to {new_height}. Run with --no-truncate to stop truncation.'
+            lines = text.splitlines()
+            original_height = len(lines)
+            if original_height > max_height:
+                lines = lines[:max_height]
+            text = '\n'.join(lines)
+            if len(lines) != original_height:
+                message = f'Truncated line count from {original_height} to {len(lines)}. Run with --no-truncate to stop truncation.'
+                text += '\n' + message
+                lines.append(message)
+            elif lines and not lines[-1]:
+                lines = lines[:-1]  # The joined text ends with a newline, which splitlines() would not count as another line
 
         if max_width:
-            text_split = text.splitlines()
-            long_line_count = len([line for line in text_split if len(line) > max_width])
+            if lines is None:
+                lines = text.splitlines()
+            long_line_count = sum(1 for line in lines if len(line) > max_width)
             # Truncate line length to fit in table
             if long_line_count > 0:
-                text = '\n'.join([x[:max_width] for x in text_split])
+                text = '\n'.join([line[:max_width] for line in lines])
                 text += f'\nTruncated {long_line_count} lines to a width of {max_width}. Run with --no-truncate to stop truncation.'
 
         return text
@@ -3,6 +3,7 @@
 
 # Cli Report
 from fossor.reports.report import Report
+from fossor.utils.run_status import STATS_COLUMNS, DEFAULT_STATS_SORT
 
 
 class StdOut(Report):
@@ -15,6 +16,11 @@ class StdOut(Report):
         if truncate:
             kwargs['max_lines_per_plugin'] = 20
         debug = variables.get('debug', False)
+        stats_sort = str(variables.get('stats_sort', DEFAULT_STATS_SORT)).lower()
+        if stats_sort not in STATS_COLUMNS:
+            self.log.warning(f"Unknown stats_sort {stats_sort}, sorting by {DEFAULT_STATS_SORT}. Expected one of: {', '.join(STATS_COLUMNS)}")
+            stats_sort = DEFAULT_STATS_SORT
+        kwargs['stats_sort'] = stats_sort
 
         # If in debug mode, don't print line by line, print all at once in the print statement below instead
         # This prevents logs lines becoming interspersed with the report.
@@ -0,0 +1,117 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+'''
+Admission control for plugin processes, so a run on a degraded host does not add a fork storm to its troubles.
+
+On a healthy host every plugin starts at once. Under pressure, measured from pressure stall information, the load
+average and available memory, the plugin runner only keeps as many plugins running as the host can take. It
+re-evaluates this as plugins complete, and starts the plugins with the highest priority and the lowest cost first.
+The max_concurrency variable caps the number of plugins running at once regardless of pressure.
+'''
+
+import os
+import time
+import logging
+
+import psutil
+
+from fossor.utils import pressure
+
+log = logging.getLogger(__name__)
+
+MIN_CONCURRENCY = 2  # Never fewer plugins at once than this, so a single slow plugin does not hold up the rest
+REEVALUATE_INTERVAL = 1  # Seconds, pressure is read at most this often
+
+# Signal: (value at which pressure starts, value of full pressure). Readings in between scale linearly.
+THRESHOLDS = {
+    'load': (1, 4),  # 1 minute load average per cpu
+    'cpu_some': (20, 80),  # PSI averages over 10 seconds, in percent
+    'memory_some': (10, 50),
+    'memory_full': (2, 20),
+    'io_full': (10, 60),
+    'memory_used': (.8, .98),  # Share of memory not available
+}
+
+
+def read_signals(pressure_path=pressure.PRESSURE_PATH) -> dict:
+    '''Current readings of the signals in THRESHOLDS, signals that can not be read on this host are left out'''
+    signals = {}
+    try:
+        signals['load'] = os.getloadavg()[0] / (os.cpu_count() or 1)
+    except OSError:
+        pass
+    for resource, kinds in (('cpu', ('some', )), ('memory', ('some', 'full')), ('io', ('full', ))):
+        psi = pressure.read_pressure(resource, path=f'{pressure_path}/{resource}')
+        for kind in kinds:
+            if psi and kind in psi:
+                signals[f'{resource}_{kind}'] = psi[kind]['avg10']
+    try:
+        memory = psutil.virtual_memory()
+        signals['memory_used'] = 1 - memory.available / memory.total
+    except (OSError, ZeroDivisionError):
+        pass
+    return signals
+
+
+def get_pressure(signals) -> float:
+    '''Pressure between 0 (healthy) and 1 (saturated), the highest of the scaled signals'''
+    result = 0
+    for name, value in signals.items():
+        start, full = THRESHOLDS[name]
+        result = max(result, min(1, max(0, (value - start) / (full - start))))
+    return result
+
+
+def get_concurrency(level, cpu_count=None, max_concurrency=None):
+    '''Number of plugins to run at once under a pressure level, None when there is no limit'''
+    if level <= 0:
+        return max_concurrency
+    cpu_count = cpu_count or os.cpu_count() or 1
+    concurrency = max(MIN_CONCURRENCY, int(round(2 * cpu_count * (1 - level))))
+    if max_concurrency:
+        concurrency = min(concurrency, max_concurrency)
+    return concurrency
+
+
+def admission_order(plugins, predictions=None) -> list:
+    '''
+    Plugins with the highest priority first, then the cheapest. Plugins of equal cost that usually run longest start
+    first according to predictions, {full name: fossor.utils.history.Estimate}, so they do not end up stretching the run.
+    '''
+    predictions = predictions or {}
+
+    def expected(Plugin):
+        estimate = predictions.get(Plugin.get_full_name())
+        return estimate.ewma if estimate else 0
+
+    return sorted(plugins, key=lambda Plugin: (-Plugin.priority, Plugin.cost, -expected(Plugin)))
+
+
+class AdmissionController(object):
+    '''Decides how many plugins may run at once, the runner asks it every time it could start another plugin'''
+    def __init__(self, max_concurrency=None, read_signals=read_signals, interval=REEVALUATE_INTERVAL):
+        self.max_concurrency = int(max_concurrency) if max_concurrency else None
+        self.read_signals = read_signals
+        self.interval = interval
+        self.concurrency = None
+        self.level = 0
+        self.evaluated = None
+        self.evaluate()
+
+    def evaluate(self):
+        '''Read the pressure on the host again and size the concurrency from it'''
+        signals = self.read_signals()
+        self.level = get_pressure(signals)
+        concurrency = get_concurrency(self.level, max_concurrency=self.max_concurrency)
+        if concurrency != self.concurrency:
+            readings = ', '.join(f'{name}={value:.2f}' for name, value in sorted(signals.items()))
+            log.debug(f"Plugin concurrency is now {concurrency or 'unlimited'} at pressure {self.level:.2f} ({readings})")
+        self.concurrency = concurrency
+        self.evaluated = time.time()
+
+    def may_start(self, running) -> bool:
+        '''Whether another plugin may start while running plugins are running, re-evaluates if the last reading is stale'''
+        if self.concurrency is not None and time.time() - self.evaluated >= self.interval:
+            self.evaluate()
+        return self.concurrency is None or running < self.concurrency
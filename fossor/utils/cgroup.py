@@ -0,0 +1,88 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+'''Locate and read the cgroup of a process, supports the cgroup v2 unified hierarchy and cgroup v1 controllers.'''
+
+import os
+import logging
+
+from fossor.utils.proc import PROC_PATH
+
+log = logging.getLogger(__name__)
+
+MOUNTINFO_PATH = '/proc/self/mountinfo'
+UNIFIED = ''  # Controller name used for the cgroup v2 hierarchy, the same as the empty controller list in /proc/<pid>/cgroup
+
+
+def get_cgroup_mounts(mountinfo_path=MOUNTINFO_PATH) -> dict:
+    '''
+    Return {controller: (root, mount point)} for mounted cgroup hierarchies. The cgroup v2 hierarchy is under UNIFIED.
+    Example lines:
+        30 23 0:26 / /sys/fs/cgroup rw,nosuid,nodev,noexec,relatime shared:4 - cgroup2 cgroup2 rw
+        35 25 0:31 / /sys/fs/cgroup/memory rw,nosuid,nodev,noexec,relatime shared:9 - cgroup cgroup rw,memory
+    '''
+    mounts = {}
+    with open(mountinfo_path) as f:
+        for line in f:
+            fields, separator, fs_fields = line.partition(' - ')
+            fields = fields.split()
+            fs_fields = fs_fields.split()
+            if not separator or len(fields) < 5 or len(fs_fields) < 3:
+                continue
+            root, mount_point = fields[3], fields[4]
+            if fs_fields[0] == 'cgroup2':
+                mounts[UNIFIED] = (root, mount_point)
+            elif fs_fields[0] == 'cgroup':
+                for option in fs_fields[2].split(','):
+                    mounts.setdefault(option, (root, mount_point))
+    return mounts
+
+
+def get_cgroup_dir(pid, controller=UNIFIED, proc_path=PROC_PATH, mountinfo_path=MOUNTINFO_PATH):
+    '''
+    Return the directory of the cgroup pid belongs to for a controller (e.g. memory or cpu for cgroup v1), or UNIFIED for
+    cgroup v2. Returns None if the process is gone or the hierarchy is not mounted.
+    '''
+    try:
+        with open(f'{proc_path}/{pid}/cgroup') as f:
+            lines = f.read().splitlines()
+        mounts = get_cgroup_mounts(mountinfo_path=mountinfo_path)
+    except OSError as e:
+        log.debug(f"Unable to determine the cgroup of pid {pid}: {e}")
+        return None
+
+    for line in lines:
+        # Example: 4:memory:/system.slice/app.service or 0::/system.slice/app.service
+        _, controllers, path = line.split(':', 2)
+        if controller not in controllers.split(','):
+            continue
+        if controller not in mounts:
+            return None
+        root, mount_point = mounts[controller]
+        # Paths are relative to the root of the mount, which differs from / inside containers.
+        if root != '/' and (path == root or path.startswith(root + '/')):
+            path = path[len(root):]
+        directory = os.path.join(mount_point, path.lstrip('/'))
+        if os.path.isdir(directory):
+            return directory
+        return None
+    return None
+
+
+def read_value(directory, name):
+    '''Return a single value file such as memory.max as an int, or None if it is unlimited ("max"). Raises OSError.'''
+    with open(os.path.join(directory, name)) as f:
+        value = f.read().strip()
+    if value == 'max':
+        return None
+    return int(value)
+
+
+def read_keyed(directory, name) -> dict:
+    '''Return a flat keyed file such as memory.events or cpu.stat as {key: int}. Raises OSError.'''
+    values = {}
+    with open(os.path.join(directory, name)) as f:
+        for line in f:
+            key, _, value = line.partition(' ')
+            values[key] = int(value)
+    return values
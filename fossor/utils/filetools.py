@@ -2,14 +2,54 @@
 # See LICENSE in the project root for license information.
 
 import os
+import re
 import gzip
 import logging
 
 from datetime import datetime
+from collections import namedtuple
 
 from fossor.utils.misc import comparetimerange, iswithintimerange
 
 
+LogFile = namedtuple('LogFile', 'path, size, mtime')
+
+COMPRESSED_SUFFIX = r'(?:\.(?:gz|bz2|xz|zst))?'
+# Suffixes logrotate and common logging libraries add to rotated files: .1, .2.gz, -20170901, .2017-09-01, .2017-09-01_13
+ROTATED_SUFFIX = r'[.-](?:\d+|\d{4}-?\d{2}-?\d{2}(?:[-_T.]?\d{2,6})?(?:\.\d+)?)'
+
+
+def find_rotated_logs(path) -> list:
+    '''
+    Return a LogFile for path and every rotated version of it in the same directory, ordered by mtime, oldest first.
+    Rotated versions are either path with a rotation suffix, e.g. app.log.1 or app.log-20170901.gz, or have
+    the rotation suffix before the extension, e.g. app.2017-09-01.log. Only stats files, none are opened.
+    '''
+    directory, name = os.path.split(path)
+    stem, extension = os.path.splitext(name)
+    patterns = [re.escape(name) + ROTATED_SUFFIX + COMPRESSED_SUFFIX]
+    if extension:
+        patterns.append(re.escape(stem) + ROTATED_SUFFIX + re.escape(extension) + COMPRESSED_SUFFIX)
+    rotated = re.compile('|'.join(f'(?:{pattern})' for pattern in patterns) + '$')
+
+    log_files = []
+    try:
+        with os.scandir(directory or '.') as entries:
+            for entry in entries:
+                if entry.name != name and not rotated.match(entry.name):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # Rotated away while scanning
+                if entry.is_file():
+                    log_files.append(LogFile(path=entry.path, size=stat.st_size, mtime=stat.st_mtime))
+    except OSError as e:
+        logging.getLogger(__name__).debug(f"Unable to list rotated logs of {path}: {e}")
+    log_files.sort(key=lambda log_file: log_file.mtime)
+    return log_files
+
+
 class FileTools(object):
 
     def __init__(self, date_format=None):
@@ -52,6 +92,16 @@ class FileTools(object):
                 else:
                     raise e
 
+    def _modified_before(self, file_path, start_time) -> bool:
+        '''True if the file was last written to before start_time, so none of its lines can be in the time range'''
+        if not start_time:
+            return False
+        try:
+            mtime = os.stat(file_path).st_mtime
+        except OSError:
+            return False  # Let opening the file report the problem
+        return comparetimerange(mtime, start_time=start_time, end_time=None) < 0
+
     def _open_log_file(self, file_path):
         '''Determine if file is gzipped or not, and then return an appropriate file handle.'''
         try:
@@ -148,6 +198,9 @@ class FileTools(object):
 
         file_handles = []
         for file_path in file_paths:
+            if self._modified_before(file_path, start_time):
+                self.log.debug(f"Skipping file {file_path} since it was last modified before the start_time: {start_time}")
+                continue
             f = self._open_log_file(file_path)
             first, last = self.get_first_last_lines(f)
 
@@ -0,0 +1,116 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+'''
+How long plugins took on previous runs on this host, kept in the state dir between runs.
+
+The engine records the duration of every plugin that finished or timed out. The estimates drive three things: plugins
+that usually run longest start first so they do not stretch the run when concurrency is limited, the status line shows
+when the running plugins are predicted to complete, and the Stats box suggests a timeout when plugins usually need more.
+
+A plugin that timed out would have needed longer than it got, so its duration is only a lower bound: it raises the
+moving average to at least that duration and is counted, but it is not a sample. Timeouts are therefore only suggested
+from the durations of runs that completed, otherwise a hung plugin would keep asking for a longer timeout.
+'''
+
+import os
+import json
+import math
+import socket
+import logging
+
+from collections import namedtuple
+
+from fossor.plugin import PluginResult
+from fossor.utils.misc import get_state_dir
+
+log = logging.getLogger(__name__)
+
+HISTORY_FILE = 'runtime_history.json'
+MAX_SAMPLES = 20  # Durations kept per plugin for the p95
+EWMA_WEIGHT = .3  # Weight of the newest duration in the moving average
+TIMEOUT_HEADROOM = 1.5  # Suggested timeouts leave this much room above the p95
+MIN_SUGGEST_SAMPLES = 3  # Completed runs of a plugin needed before its p95 is used to suggest a timeout
+RECORDED_OUTCOMES = (PluginResult.OK, PluginResult.NO_OUTPUT, PluginResult.TIMED_OUT)  # Crashes say little about the usual duration
+
+Estimate = namedtuple('Estimate', 'ewma, p95, count, timeouts')  # p95 and count of completed runs, p95 is None without any
+Estimate.__new__.__defaults__ = (0, )  # timeouts
+
+
+def percentile(values, percent):
+    '''Nearest rank percentile of a non empty list'''
+    values = sorted(values)
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+class RuntimeHistory(object):
+    '''
+    Durations of the plugins of one host, by full plugin name,
+    {plugin: {'ewma': seconds, 'samples': [seconds, ...], 'count': completed runs, 'timeouts': timed out runs}}
+    '''
+    def __init__(self, path=None, host=None):
+        self.path = path
+        self.host = host or socket.gethostname()
+        self.hosts = {}  # host: plugins, the state dir may be a home directory shared between hosts
+
+    @classmethod
+    def load(cls, variables=None, host=None):
+        '''Read the history from the state dir, an unreadable history starts over'''
+        history = cls(os.path.join(get_state_dir(variables), HISTORY_FILE), host=host)
+        try:
+            with open(history.path) as f:
+                history.hosts = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            log.warning(f"Ignoring unreadable runtime history {history.path}: {e}")
+        return history
+
+    def save(self):
+        tmp_path = f'{self.path}.{os.getpid()}'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.hosts, f)
+            os.replace(tmp_path, self.path)  # Atomic, so concurrent runs never read a partially written file
+        except OSError as e:
+            log.warning(f"Unable to save runtime history {self.path}: {e}")
+
+    @property
+    def plugins(self) -> dict:
+        return self.hosts.setdefault(self.host, {})
+
+    def record(self, name, duration, timed_out=False):
+        entry = self.plugins.setdefault(name, {'ewma': duration, 'samples': [], 'count': 0})
+        if timed_out:  # Censored, the plugin needs at least duration
+            entry['ewma'] = max(entry['ewma'], duration)
+            entry['timeouts'] = entry.get('timeouts', 0) + 1
+            return
+        entry['ewma'] = EWMA_WEIGHT * duration + (1 - EWMA_WEIGHT) * entry['ewma']
+        entry['samples'] = (entry['samples'] + [round(duration, 3)])[-MAX_SAMPLES:]
+        entry['count'] += 1
+
+    def record_run(self, run_status):
+        '''Record the plugins that ran, a timed out plugin is recorded with the time it got, its duration is at least that'''
+        for status in run_status.plugins.values():
+            if status.started is not None and status.ended is not None and status.outcome in RECORDED_OUTCOMES:
+                self.record(status.name, status.elapsed(), timed_out=status.outcome == PluginResult.TIMED_OUT)
+
+    def estimates(self) -> dict:
+        '''{plugin: Estimate} for this host'''
+        return {name: Estimate(ewma=entry['ewma'], p95=percentile(entry['samples'], 95) if entry['samples'] else None,
+                               count=entry['count'], timeouts=entry.get('timeouts', 0))
+                for name, entry in self.plugins.items() if entry['samples'] or entry.get('timeouts')}
+
+
+def suggest_timeout(estimates, timeout):
+    '''
+    A timeout that leaves TIMEOUT_HEADROOM above the largest p95 of plugins with MIN_SUGGEST_SAMPLES completed runs,
+    or None if timeout already does
+    '''
+    p95s = [estimate.p95 for estimate in estimates.values() if estimate.p95 is not None and estimate.count >= MIN_SUGGEST_SAMPLES]
+    if not p95s:
+        return None
+    suggestion = math.ceil(max(p95s) * TIMEOUT_HEADROOM)
+    if suggestion <= timeout:
+        return None
+    return suggestion
@@ -0,0 +1,141 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+import os
+import re
+import time
+import logging
+
+from collections import namedtuple
+
+log = logging.getLogger(__name__)
+
+KMSG_PATH = '/dev/kmsg'
+RECORD_MAX_SIZE = 8192  # Same as the kernel's CONSOLE_EXT_LOG_MAX, a single read must be able to hold an entire record.
+
+dmesg_pattern = re.compile(r'\[\s*(\d+\.\d+)\] (.*)')
+
+
+class KernelLogRecord(namedtuple('KernelLogRecord', 'level, facility, sequence, timestamp_usec, message')):
+    '''A single kernel log message. timestamp_usec is the kernel's monotonic clock in microseconds since boot.'''
+    __slots__ = ()
+
+    @property
+    def uptime(self) -> float:
+        '''Seconds since boot, the same value dmesg shows in brackets'''
+        return self.timestamp_usec / 1000000
+
+
+def parse_record(raw):
+    '''
+    Parse a /dev/kmsg record which looks like this: b'6,339,5140900,-;message text\n SUBSYSTEM=acpi\n'
+    The header is prefix,sequence,timestamp,flags. Lines after the first are key/value continuation lines and are dropped.
+    '''
+    header, _, text = raw.partition(b';')
+    fields = header.split(b',')
+    prefix = int(fields[0])
+    message = text.split(b'\n', 1)[0].decode('utf-8', errors='replace')
+    return KernelLogRecord(level=prefix & 7, facility=prefix >> 3, sequence=int(fields[1]), timestamp_usec=int(fields[2]), message=message)
+
+
+def parse_dmesg_output(lines):
+    '''Return KernelLogRecords from the text output of the dmesg binary, used where /dev/kmsg can not be read.'''
+    records = []
+    for line in lines:
+        m = dmesg_pattern.match(line)
+        if not m:
+            continue
+        timestamp_usec = int(float(m.group(1)) * 1000000)
+        records.append(KernelLogRecord(level=None, facility=None, sequence=None, timestamp_usec=timestamp_usec, message=m.group(2)))
+    return records
+
+
+def get_boot_time() -> float:
+    '''Return the wall clock time the kernel's monotonic clock started at'''
+    return time.time() - time.clock_gettime(time.CLOCK_MONOTONIC)
+
+
+class KernelLog(object):
+    '''
+    Reads the kernel ring buffer straight from /dev/kmsg in non-blocking mode instead of spawning dmesg.
+    Records are read once and kept, so every caller in the same process shares a single pass over the ring buffer.
+    read_records(refresh=True) reads the ring buffer again, e.g. for a new snapshot.
+    '''
+    def __init__(self, path=KMSG_PATH):
+        self.path = path
+        self._records = None
+
+    def read_records(self, refresh=False) -> list:
+        '''Return all records currently in the ring buffer. Raises OSError if the kernel log is not readable.'''
+        if self._records is not None and not refresh:
+            return self._records
+
+        records = []
+        fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            while True:
+                try:
+                    raw = os.read(fd, RECORD_MAX_SIZE)
+                except BlockingIOError:
+                    break  # Reached the end of the ring buffer
+                except BrokenPipeError:
+                    log.debug(f"Records in {self.path} were overwritten while reading, continuing with the oldest available record.")
+                    continue
+                if not raw:
+                    break
+                try:
+                    records.append(parse_record(raw))
+                except (ValueError, IndexError):
+                    log.debug(f"Skipping malformed record from {self.path}: {raw}")
+        finally:
+            os.close(fd)
+
+        log.debug(f"Read {len(records)} records from {self.path}")
+        self._records = records
+        return records
+
+    def records(self, start_time=None, end_time=None):
+        '''Yield (timestamp, record) tuples with wall clock timestamps within the time range.'''
+        return records_in_time_range(self.read_records(), start_time=start_time, end_time=end_time)
+
+
+def records_in_time_range(records, start_time=None, end_time=None):
+    '''
+    Yield (timestamp, record) tuples from a sequence of records for those with wall clock timestamps within the time range.
+    The time range is converted to the kernel's microsecond timestamps once, records are in timestamp order so
+    a binary search seeks to the first record in range and reading stops at the first record past end_time.
+    '''
+    boot_time = get_boot_time()
+    end_usec = int((end_time - boot_time) * 1000000) if end_time else None
+
+    start = 0
+    if start_time:
+        start = _seek(records, int((start_time - boot_time) * 1000000))
+
+    for record in records[start:]:
+        if end_usec is not None and record.timestamp_usec > end_usec:
+            break
+        yield boot_time + record.uptime, record
+
+
+def _seek(records, timestamp_usec) -> int:
+    '''Return the index of the first record at or after timestamp_usec'''
+    low, high = 0, len(records)
+    while low < high:
+        middle = (low + high) // 2
+        if records[middle].timestamp_usec < timestamp_usec:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+_kernel_log = None
+
+
+def get_kernel_log() -> KernelLog:
+    '''Return the KernelLog shared by all plugins running in this process'''
+    global _kernel_log
+    if _kernel_log is None:
+        _kernel_log = KernelLog()
+    return _kernel_log
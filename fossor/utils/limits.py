@@ -0,0 +1,193 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+'''
+Resource limits for plugin processes, so fossor does not make things worse on a host that is already struggling.
+
+Every plugin process lowers its cpu and io priority before the plugin runs. A plugin overrides the defaults below with
+a resource_limits dict on its class, e.g. resource_limits = {'nice': 19, 'max_cpu_time': 30}. A value of None leaves
+that limit unset. When fossor runs in a cgroup v2 that has the memory or cpu controller enabled
+for its children, cgroup_memory_max and cgroup_cpu_max put the plugin in a leaf cgroup of its own with memory.max and
+cpu.max set. Limits that can not be applied are logged and skipped, the plugin runs regardless.
+'''
+
+import os
+import signal
+import logging
+import resource
+
+import psutil
+
+from fossor.utils import cgroup
+from fossor.utils.misc import psutil_exceptions
+
+log = logging.getLogger(__name__)
+
+IDLE = 'idle'
+BEST_EFFORT = 'best-effort'
+IO_CLASSES = (IDLE, BEST_EFFORT)
+BEST_EFFORT_LEVEL = 7  # Lowest priority within the best-effort class
+
+DEFAULT_LIMITS = {
+    'nice': 10,  # Niceness, a process is never made less nice than fossor itself
+    'io_class': BEST_EFFORT,  # IDLE only gets disk time when nothing else wants it, which can stall a plugin on a busy disk
+    # Bytes of virtual memory, RLIMIT_AS, also applies to commands the plugin runs. Not set by default, since JVM tools,
+    # Go binaries and others reserve large address ranges at startup and would fail under a limit sized for memory use.
+    'max_address_space': None,
+    'max_cpu_time': None,  # Seconds of cpu time, RLIMIT_CPU, the process receives SIGXCPU when it is exceeded
+    'cgroup_memory_max': None,  # Bytes, memory.max of the leaf cgroup
+    'cgroup_cpu_max': None,  # Number of cpus, cpu.max of the leaf cgroup
+}
+
+CGROUP_LEAF_PREFIX = 'fossor-'
+CPU_MAX_PERIOD = 100000  # Microseconds
+
+
+def get_limits(Plugin) -> dict:
+    '''The defaults updated with the resource_limits of a plugin class, raises ValueError for unknown limits'''
+    overrides = getattr(Plugin, 'resource_limits', None) or {}
+    unknown = set(overrides) - set(DEFAULT_LIMITS)
+    if unknown:
+        raise ValueError(f"Unknown resource limits {sorted(unknown)} on {Plugin.get_name()}, known limits are: {list(DEFAULT_LIMITS)}")
+    return dict(DEFAULT_LIMITS, **overrides)
+
+
+def apply_limits(limits, pid=None) -> list:
+    '''Apply limits to the calling process, pid is used to name its leaf cgroup. Returns descriptions of the limits applied.'''
+    pid = pid or os.getpid()
+    applied = []
+
+    if limits['nice'] is not None:
+        try:
+            current = os.getpriority(os.PRIO_PROCESS, 0)
+            if limits['nice'] > current:
+                os.setpriority(os.PRIO_PROCESS, 0, limits['nice'])
+                applied.append(f"nice {limits['nice']}")
+        except OSError as e:
+            log.debug(f"Unable to set niceness to {limits['nice']}: {e}")
+
+    if limits['io_class'] is not None:
+        if limits['io_class'] not in IO_CLASSES:
+            log.warning(f"Unknown io_class {limits['io_class']}, expected one of: {IO_CLASSES}")
+        elif not hasattr(psutil, 'IOPRIO_CLASS_IDLE'):
+            log.debug("Setting the io priority is not supported on this platform")
+        else:
+            try:
+                if limits['io_class'] == IDLE:
+                    psutil.Process().ionice(psutil.IOPRIO_CLASS_IDLE)
+                else:
+                    psutil.Process().ionice(psutil.IOPRIO_CLASS_BE, BEST_EFFORT_LEVEL)
+                applied.append(f"io class {limits['io_class']}")
+            except psutil_exceptions as e:
+                log.debug(f"Unable to set the io class to {limits['io_class']}: {e}")
+
+    for name, limit in (('max_address_space', resource.RLIMIT_AS), ('max_cpu_time', resource.RLIMIT_CPU)):
+        value = limits[name]
+        if value is None:
+            continue
+        value = int(value)
+        try:
+            soft, hard = resource.getrlimit(limit)
+            if hard != resource.RLIM_INFINITY:
+                value = min(value, hard)
+            if soft != resource.RLIM_INFINITY and soft <= value:
+                continue  # Already limited at least as much
+            if name == 'max_cpu_time' and (hard == resource.RLIM_INFINITY or hard > value + 5):
+                hard = value + 5  # SIGKILL if SIGXCPU is handled and the process keeps going
+            resource.setrlimit(limit, (value, hard))
+            applied.append(f"{name} {value}")
+        except (ValueError, OSError) as e:
+            log.debug(f"Unable to set {name} to {value}: {e}")
+
+    if limits['cgroup_memory_max'] is not None or limits['cgroup_cpu_max'] is not None:
+        leaf = create_cgroup_leaf(pid, memory_max=limits['cgroup_memory_max'], cpu_max=limits['cgroup_cpu_max'])
+        if leaf:
+            applied.append(f"cgroup {leaf}")
+    return applied
+
+
+def get_cgroup_leaf(pid, parent=None):
+    '''Path of the leaf cgroup for plugin process pid, beneath the cgroup v2 of this process unless parent is given'''
+    parent = parent or cgroup.get_cgroup_dir('self')
+    if not parent:
+        return None
+    return os.path.join(parent, f'{CGROUP_LEAF_PREFIX}{pid}')
+
+
+def create_cgroup_leaf(pid, memory_max=None, cpu_max=None, parent=None):
+    '''
+    Create a leaf cgroup beneath parent with memory.max and cpu.max and move pid into it. Returns its path, or None if
+    there is no cgroup v2, the controllers are not enabled for children of parent or the cgroup can not be written.
+    Controllers are never enabled here, doing so would fail or move processes in a hierarchy fossor does not own.
+    '''
+    parent = parent or cgroup.get_cgroup_dir('self')
+    if not parent:
+        return None
+    needed = {name for name, value in (('memory', memory_max), ('cpu', cpu_max)) if value is not None}
+    leaf = get_cgroup_leaf(pid, parent=parent)
+    try:
+        with open(os.path.join(parent, 'cgroup.subtree_control')) as f:
+            enabled = set(f.read().split())
+        if not needed <= enabled:
+            log.debug(f"Not creating a cgroup for pid {pid}, {sorted(needed - enabled)} not enabled in {parent}")
+            return None
+        os.mkdir(leaf)
+    except OSError as e:
+        log.debug(f"Unable to create a cgroup for pid {pid} in {parent}: {e}")
+        return None
+    try:
+        if memory_max is not None:
+            _write(leaf, 'memory.max', str(int(memory_max)))
+            _write(leaf, 'memory.swap.max', '0', required=False)  # Otherwise the limit only moves the plugin into swap
+        if cpu_max is not None:
+            _write(leaf, 'cpu.max', f'{max(int(cpu_max * CPU_MAX_PERIOD), 1000)} {CPU_MAX_PERIOD}')
+        _write(leaf, 'cgroup.procs', str(pid))
+    except OSError as e:
+        log.debug(f"Unable to set up the cgroup {leaf} for pid {pid}: {e}")
+        remove_cgroup_leaf(leaf)
+        return None
+    return leaf
+
+
+def _write(directory, name, value, required=True):
+    try:
+        with open(os.path.join(directory, name), 'w') as f:
+            f.write(value)
+    except FileNotFoundError:
+        if required:
+            raise
+
+
+def get_cgroup_breaches(leaf) -> list:
+    '''Descriptions of the limits of a leaf cgroup that were hit, from memory.events and cpu.stat'''
+    breaches = []
+    try:
+        events = cgroup.read_keyed(leaf, 'memory.events')
+        if events.get('oom_kill'):
+            breaches.append(f"killed for exceeding its cgroup memory.max of {cgroup.read_value(leaf, 'memory.max')} bytes")
+    except OSError:
+        pass
+    try:
+        throttled = cgroup.read_keyed(leaf, 'cpu.stat').get('throttled_usec')
+        if throttled:
+            log.debug(f"Plugin in {leaf} was throttled by its cgroup cpu.max for {throttled / 1000000:.2f} seconds")
+    except OSError:
+        pass
+    return breaches
+
+
+def remove_cgroup_leaf(leaf):
+    '''Remove a leaf cgroup once its processes exited, it is left in place if any remain'''
+    try:
+        os.rmdir(leaf)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        log.debug(f"Unable to remove the cgroup {leaf}: {e}")
+
+
+def describe_exit(limits, exitcode):
+    '''Description of the limit a plugin process breached if exitcode shows it was killed for it, otherwise None'''
+    if exitcode == -signal.SIGXCPU and limits.get('max_cpu_time') is not None:
+        return f"killed for exceeding its max_cpu_time of {limits['max_cpu_time']} seconds"
+    return None
@@ -2,10 +2,12 @@
 # See LICENSE in the project root for license information.
 
 import sys
+import math
 import logging
 import os
 import psutil
 import time
+import asyncio
 
 from threading import Thread
 from datetime import datetime
@@ -70,10 +72,15 @@ def get_subprocess_names():
 
 
 class StatusPrinter(object):
-    '''Continually prints the status until stopped.'''
-    def __init__(self, timeout, max_width=None):
+    '''
+    Continually prints the status until stopped.
+    With a fossor.utils.run_status.RunStatus the running plugins and their elapsed time are rendered from the events
+    the engine publishes, otherwise the names of subprocesses are shown.
+    '''
+    def __init__(self, timeout, max_width=None, run_status=None):
         self.start_time = time.time()
         self.timeout = timeout
+        self.run_status = run_status
         self.should_stop = False
         self.t = None
         self.line = ''
@@ -97,9 +104,9 @@ class StatusPrinter(object):
     def printer(self):
         while not self.should_stop:
             time.sleep(.1)
-            plugins = ', '.join({x for x in get_subprocess_names()})
             elapsed_time = int(time.time() - self.start_time)
-            new_line = f"Time: {elapsed_time}/{self.timeout}. Running plugins: {plugins}"
+            running_plugins = self.get_running_plugins()
+            new_line = f"Time: {elapsed_time}/{self.timeout}.{self.get_prediction()} Running plugins: {running_plugins}"
             new_line = f"{new_line:.{self.max_width}}"
             if new_line == self.line:
                 continue
@@ -118,6 +125,22 @@ class StatusPrinter(object):
         sys.stdout.write('\x1b[2K\r')
         sys.stdout.flush()
 
+    def get_prediction(self) -> str:
+        '''Predicted time until the plugins complete based on previous runs, see fossor.utils.history'''
+        if self.run_status is None:
+            return ''
+        remaining = self.run_status.predict_remaining()
+        if remaining is None:
+            return ''
+        return f' Predicted completion in {int(math.ceil(remaining))}s.'
+
+    def get_running_plugins(self) -> str:
+        if self.run_status is None:
+            return ', '.join({x for x in get_subprocess_names()})
+        self.run_status.update()
+        now = time.time()
+        return ', '.join(f'{status.short_name} ({int(status.elapsed(now))}s)' for status in self.run_status.running())
+
 
 def get_traceback_variables():
     '''Intended to be called in the except step of a try/except clause to gather all the local variables for printing.'''
@@ -159,3 +182,42 @@ def common_path(binaries):
         if os.path.isfile(filename):
             return filename
     raise FileNotFoundError(', '.join(binaries))
+
+
+def get_state_dir(variables=None):
+    '''Return the directory for the small files fossor keeps between runs, such as sample history. Created if missing.
+    Can be overridden with the state_dir variable.'''
+    path = None
+    if variables:
+        path = variables.get('state_dir', None)
+    if not path:
+        cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        path = os.path.join(cache_dir, 'fossor')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def run_coroutine(coroutine):
+    '''Run coroutine in a new event loop and return its result, like asyncio.run which needs Python 3.7'''
+    loop = asyncio.new_event_loop()
+    try:
+        asyncio.set_event_loop(loop)  # Child watchers for subprocesses attach to the loop of the main thread
+        return loop.run_until_complete(coroutine)
+    finally:
+        try:
+            _cancel_tasks(loop)
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+
+def _cancel_tasks(loop):
+    '''Cancel the tasks left on loop and wait for them, e.g. the aclose of an async generator the coroutine left early'''
+    all_tasks = asyncio.all_tasks if hasattr(asyncio, 'all_tasks') else asyncio.Task.all_tasks  # Python 3.6
+    tasks = [task for task in all_tasks(loop) if not task.done()]
+    if not tasks:
+        return
+    for task in tasks:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
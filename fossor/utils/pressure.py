@@ -0,0 +1,54 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+'''
+Pressure stall information (PSI), the share of wall time tasks were stalled waiting on cpu, memory or io.
+Available system wide in /proc/pressure/<resource> and per cgroup v2 in <cgroup>/<resource>.pressure on Linux 4.20+.
+'''
+
+import logging
+
+log = logging.getLogger(__name__)
+
+PRESSURE_PATH = '/proc/pressure'
+RESOURCES = ('cpu', 'memory', 'io')
+
+
+def parse_pressure(text) -> dict:
+    '''
+    Parse PSI output which looks like this:
+        some avg10=0.12 avg60=0.05 avg300=0.01 total=12345
+        full avg10=0.00 avg60=0.00 avg300=0.00 total=678
+    into {'some': {'avg10': 0.12, 'avg60': 0.05, 'avg300': 0.01, 'total': 12345}, 'full': {...}}.
+    Averages are percentages, total is the accumulated stall time in microseconds.
+    '''
+    pressure = {}
+    for line in text.splitlines():
+        kind, *fields = line.split()
+        values = {}
+        for field in fields:
+            name, _, value = field.partition('=')
+            values[name] = int(value) if name == 'total' else float(value)
+        pressure[kind] = values
+    return pressure
+
+
+def read_pressure(resource, path=None):
+    '''Return parsed PSI for a resource, or None if the kernel does not provide it (too old or booted with psi=0)'''
+    if path is None:
+        path = f'{PRESSURE_PATH}/{resource}'
+    try:
+        with open(path) as f:
+            return parse_pressure(f.read())
+    except (OSError, ValueError) as e:
+        log.debug(f"Unable to read pressure stall information from {path}: {e}")
+        return None
+
+
+def format_pressure(pressure) -> str:
+    '''e.g. some avg10=0.12 avg60=0.05 avg300=0.01, full avg10=0.00 avg60=0.00 avg300=0.00'''
+    parts = []
+    for kind, values in pressure.items():
+        averages = ' '.join(f'{name}={value:.2f}' for name, value in values.items() if name != 'total')
+        parts.append(f'{kind} {averages}')
+    return ', '.join(parts)
@@ -0,0 +1,260 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+'''
+Fast, allocation light walkers for /proc/<pid> files, intended for plugins that need a few fields from every process.
+Where there is no /proc, such as on macOS, read_cmdline, read_process_stat and iter_open_files fall back to psutil.
+'''
+
+import os
+import re
+import pwd
+import logging
+import psutil
+
+from functools import lru_cache
+from collections import namedtuple
+
+from fossor.utils.misc import psutil_exceptions
+
+log = logging.getLogger(__name__)
+
+PROC_PATH = '/proc'
+STATUS_READ_SIZE = 1024  # Name and Uid are near the top of the status file, Threads is usually within the first 1KiB.
+
+ProcessStatus = namedtuple('ProcessStatus', 'pid, name, uid, threads')
+ProcessStat = namedtuple('ProcessStat', 'pid, comm, ppid, start_time, rss')
+
+PID_SORT_KEYS = {
+    'start_time': lambda stat: stat.start_time,  # Oldest first, usually the parent of any workers it forked
+    'rss': lambda stat: -stat.rss,  # Largest first
+}
+
+
+def iter_pids(proc_path=PROC_PATH):
+    '''Yield the pid of every process currently in /proc'''
+    with os.scandir(proc_path) as entries:
+        for entry in entries:
+            if entry.name.isdigit():
+                yield int(entry.name)
+
+
+def read_status(pid, proc_path=PROC_PATH):
+    '''
+    Return a ProcessStatus from /proc/<pid>/status, or None if the process exited.
+    Only reads as far as the Threads line instead of the whole file. uid is the effective uid, like ps shows.
+    '''
+    try:
+        fd = os.open(f'{proc_path}/{pid}/status', os.O_RDONLY)
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        return None
+    try:
+        data = b''
+        while True:
+            chunk = os.read(fd, STATUS_READ_SIZE)
+            data += chunk
+            threads_position = data.find(b'\nThreads:')
+            if not chunk or (threads_position != -1 and data.find(b'\n', threads_position + 1) != -1):
+                break
+    except ProcessLookupError:
+        return None
+    finally:
+        os.close(fd)
+
+    name = uid = threads = None
+    for line in data.split(b'\n'):
+        if line.startswith(b'Name:'):
+            name = line[5:].strip().decode('utf-8', errors='replace')
+        elif line.startswith(b'Uid:'):
+            uid = int(line.split()[2])
+        elif line.startswith(b'Threads:'):
+            threads = int(line[8:])
+            break
+    return ProcessStatus(pid=pid, name=name, uid=uid, threads=threads)
+
+
+def iter_processes(proc_path=PROC_PATH):
+    '''Yield a ProcessStatus for every process, skipping processes that exit while /proc is being walked'''
+    for pid in iter_pids(proc_path=proc_path):
+        status = read_status(pid, proc_path=proc_path)
+        if status:
+            yield status
+
+
+def read_comm(pid, proc_path=PROC_PATH):
+    '''Return the command name of a process (at most 15 characters), or None if the process exited'''
+    try:
+        with open(f'{proc_path}/{pid}/comm', 'rb') as f:
+            return f.read().rstrip(b'\n').decode('utf-8', errors='replace')
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        return None
+
+
+def iter_comms(proc_path=PROC_PATH):
+    '''Yield (pid, command name) for every process'''
+    for pid in iter_pids(proc_path=proc_path):
+        comm = read_comm(pid, proc_path=proc_path)
+        if comm is not None:
+            yield pid, comm
+
+
+def _use_psutil(proc_path) -> bool:
+    return not os.path.isdir(proc_path)
+
+
+def read_cmdline(pid, proc_path=PROC_PATH):
+    '''Return the command line of a process with arguments separated by spaces, '' for kernel threads or None if it exited'''
+    if _use_psutil(proc_path):
+        try:
+            return ' '.join(psutil.Process(pid).cmdline())
+        except psutil_exceptions:
+            return None
+    try:
+        with open(f'{proc_path}/{pid}/cmdline', 'rb') as f:
+            return f.read().rstrip(b'\0').replace(b'\0', b' ').decode('utf-8', errors='replace')
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        return None
+
+
+def read_process_stat(pid, proc_path=PROC_PATH):
+    '''
+    Return a ProcessStat from /proc/<pid>/stat, or None if the process exited.
+    start_time is in clock ticks since boot and rss in pages, e.g.
+    9485 (cat) R 8995 8995 8995 0 -1 4194304 80 0 0 0 0 0 0 0 20 0 1 0 128694 2703360 289 ...
+    Without /proc start_time is in seconds since the epoch and rss in bytes, either way they only serve to compare processes.
+    '''
+    if _use_psutil(proc_path):
+        try:
+            p = psutil.Process(os.getpid() if pid == 'self' else pid)
+            with p.oneshot():
+                return ProcessStat(pid=p.pid, comm=p.name(), ppid=p.ppid(), start_time=p.create_time(), rss=p.memory_info().rss)
+        except psutil_exceptions:
+            return None
+    try:
+        with open(f'{proc_path}/{pid}/stat', 'rb') as f:
+            data = f.read()
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        return None
+    # The command name may contain spaces and parentheses, so split on the last closing parenthesis
+    head, _, tail = data.rpartition(b')')
+    pid, _, comm = head.partition(b' (')
+    fields = tail.split()
+    return ProcessStat(pid=int(pid), comm=comm.decode('utf-8', errors='replace'), ppid=int(fields[1]), start_time=int(fields[19]), rss=int(fields[21]))
+
+
+def get_ancestors(pid='self', proc_path=PROC_PATH) -> set:
+    '''Return the pids of a process and all of its ancestors'''
+    ancestors = set()
+    stat = read_process_stat(pid, proc_path=proc_path)
+    while stat and stat.pid not in ancestors:
+        ancestors.add(stat.pid)
+        if stat.ppid <= 0:
+            break
+        stat = read_process_stat(stat.ppid, proc_path=proc_path)
+    return ancestors
+
+
+def find_pids(comms, name=None, pattern=None, sort='start_time', proc_path=PROC_PATH) -> list:
+    '''
+    Return the pids of processes matching name and/or pattern, sorted by sort which is a key of PID_SORT_KEYS.
+        - comms is a {pid: command name} mapping, e.g. the comms snapshot source
+        - name matches if it starts with the command name of a process, command names are truncated to 15 characters
+        - pattern is a regex searched for in the command line, command lines are only read for processes that matched name
+    This process, its ancestors and its siblings are excluded, since fossor's command line contains the pattern too.
+    '''
+    if sort not in PID_SORT_KEYS:
+        raise ValueError(f"Unknown sort order {sort}, valid sort orders are: {list(PID_SORT_KEYS)}")
+    if name is None and pattern is None:
+        return []
+
+    candidates = comms.items()
+    if name is not None:
+        name = name.lower()
+        candidates = [(pid, comm) for pid, comm in candidates if comm and name.startswith(comm.lower())]
+    if pattern is not None:
+        regex = re.compile(pattern)
+        matches = []
+        for pid, comm in candidates:
+            cmdline = read_cmdline(pid, proc_path=proc_path)
+            if cmdline and regex.search(cmdline):
+                matches.append((pid, comm))
+        candidates = matches
+
+    ancestors = get_ancestors(proc_path=proc_path)
+    parents = {os.getpid(), os.getppid()}  # Other plugin processes are forked by the same parent
+    stats = []
+    for pid, comm in candidates:
+        stat = read_process_stat(pid, proc_path=proc_path)
+        if stat and stat.pid not in ancestors and stat.ppid not in parents:
+            stats.append(stat)
+    stats.sort(key=PID_SORT_KEYS[sort])
+    return [stat.pid for stat in stats]
+
+
+# Targets of /proc/<pid>/fd links that are not files, e.g. socket:[12345], pipe:[12345] or anon_inode:[eventpoll]
+NON_FILE_FD_PREFIXES = ('socket:', 'pipe:', 'anon_inode:', '/dev/', '/proc/', '/memfd:')
+
+
+def iter_open_files(pid, proc_path=PROC_PATH):
+    '''
+    Yield the paths of regular files pid has open, in fd order and without duplicates.
+    Sockets, pipes, devices and deleted files are skipped based on the link target alone, without a stat per fd.
+    Raises PermissionError if the fds of pid are not readable, FileNotFoundError if pid exited.
+    '''
+    if _use_psutil(proc_path):
+        yield from _iter_open_files_psutil(pid)
+        return
+    fd_path = f'{proc_path}/{pid}/fd'
+    seen = set()
+    with os.scandir(fd_path) as entries:
+        for entry in entries:
+            try:
+                target = os.readlink(entry.path)
+            except (FileNotFoundError, ProcessLookupError):
+                continue  # The fd was closed while scanning
+            if target.startswith(NON_FILE_FD_PREFIXES) or target.endswith(' (deleted)') or target in seen:
+                continue
+            seen.add(target)
+            yield target
+
+
+def _iter_open_files_psutil(pid):
+    try:
+        open_files = psutil.Process(int(pid)).open_files()
+    except (psutil.AccessDenied, PermissionError) as e:
+        raise PermissionError(f"Unable to read the open files of process {pid}: {e}")
+    except (psutil.NoSuchProcess, ProcessLookupError) as e:
+        raise FileNotFoundError(f"Process {pid} exited: {e}")
+    seen = set()
+    for open_file in sorted(open_files, key=lambda open_file: open_file.fd):
+        if open_file.path not in seen:
+            seen.add(open_file.path)
+            yield open_file.path
+
+
+@lru_cache(maxsize=None)
+def get_username(uid) -> str:
+    '''Return the user name for a uid, or the uid as a string if it has no passwd entry. Cached since many processes share uids.'''
+    try:
+        return pwd.getpwuid(uid).pw_name
+    except KeyError:
+        return str(uid)
+
+
+CPU_TIME_FIELDS = ('user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal')
+
+
+def read_stat(proc_path=PROC_PATH) -> dict:
+    '''
+    Return the aggregate cpu times in clock ticks and the number of runnable and blocked tasks from /proc/stat, e.g.
+    {'cpu': {'user': 13753, 'nice': 0, ...}, 'procs_running': 3, 'procs_blocked': 0}
+    '''
+    stat = {}
+    with open(f'{proc_path}/stat') as f:
+        for line in f:
+            name, _, values = line.partition(' ')
+            if name == 'cpu':
+                stat['cpu'] = dict(zip(CPU_TIME_FIELDS, (int(value) for value in values.split())))
+            elif name in ('procs_running', 'procs_blocked'):
+                stat[name] = int(values)
+    return stat
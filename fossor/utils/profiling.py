@@ -0,0 +1,114 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+'''
+Opt-in profiling of plugins inside their own process, enabled for every plugin with the profile variable (fossor --profile)
+or for some with the profile_plugins variable (fossor --profile-plugins name,name).
+
+Both variables may also be 'all' or a comma separated list of plugin names. Selected plugins run under cProfile, and with profile_memory
+under tracemalloc too. The results are written to profile_dir as <module>.<plugin>.pstats, readable with python -m pstats,
+and <module>.<plugin>.allocations.txt with the lines that allocated the most memory.
+'''
+
+import os
+import time
+import cProfile
+import logging
+import tempfile
+import tracemalloc
+
+from contextlib import contextmanager
+
+from fossor.utils.misc import get_state_dir
+
+log = logging.getLogger(__name__)
+
+ALL = 'all'
+TOP_ALLOCATIONS = 25  # Number of lines listed in the allocations summary
+PSTATS_SUFFIX = '.pstats'
+ALLOCATIONS_SUFFIX = '.allocations.txt'
+
+
+def get_selection(value) -> set:
+    '''Casefolded plugin names from the profile variable, which may be True, 'all', a comma separated string or a list'''
+    if not value:
+        return set()
+    if value is True:
+        return {ALL}
+    if isinstance(value, str):
+        value = value.split(',')
+    return {str(name).strip().casefold() for name in value if str(name).strip()}
+
+
+def get_profiled(variables) -> set:
+    '''Selection of the profile and profile_plugins variables, empty when profiling is off'''
+    return get_selection(variables.get('profile', None)) | get_selection(variables.get('profile_plugins', None))
+
+
+def should_profile(name, variables) -> bool:
+    selection = get_profiled(variables)
+    return ALL in selection or name.casefold() in selection
+
+
+def create_profile_dir(variables) -> str:
+    '''
+    Directory for the profiles of this run, profile_dir if set, otherwise a new timestamped directory in the state dir.
+    The new directory is unique, runs started within the same second do not list each other's profiles.
+    '''
+    path = variables.get('profile_dir', None)
+    if path:
+        os.makedirs(path, exist_ok=True)
+        return path
+    profiles = os.path.join(get_state_dir(variables), 'profiles')
+    os.makedirs(profiles, exist_ok=True)
+    return tempfile.mkdtemp(prefix=time.strftime('%Y%m%d-%H%M%S-'), dir=profiles)
+
+
+def list_profiles(path) -> list:
+    try:
+        return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith((PSTATS_SUFFIX, ALLOCATIONS_SUFFIX)))
+    except OSError:
+        return []
+
+
+def format_allocations(name, snapshot, top=TOP_ALLOCATIONS) -> str:
+    # Leave out the allocations of the profilers themselves
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, path) for path in (tracemalloc.__file__, cProfile.__file__, __file__)])
+    statistics = snapshot.statistics('lineno')
+    total = sum(statistic.size for statistic in statistics)
+    lines = [f'Top {min(top, len(statistics))} of {len(statistics)} lines allocating memory still held when {name} finished, '
+             f'{total / 1024:.1f} KiB in total']
+    lines.extend(str(statistic) for statistic in statistics[:top])
+    return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def profile_plugin(Plugin, variables):
+    '''Profile the enclosed code if Plugin is selected by the profile variable, its files are named after its full name'''
+    if not should_profile(Plugin.get_name(), variables):
+        yield
+        return
+
+    name = Plugin.get_full_name()  # A variable and a check may share a name
+    directory = variables.get('profile_dir', None) or create_profile_dir(variables)
+    memory = variables.get('profile_memory', False)
+    if memory:
+        tracemalloc.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        try:
+            profiler.dump_stats(os.path.join(directory, name + PSTATS_SUFFIX))
+            if memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                summary = format_allocations(name, tracemalloc.take_snapshot())
+                with open(os.path.join(directory, name + ALLOCATIONS_SUFFIX), 'w') as f:
+                    f.write(summary + f'Peak traced memory: {peak / 1024:.1f} KiB\n')
+        except OSError as e:
+            log.warning(f"Unable to write the profile of {name} to {directory}: {e}")
+        finally:
+            if memory:
+                tracemalloc.stop()
@@ -0,0 +1,226 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+'''
+Plugin lifecycle events published by the plugin runner, and the in-memory run state built from them.
+
+The runner process publishes an event when it queues, starts, reaps or times out a plugin process. The main process
+drains those events into a RunStatus, so status lines and reports can show what is running and for how long without
+inspecting processes. Finished and timed out events also carry the outcome and resource usage of the plugin.
+'''
+
+import os
+import sys
+import time
+import queue
+import logging
+import psutil
+import resource
+import multiprocessing as mp
+
+from collections import OrderedDict, namedtuple
+
+from fossor.utils.misc import psutil_exceptions
+
+log = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+STARTED = 'started'
+FINISHED = 'finished'
+TIMED_OUT = 'timed_out'
+RUNNER_FINISHED = 'runner_finished'  # Published once a runner has published all events for its plugins
+# Events that don't change the state of a plugin
+DELIVERED = 'delivered'  # The runner forwarded a result of the plugin to the report
+SIGNALED = 'signaled'  # The runner sent a signal to the process group of a timed out plugin, details holds its name
+
+# name is the full name of the plugin, see Plugin.get_full_name, source is the pid of the process that published the event
+RunEvent = namedtuple('RunEvent', 'name, event, timestamp, pid, details, source')
+
+# Fields of PluginStatus that finished and timed out events can set through their details
+USAGE_FIELDS = ('outcome', 'user_cpu', 'system_cpu', 'max_rss', 'output_size')
+
+STATS_COLUMNS = OrderedDict([  # Sort key: (heading, PluginStatus attribute or method)
+    ('name', ('Plugin', 'short_name')),
+    ('outcome', ('Outcome', 'outcome')),
+    ('wait', ('Wait (s)', 'queue_wait')),
+    ('wall', ('Wall (s)', 'elapsed')),
+    ('user', ('User (s)', 'user_cpu')),
+    ('system', ('Sys (s)', 'system_cpu')),
+    ('rss', ('Max RSS (MiB)', 'max_rss')),
+    ('output', ('Output (B)', 'output_size')),
+])
+DEFAULT_STATS_SORT = 'wall'
+
+
+def get_own_usage() -> dict:
+    '''CPU time and max RSS in bytes of this process and the children it waited for'''
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    rss_unit = 1 if sys.platform == 'darwin' else 1024  # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return {'user_cpu': own.ru_utime + children.ru_utime,
+            'system_cpu': own.ru_stime + children.ru_stime,
+            'max_rss': max(own.ru_maxrss, children.ru_maxrss) * rss_unit}
+
+
+def get_thread_usage() -> dict:
+    '''CPU time of the calling thread, for plugins sharing a process. Empty where it is not measured per thread.'''
+    if not hasattr(resource, 'RUSAGE_THREAD'):
+        return {}
+    usage = resource.getrusage(resource.RUSAGE_THREAD)
+    return {'user_cpu': usage.ru_utime, 'system_cpu': usage.ru_stime}
+
+
+def get_process_usage(pid) -> dict:
+    '''CPU time and current RSS in bytes of a running process, for plugins that are killed before they can report their own'''
+    try:
+        process = psutil.Process(pid)
+        with process.oneshot():
+            cpu_times = process.cpu_times()
+            rss = process.memory_info().rss
+    except psutil_exceptions:
+        return {}
+    return {'user_cpu': cpu_times.user + cpu_times.children_user,
+            'system_cpu': cpu_times.system + cpu_times.children_system,
+            'max_rss': rss}
+
+
+class PluginStatus(object):
+    '''Lifecycle state of a single plugin'''
+    __slots__ = ('name', 'state', 'queued', 'started', 'ended', 'pid') + USAGE_FIELDS
+
+    def __init__(self, name):
+        self.name = name
+        self.state = None
+        self.queued = None
+        self.started = None
+        self.ended = None
+        self.pid = None
+        for field in USAGE_FIELDS:
+            setattr(self, field, None)
+
+    @property
+    def short_name(self):
+        '''The plugin name, as name is the full name including the module'''
+        return self.name.rsplit('.', 1)[-1]
+
+    def elapsed(self, now=None) -> float:
+        '''Seconds the plugin has been running for, or ran for if it has ended'''
+        if self.started is None:
+            return 0
+        return (self.ended or now or time.time()) - self.started
+
+    def queue_wait(self) -> float:
+        '''Seconds between the plugin being queued and its process starting'''
+        if self.queued is None or self.started is None:
+            return 0
+        return self.started - self.queued
+
+    def as_dict(self) -> dict:
+        result = {field: getattr(self, field) for field in self.__slots__}
+        result['queue_wait'] = self.queue_wait()
+        result['elapsed'] = self.elapsed()
+        return result
+
+    def __repr__(self):
+        return f'PluginStatus(name={self.name}, state={self.state}, elapsed={self.elapsed():.1f})'
+
+
+class RunStatus(object):
+    '''
+    Channel for plugin lifecycle events and the state built from them.
+    publish is called by the runner process, update, join and the state accessors are used by the process that created this.
+    '''
+    def __init__(self):
+        self.plugins = OrderedDict()  # full name: PluginStatus
+        self.events = []  # Every RunEvent received, in order
+        self._queue = mp.Queue()
+        self._active_runners = 0
+        self.predictions = {}  # full name: fossor.utils.history.Estimate of how long the plugin usually runs, set by the engine
+
+    def publish(self, name, event, pid=None, timestamp=None, details=None):
+        '''details is a dict with USAGE_FIELDS values for finished and timed out events'''
+        self._queue.put(RunEvent(name=name, event=event, timestamp=timestamp or time.time(), pid=pid, details=details, source=os.getpid()))
+
+    def runner_started(self):
+        '''Called by the engine for each runner it starts, join waits for all of them to finish publishing'''
+        self._active_runners += 1
+
+    def update(self):
+        '''Apply all events published so far without blocking'''
+        while True:
+            try:
+                self._apply(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+    def join(self, timeout=5):
+        '''Apply events until every started runner has published its last event, or until timeout seconds have passed'''
+        deadline = time.time() + timeout
+        while self._active_runners > 0:
+            try:
+                self._apply(self._queue.get(timeout=max(0, deadline - time.time())))
+            except queue.Empty:
+                log.debug(f"Timed out waiting for {self._active_runners} plugin runners to publish their status")
+                break
+        self.update()
+
+    def _apply(self, event):
+        self.events.append(event)
+        if event.event == RUNNER_FINISHED:
+            self._active_runners = max(0, self._active_runners - 1)
+            return
+        if event.event in (DELIVERED, SIGNALED):
+            return
+        status = self.plugins.get(event.name)
+        if status is None or event.event == QUEUED:
+            # A plugin queued again, e.g. a variable plugin in a later round, starts over
+            status = PluginStatus(event.name)
+            self.plugins[event.name] = status
+        status.state = event.event
+        if event.event == QUEUED:
+            status.queued = event.timestamp
+        elif event.event == STARTED:
+            status.started = event.timestamp
+            status.pid = event.pid
+        else:
+            status.ended = event.timestamp
+            for field, value in (event.details or {}).items():
+                if field in USAGE_FIELDS:
+                    setattr(status, field, value)
+
+    def running(self) -> list:
+        '''PluginStatus of plugins that are currently running, longest running first'''
+        running = [status for status in self.plugins.values() if status.state == STARTED]
+        now = time.time()
+        running.sort(key=lambda status: status.elapsed(now), reverse=True)
+        return running
+
+    def predict_remaining(self, now=None):
+        '''Seconds until the plugins that have not ended are predicted to complete, None without predictions for any of them'''
+        now = now or time.time()
+        remaining = None
+        for status in self.plugins.values():
+            estimate = self.predictions.get(status.name)
+            if estimate is None or status.ended is not None:
+                continue
+            left = max(0, estimate.ewma - status.elapsed(now))
+            remaining = left if remaining is None else max(remaining, left)
+        return remaining
+
+    def with_state(self, state) -> list:
+        return [status for status in self.plugins.values() if status.state == state]
+
+    def stats(self, sort=DEFAULT_STATS_SORT) -> list:
+        '''PluginStatus of plugins that have ended, sorted by a STATS_COLUMNS key. Numbers are sorted largest first.'''
+        if sort not in STATS_COLUMNS:
+            raise ValueError(f"Unknown stats sort key {sort}, expected one of: {', '.join(STATS_COLUMNS)}")
+        attribute = STATS_COLUMNS[sort][1]
+        ended = [status for status in self.plugins.values() if status.ended is not None]
+
+        def value(status):
+            value = getattr(status, attribute)
+            return value() if callable(value) else value
+
+        if sort in ('name', 'outcome'):
+            return sorted(ended, key=lambda status: value(status) or '')
+        return sorted(ended, key=lambda status: value(status) or 0, reverse=True)
@@ -0,0 +1,80 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+'''
+Lightweight background samplers for counters that checks turn into rates, e.g. network interface errors.
+
+A long running process embedding fossor can start a sampler so checks compute rates from samples already taken instead
+of sleeping for a sampling interval. Plugin processes are forked from that process, so they see the samples
+collected up until they started.
+'''
+
+import time
+import logging
+
+from threading import Thread, Event, Lock
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+samplers = {}
+
+
+class RingBufferSampler(object):
+    '''Calls function every interval seconds on a daemon thread and keeps the last size (timestamp, value) samples.'''
+    def __init__(self, function, interval=1, size=60):
+        self.function = function
+        self.interval = interval
+        self._samples = deque(maxlen=size)
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+
+    def sample(self):
+        '''Take a sample now, store it, and return it as a (timestamp, value) tuple'''
+        value = self.function()
+        sample = (time.time(), value)
+        with self._lock:
+            self._samples.append(sample)
+        return sample
+
+    @property
+    def samples(self) -> list:
+        with self._lock:
+            return list(self._samples)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name=f'sampler {self.function.__name__}', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                log.debug(f"Sampling {self.function.__name__} failed: {e}")
+            self._stop.wait(self.interval)
+
+
+def start_sampler(name, function, interval=1, size=60) -> RingBufferSampler:
+    '''Start, or return the already running, sampler registered under name'''
+    sampler = samplers.get(name)
+    if not sampler:
+        sampler = RingBufferSampler(function=function, interval=interval, size=size)
+        samplers[name] = sampler
+    sampler.start()
+    return sampler
+
+
+def get_sampler(name):
+    '''Return the sampler registered under name, or None if nothing is sampling it'''
+    return samplers.get(name)
@@ -0,0 +1,171 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+'''
+Running commands for plugins, see Plugin.shell_call, Plugin.shell_stream and Plugin.shell_call_async.
+
+stdout and stderr are always read concurrently, so a command writing a lot to one of them never blocks on a full pipe
+while the other is being read. Every call takes a timeout in seconds, a command still running after it is killed and
+subprocess.TimeoutExpired is raised with the output collected so far. Commands run in the process group of the plugin,
+so they are also killed when the plugin times out.
+'''
+
+import os
+import time
+import asyncio
+import logging
+import selectors
+import threading
+import subprocess
+
+log = logging.getLogger(__name__)
+
+READ_SIZE = 65536
+
+
+def split_command(cmd) -> list:
+    '''Commands are run without a shell, a string is split on whitespace'''
+    if isinstance(cmd, str):
+        return cmd.split()
+    return list(cmd)
+
+
+def decode(data) -> str:
+    return data.decode('utf-8', errors='replace')
+
+
+def shell_call(cmd, timeout=None):
+    '''Run cmd and return out (string), err (string), returncode (int). Raises subprocess.TimeoutExpired.'''
+    cmd = split_command(cmd)
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True, shell=False) as p:
+        try:
+            out, err = p.communicate(timeout=timeout)  # Reads both pipes at once
+        except subprocess.TimeoutExpired:
+            p.kill()
+            out, err = p.communicate()
+            raise subprocess.TimeoutExpired(cmd, timeout, output=decode(out), stderr=decode(err))
+        return decode(out), decode(err), p.returncode
+
+
+def open_streams(cmd, timeout=None):
+    '''
+    Start cmd and return stdout (text stream), stderr (text stream) and returncode, which is None since cmd is still running.
+    Reading one stream to the end while cmd fills the pipe of the other blocks, ShellStream avoids that.
+    A command still running after timeout seconds is killed.
+    '''
+    cmd = split_command(cmd)
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True, shell=False, encoding='utf-8',
+                               errors='replace')
+    if timeout:
+        def kill():
+            if process.poll() is None:
+                log.debug(f"Command: {cmd}, killed after running for {timeout} seconds")
+                process.kill()
+        timer = threading.Timer(timeout, kill)
+        timer.daemon = True
+        timer.start()
+    return process.stdout, process.stderr, process.returncode
+
+
+class ShellStream(object):
+    '''
+    Iterate over the stdout lines of a command as it writes them, while its stderr is collected into err.
+    returncode is set once every line has been read and the command exited. Leaving a with block or calling close()
+    before that kills the command. Raises subprocess.TimeoutExpired when the command runs longer than timeout seconds.
+    '''
+    def __init__(self, cmd, timeout=None):
+        self.cmd = split_command(cmd)
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.returncode = None
+        self._err = []
+        self._lines = None
+        self.process = subprocess.Popen(self.cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True, shell=False)
+
+    def __iter__(self):
+        if self._lines is None:
+            self._lines = self._read_lines()
+        return self._lines
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def err(self) -> str:
+        '''stderr collected so far'''
+        return decode(b''.join(self._err))
+
+    def wait(self) -> int:
+        '''Read the remaining output, discarding stdout, and return the returncode'''
+        for line in self:
+            pass
+        return self.returncode
+
+    def close(self):
+        '''Kill the command if it is still running and release its pipes'''
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.process.stdout.close()
+        self.process.stderr.close()
+
+    def _remaining(self):
+        if self.deadline is None:
+            return None
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            self.close()
+            raise subprocess.TimeoutExpired(self.cmd, self.timeout, stderr=self.err)
+        return remaining
+
+    def _read_lines(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self.process.stdout, selectors.EVENT_READ)
+        selector.register(self.process.stderr, selectors.EVENT_READ)
+        partial = b''
+        try:
+            while selector.get_map():
+                for key, events in selector.select(timeout=self._remaining()):
+                    data = os.read(key.fd, READ_SIZE)
+                    if not data:
+                        selector.unregister(key.fileobj)
+                    elif key.fileobj is self.process.stderr:
+                        self._err.append(data)
+                    else:
+                        *lines, partial = (partial + data).split(b'\n')
+                        for line in lines:
+                            yield decode(line) + '\n'
+            if partial:
+                yield decode(partial)
+            try:
+                self.returncode = self.process.wait(timeout=self._remaining())
+            except subprocess.TimeoutExpired:  # Closed its pipes but kept running
+                self.close()
+                raise subprocess.TimeoutExpired(self.cmd, self.timeout, stderr=self.err)
+            log.debug(f"Command: {self.cmd}, exited with {self.returncode}")
+        finally:
+            selector.close()
+            if self.returncode is None:
+                self.close()  # Stopped early, by the reader or a timeout
+
+
+async def shell_call_async(cmd, timeout=None):
+    '''
+    Run cmd without blocking the event loop and return out (string), err (string), returncode (int).
+    Raises subprocess.TimeoutExpired. Several commands run concurrently with asyncio.gather, e.g. in a coroutine
+        results = await asyncio.gather(shell_call_async('uptime'), shell_call_async('users'))
+    '''
+    cmd = split_command(cmd)
+    process = await asyncio.create_subprocess_exec(*cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True)
+    try:
+        out, err = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    finally:
+        if process.returncode is None:  # Timed out, or the awaiting task was cancelled
+            process.kill()
+            await process.wait()
+    return decode(out), decode(err), process.returncode
@@ -0,0 +1,124 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+'''
+Shared memory transport for large plugin outputs.
+
+Plugin results travel from the plugin process through the plugin runner to the report, and each hop pickles and copies
+them. Outputs larger than THRESHOLD are instead written once into a multiprocessing.shared_memory segment by the plugin,
+only a SharedPayload handle is passed along, and the process reading the result copies the output out and removes the segment.
+
+Segments are named after the pid of the plugin process that created them, so the runner can remove the segments of a
+plugin it had to kill before the handles reached the report. Without multiprocessing.shared_memory (before Python 3.8)
+outputs are passed along as they are.
+'''
+
+import os
+import uuid
+import logging
+
+from collections import namedtuple
+
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+    shared_memory = None
+
+from fossor.plugin import PluginResult
+
+log = logging.getLogger(__name__)
+
+THRESHOLD = 64 * 1024  # Outputs larger than this many bytes are placed in shared memory
+SEGMENT_PREFIX = 'fossor_'
+SHM_PATH = '/dev/shm'
+
+SharedPayload = namedtuple('SharedPayload', 'name, size')
+
+
+def segment_prefix(pid) -> str:
+    return f'{SEGMENT_PREFIX}{pid}_'
+
+
+def pack(value, threshold=THRESHOLD):
+    '''Return a SharedPayload for strings larger than threshold bytes, anything else is returned as is'''
+    if shared_memory is None or not isinstance(value, str) or len(value) <= threshold // 4:  # Quick check, utf-8 is at most 4 bytes per character
+        return value
+    data = value.encode('utf-8')
+    if len(data) <= threshold:
+        return value
+    try:
+        segment = shared_memory.SharedMemory(name=segment_prefix(os.getpid()) + uuid.uuid4().hex[:12], create=True, size=len(data))
+    except OSError as e:
+        log.debug(f"Unable to create a shared memory segment, sending the value instead: {e}")
+        return value
+    try:
+        segment.buf[:len(data)] = data
+    finally:
+        segment.close()
+    # The segment outlives this process, whoever calls unpack or remove_segments removes it instead of the resource tracker
+    resource_tracker.unregister(segment._name, 'shared_memory')
+    return SharedPayload(name=segment.name, size=len(data))
+
+
+def unpack(value):
+    '''Return the string held by a SharedPayload and remove its segment, anything else is returned as is'''
+    if not isinstance(value, SharedPayload):
+        return value
+    try:
+        segment = shared_memory.SharedMemory(name=value.name)
+    except FileNotFoundError:
+        log.warning(f"Shared memory segment {value.name} was removed before it was read")
+        return None
+    try:
+        return bytes(segment.buf[:value.size]).decode('utf-8')
+    finally:
+        segment.close()
+        segment.unlink()
+
+
+def pack_result(result, threshold=THRESHOLD):
+    '''Return a PluginResult with its output packed'''
+    return PluginResult(result.name, pack(result.output, threshold=threshold), duration=result.duration, status=result.status, stats=result.stats)
+
+
+def unpack_result(result):
+    '''Return a PluginResult with its output unpacked, other values are returned as is'''
+    if isinstance(result, PluginResult) and isinstance(result.output, SharedPayload):
+        return PluginResult(result.name, unpack(result.output), duration=result.duration, status=result.status, stats=result.stats)
+    return result
+
+
+def payload_names(result) -> set:
+    '''Names of the segments a queued value refers to'''
+    if isinstance(result, PluginResult) and isinstance(result.output, SharedPayload):
+        return {result.output.name}
+    return set()
+
+
+def remove_segments(pid, keep=(), path=SHM_PATH) -> list:
+    '''Remove the segments created by process pid, except those named in keep. Returns the names of the removed segments.'''
+    if shared_memory is None:
+        return []
+    try:
+        names = [name for name in os.listdir(path) if name.startswith(segment_prefix(pid)) and name not in keep]
+    except OSError:
+        return []  # No /dev/shm on this platform
+    for name in names:
+        try:
+            os.unlink(os.path.join(path, name))
+            log.debug(f"Removed shared memory segment {name} left by process {pid}")
+        except FileNotFoundError:
+            pass
+    return names
+
+
+class SharedMemoryQueue(object):
+    '''Read side of a queue of PluginResults with packed outputs, get returns them unpacked'''
+    def __init__(self, queue):
+        self.queue = queue
+
+    def get(self, *args, **kwargs):
+        return unpack_result(self.queue.get(*args, **kwargs))
+
+    def close(self):
+        self.queue.close()
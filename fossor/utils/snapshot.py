@@ -0,0 +1,153 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+'''
+Per-run snapshots of sources that several plugins read, such as /proc files, the kernel log and the process table.
+
+Plugins run in their own processes, so anything they read themselves is read once per plugin. Instead the engine
+captures the sources its plugins list in Plugin.snapshot_sources once, in parallel, before any plugin process is forked.
+Plugin processes inherit the captured values and read them with Plugin.snapshot(name) or fossor.utils.snapshot.get(name).
+Values are read-only (tuples and mapping proxies) and are captured again on access once they are older than the ttl.
+'''
+
+import os
+import time
+import logging
+import threading
+import psutil
+
+from types import MappingProxyType
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from fossor.utils.kmsg import get_kernel_log
+from fossor.utils.proc import PROC_PATH, iter_processes, iter_comms, get_username
+from fossor.utils.misc import psutil_exceptions
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TTL = 60  # Seconds a captured value is used before it is read again
+
+sources = OrderedDict()
+
+ProcessInfo = namedtuple('ProcessInfo', 'pid, name, username, num_threads')
+
+
+def register_source(name):
+    '''Decorator that registers a function returning the value of a snapshot source'''
+    def decorator(function):
+        sources[name] = function
+        return function
+    return decorator
+
+
+@register_source('meminfo')
+def _meminfo():
+    meminfo = {}
+    with open('/proc/meminfo') as f:
+        for line in f:
+            name, value = line.split(':', 1)
+            meminfo[name] = int(value.split()[0])
+    return MappingProxyType(meminfo)
+
+
+@register_source('vmstat')
+def _vmstat():
+    vmstat = {}
+    with open('/proc/vmstat') as f:
+        for line in f:
+            name, value = line.split()
+            vmstat[name] = int(value)
+    return MappingProxyType(vmstat)
+
+
+@register_source('loadavg')
+def _loadavg():
+    with open('/proc/loadavg') as f:
+        return tuple(float(value) for value in f.read().split()[:3])
+
+
+@register_source('kernel_log')
+def _kernel_log():
+    return tuple(get_kernel_log().read_records(refresh=True))  # Every capture reads messages logged since the last one
+
+
+@register_source('processes')
+def _processes():
+    if os.path.isdir(PROC_PATH):
+        return tuple(ProcessInfo(pid=p.pid, name=p.name, username=get_username(p.uid) if p.uid is not None else None, num_threads=p.threads)
+                     for p in iter_processes())
+
+    processes = []
+    for p in psutil.process_iter(attrs=['pid', 'name', 'username', 'num_threads']):
+        try:
+            processes.append(ProcessInfo(**p.info))
+        except psutil_exceptions:
+            continue
+    return tuple(processes)
+
+
+@register_source('comms')
+def _comms():
+    if os.path.isdir(PROC_PATH):
+        return MappingProxyType(dict(iter_comms()))
+
+    comms = {}
+    for p in psutil.process_iter(attrs=['pid', 'name']):
+        comms[p.info['pid']] = p.info['name']
+    return MappingProxyType(comms)
+
+
+class Snapshot(object):
+    '''Memoised values for registered sources. Exceptions raised while capturing a source are raised again by get.'''
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self._values = {}  # name: (capture time, value, exception)
+        self._lock = threading.Lock()
+
+    def capture(self, names=None):
+        '''Capture the given sources, or all registered sources, in parallel.'''
+        if names is None:
+            names = list(sources)
+        names = [name for name in names if name in sources]
+        if not names:
+            return
+        with ThreadPoolExecutor(max_workers=len(names)) as executor:
+            for name, value in zip(names, executor.map(self._capture_source, names)):
+                self._values[name] = value
+        log.debug(f"Captured snapshot sources: {names}")
+
+    def _capture_source(self, name):
+        try:
+            return time.time(), sources[name](), None
+        except Exception as e:
+            log.debug(f"Failed to capture snapshot source {name}: {e}")
+            return time.time(), None, e
+
+    def get(self, name):
+        if name not in sources:
+            raise KeyError(f"Unknown snapshot source: {name}. Registered sources are: {list(sources)}")
+        with self._lock:
+            captured = self._values.get(name)
+            if captured is None or time.time() - captured[0] > self.ttl:
+                captured = self._capture_source(name)
+                self._values[name] = captured
+        capture_time, value, exception = captured
+        if exception:
+            raise exception
+        return value
+
+    def clear(self):
+        self._values = {}
+
+
+_snapshot = Snapshot()
+
+
+def get_snapshot() -> Snapshot:
+    '''Return the Snapshot shared by everything running in this process and the processes forked from it'''
+    return _snapshot
+
+
+def get(name):
+    return _snapshot.get(name)
@@ -0,0 +1,109 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+'''
+Timeline of a fossor run in the Chrome trace event format, for chrome://tracing or https://ui.perfetto.dev.
+
+The engine records the phases of a run (snapshots, variable rounds, checks, report) as spans in a Trace. When the run
+is written out these are combined with the plugin events of the RunStatus: every plugin runner becomes a process lane
+with a thread lane per plugin process, showing the time from being queued to its process starting, the lifetime of the
+process, result deliveries, timeouts and termination signals.
+'''
+
+import os
+import json
+import time
+import logging
+
+from collections import namedtuple
+from contextlib import contextmanager
+
+from fossor.utils import run_status as rs
+
+log = logging.getLogger(__name__)
+
+Span = namedtuple('Span', 'name, start, end, args')
+
+
+class Trace(object):
+    '''Spans of the phases of a run in this process'''
+    def __init__(self):
+        self.spans = []
+
+    @contextmanager
+    def span(self, name, **args):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.spans.append(Span(name=name, start=start, end=time.time(), args=args))
+
+    def get_events(self, run_status=None) -> list:
+        '''Trace events of the spans and of the plugin events in run_status, with timestamps in microseconds since the first'''
+        pid = os.getpid()
+        timestamps = [span.start for span in self.spans]
+        if run_status is not None:
+            timestamps.extend(event.timestamp for event in run_status.events)
+        origin = min(timestamps) if timestamps else time.time()
+
+        def us(timestamp):
+            return round((timestamp - origin) * 1000000)
+
+        events = [_metadata('process_name', pid, pid, 'fossor'), _metadata('process_sort_index', pid, pid, 0, key='sort_index'),
+                  _metadata('thread_name', pid, pid, 'engine')]
+        for span in self.spans:
+            events.append({'name': span.name, 'cat': 'engine', 'ph': 'X', 'ts': us(span.start), 'dur': us(span.end) - us(span.start),
+                           'pid': pid, 'tid': pid, 'args': span.args})
+        if run_status is not None:
+            events.extend(_get_plugin_events(run_status.events, us))
+        return events
+
+    def write(self, path, run_status=None):
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.get_events(run_status), 'displayTimeUnit': 'ms'}, f)
+        log.debug(f"Wrote trace to {path}")
+
+
+def _metadata(name, pid, tid, value, key='name'):
+    return {'name': name, 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {key: value}}
+
+
+def _get_plugin_events(run_events, us) -> list:
+    '''Lanes per plugin runner (source pid) with a thread lane per plugin process'''
+    events = []
+    runners = {}  # pid: timestamp of its first event
+    queued = {}  # (runner, name): timestamp
+    started = {}  # (runner, name): (timestamp, pid)
+    for event in run_events:
+        runner = event.source
+        if runner not in runners:
+            runners[runner] = event.timestamp
+            events.append(_metadata('process_name', runner, runner, f'Plugin-Runner {len(runners)}'))
+            events.append(_metadata('process_sort_index', runner, runner, len(runners), key='sort_index'))
+            events.append(_metadata('thread_name', runner, runner, 'runner'))
+            events.append(_metadata('thread_sort_index', runner, runner, -1, key='sort_index'))
+        key = (runner, event.name)
+        if event.event == rs.QUEUED:
+            queued[key] = event.timestamp
+        elif event.event == rs.STARTED:
+            started[key] = (event.timestamp, event.pid)
+            events.append(_metadata('thread_name', runner, event.pid, event.name))
+            if key in queued:
+                events.append({'name': 'start process', 'cat': 'runner', 'ph': 'X', 'ts': us(queued[key]),
+                               'dur': us(event.timestamp) - us(queued[key]), 'pid': runner, 'tid': event.pid})
+        elif event.event in (rs.FINISHED, rs.TIMED_OUT) and key in started:
+            start, pid = started[key]
+            events.append({'name': event.name, 'cat': 'plugin', 'ph': 'X', 'ts': us(start), 'dur': us(event.timestamp) - us(start),
+                           'pid': runner, 'tid': pid, 'args': dict(event.details or {}, state=event.event)})
+            if event.event == rs.TIMED_OUT:
+                events.append({'name': f'{event.name} timed out', 'cat': 'runner', 'ph': 'i', 's': 't', 'ts': us(event.timestamp),
+                               'pid': runner, 'tid': runner})
+        elif event.event == rs.DELIVERED:
+            events.append({'name': 'delivered', 'cat': 'runner', 'ph': 'i', 's': 't', 'ts': us(event.timestamp), 'pid': runner, 'tid': event.pid})
+        elif event.event == rs.SIGNALED:
+            events.append({'name': (event.details or {}).get('signal', 'signal'), 'cat': 'runner', 'ph': 'i', 's': 't',
+                           'ts': us(event.timestamp), 'pid': runner, 'tid': event.pid})
+        elif event.event == rs.RUNNER_FINISHED:
+            events.append({'name': 'runner', 'cat': 'runner', 'ph': 'X', 'ts': us(runners[runner]), 'dur': us(event.timestamp) - us(runners[runner]),
+                           'pid': runner, 'tid': runner})
+    return events
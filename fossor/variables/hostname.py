@@ -6,5 +6,7 @@ import socket
 
 
 class Hostname(Variable):
+    lightweight = True
+
     def run(self, variables):
         return socket.getfqdn()
@@ -1,23 +1,43 @@
 # Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
 # See LICENSE in the project root for license information.
 
-import psutil
+from fossor.utils.proc import iter_open_files
+from fossor.utils.filetools import find_rotated_logs
 from fossor.variables.variable import Variable
 
 
 class LogFiles(Variable):
+    '''Log files the Pid has open, found by reading the /proc/<pid>/fd links, or through psutil without /proc'''
     def run(self, variables):
         pid = variables.get('Pid', None)
         if not pid:
             return
 
-        p = psutil.Process(pid)
         log_files = None
 
         try:
-            log_files = [x.path for x in p.open_files() if x.path.lower().endswith('.log')]
-        except psutil.AccessDenied:
-            self.log.warn(f"Did not have permission to retrieve open files for process {pid}")
+            log_files = [path for path in iter_open_files(pid) if path.lower().endswith('.log')]
+        except PermissionError:
+            self.log.warning(f"Did not have permission to retrieve open files for process {pid}")
+        except FileNotFoundError:
+            self.log.debug(f"Process {pid} exited before its open files could be retrieved")
 
         if log_files:
             return log_files
+
+
+class LogFileHistory(Variable):
+    '''
+    LogFiles together with their rotated versions, e.g. app.log.1 and app.log.2.gz. A list of
+    fossor.utils.filetools.LogFile (path, size, mtime) per log file, ordered by mtime, oldest first.
+    '''
+    def run(self, variables):
+        log_files = variables.get('LogFiles', None)
+        if not log_files:
+            return
+
+        history = []
+        for path in log_files:
+            history.extend(find_rotated_logs(path))
+        if history:
+            return history
@@ -7,6 +7,8 @@ from getpass import getuser
 
 class OtherUsers(Variable):
     """Checks for other users logged into the host box other than the current user."""
+    lightweight = True
+
     def run(self, variables):
         # Users that we consider "uninteresting" so we won't return them.
         boring_users = [getuser(), 'root', 'app']
@@ -2,22 +2,44 @@
 # See LICENSE in the project root for license information.
 
 import os
-import psutil
 
+from fossor.utils.proc import find_pids
 from fossor.variables.variable import Variable
-from fossor.utils.misc import psutil_exceptions
+
+
+def _find_pids(plugin, variables):
+    '''Pids matching the Product and PidMatch variables, sorted by the PidSort variable'''
+    product = variables.get('Product', None)
+    pattern = variables.get('PidMatch', None)
+    if not product and not pattern:
+        return []
+    return find_pids(plugin.snapshot('comms'), name=product, pattern=pattern, sort=variables.get('PidSort', 'start_time'))
+
+
+class Pids(Variable):
+    '''
+    All pids of processes whose name Product starts with and/or whose command line matches the PidMatch regex.
+    Sorted by PidSort, either start_time (oldest first, the default) or rss (largest first).
+    '''
+    snapshot_sources = ('comms',)
+
+    def run(self, variables):
+        pids = _find_pids(self, variables)
+        if pids:
+            return pids
+        pid = variables.get('Pid', None)
+        if pid:
+            return [pid]
 
 
 class Pid(Variable):
+    '''The best matching pid from Pids'''
+    snapshot_sources = ('comms',)
+
     def run(self, variables):
-        product = variables.get('Product', None)
-        if product:
-            for p in psutil.process_iter():
-                try:
-                    if product.lower().startswith(p.name().lower()):
-                        return p.pid
-                except psutil_exceptions:
-                    continue
+        pids = variables.get('Pids', None) or _find_pids(self, variables)
+        if pids:
+            return pids[0]
 
 
 class PidCwd(Variable):
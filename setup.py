@@ -52,7 +52,6 @@ setup(
         'requests>=2.18.4',
         'humanfriendly>=4.4.1',
         'parsedatetime>=2.4',
-        'PTable>=0.9.2',
         'setuptools>=30',
     ],
     cmdclass={'test': PyTest,
@@ -63,6 +62,7 @@ setup(
         'pytest>=3.0.6',
         'flake8>=3.5.0',
         'pytest-timeout>=1.2.0',
+        'PTable>=0.9.2',
         'tox'
     ],
     entry_points={
@@ -1,59 +1,109 @@
 # Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
 # See LICENSE in the project root for license information.
 
+import os
+import tempfile
+
 from unittest.mock import patch
 
 from fossor.checks.buddyinfo import BuddyInfo
 
+example_buddyinfo = """\
+Node 0, zone      DMA      2      1      1      1      1      0      1      0      1      1      3
+Node 0, zone    DMA32   2592   2028   1683   1408   1060    689    423    220    115     18      0
+Node 0, zone   Normal  74469  83969 174582 227090 116398  48054  23129  13454   6410      2      0
+"""
+
+example_pagetypeinfo = """\
+Page block order: 9
+Pages per block:  512
+
+Free pages count per migrate type at order       0      1      2      3      4      5      6      7      8      9     10
+"""
+
+example_vmstat = """\
+nr_free_pages 123
+compact_stall 12
+compact_fail 3
+compact_success 9
+"""
+
+
+def _run(tmpdir, buddyinfo, pagetypeinfo=example_pagetypeinfo, vmstat='compact_stall 0\n'):
+    paths = {}
+    for name, content in (('buddyinfo', buddyinfo), ('pagetypeinfo', pagetypeinfo), ('vmstat', vmstat)):
+        paths[name] = os.path.join(tmpdir, name)
+        if content is not None:
+            with open(paths[name], 'w') as f:
+                f.write(content)
+    buddy = BuddyInfo()
+    with patch.object(BuddyInfo, 'BUDDYINFO_PATH', paths['buddyinfo']), \
+            patch.object(BuddyInfo, 'PAGETYPEINFO_PATH', paths['pagetypeinfo']), \
+            patch.object(BuddyInfo, 'VMSTAT_PATH', paths['vmstat']):
+        result = buddy.run({})
+    return buddy, result
+
 
 @patch('fossor.checks.buddyinfo.BuddyInfo._getpagesize')
-@patch('fossor.plugin.Plugin.shell_call')
-def test_buddyinfo_report(sc_mock, pagesize_mock):
-    expected = """\
+def test_buddyinfo_report(pagesize_mock):
+    expected = f"""\
 No significant memory fragmentation
 Smallest Page Size for system is 4096
 Therefore, each columns pagesize is: 4 KiB 8 KiB 16 KiB 32 KiB 64 KiB 128 KiB 256 KiB 512 KiB 1 MiB 2 MiB 4 MiB
-Output of 'cat /proc/buddyinfo' is:
-Node 0, zone      DMA      2      1      1      1      1      0      1      0      1      1      3
-Node 0, zone    DMA32   2592   2028   1683   1408   1060    689    423    220    115     18      0
-Node 0, zone   Normal  74469  83969 174582 227090 116398  48054  23129  13454   6410      2      0"""
-    out = """\
-Node 0, zone      DMA      2      1      1      1      1      0      1      0      1      1      3
-Node 0, zone    DMA32   2592   2028   1683   1408   1060    689    423    220    115     18      0
-Node 0, zone   Normal  74469  83969 174582 227090 116398  48054  23129  13454   6410      2      0"""
-    err = ''
-    return_code = 0
-
-    sc_mock.return_value = out, err, return_code
+Fragmentation index for 2 MiB (order 9) allocations:
+Node 0, zone DMA32: fragmentation index=-1.000, unusable free space index=0.942
+Node 0, zone Normal: fragmentation index=-1.000, unusable free space index=1.000
+Contents of {os.path.join('TMPDIR', 'buddyinfo')}:
+{example_buddyinfo}"""
     pagesize_mock.return_value = 4096
-    buddy = BuddyInfo()
-    result = buddy.run({})
-    assert result == expected
+    with tempfile.TemporaryDirectory() as tmpdir:
+        buddy, result = _run(tmpdir, example_buddyinfo)
+        assert result == expected.replace('TMPDIR', tmpdir)
+    assert not buddy.should_notify()
 
 
 @patch('fossor.checks.buddyinfo.BuddyInfo._getpagesize')
-@patch('fossor.plugin.Plugin.shell_call')
-def test_buddyinfo_fragmentation(sc_mock, pagesize_mock):
-    out = """\
+def test_buddyinfo_fragmentation(pagesize_mock):
+    buddyinfo = """\
 Node 0, zone      DMA      2      1      1      1      1      0      1      0      1      1      3
 Node 0, zone    DMA32   2592   2028   1683   1408   1060    689    423    220    115     18      0
-Node 0, zone   Normal  74469  83969      0      0      0      0      0      0      0      0      0"""
-    err = ''
-    return_code = 0
-
-    sc_mock.return_value = out, err, return_code
+Node 0, zone   Normal  74469  83969      0      0      0      0      0      0      0      0      0
+"""
     pagesize_mock.return_value = 4096
-    buddy = BuddyInfo()
-    buddy.run({})
+    with tempfile.TemporaryDirectory() as tmpdir:
+        buddy, result = _run(tmpdir, buddyinfo, vmstat=example_vmstat)
     assert buddy.fragmentation()
+    assert result.startswith('Possible memory fragmentation\n')
+    assert 'Node 0, zone Normal: fragmentation index=0.998, unusable free space index=1.000\n' in result
+    assert 'Compaction: compact_stall=12, compact_fail=3, compact_success=9\n' in result
 
 
-@patch('fossor.plugin.Plugin.shell_call')
-def test_get_page_size(sc_mock):
-    out = '4096'
-    err = ''
-    return_code = 0
+@patch('fossor.checks.buddyinfo.BuddyInfo._getpagesize')
+def test_buddyinfo_without_pagetypeinfo(pagesize_mock):
+    pagesize_mock.return_value = 4096
+    with tempfile.TemporaryDirectory() as tmpdir:
+        buddy, result = _run(tmpdir, example_buddyinfo, pagetypeinfo=None, vmstat=None)
+    assert buddy.page_block_order == BuddyInfo.DEFAULT_PAGE_BLOCK_ORDER
+    assert 'Compaction' not in result
+
+
+def test_fragmentation_index():
+    buddy = BuddyInfo()
+    # Suitable free blocks exist, the allocation succeeds
+    assert buddy.fragmentation_index([0, 0, 1], 2) == -1
+    # No free memory at all
+    assert buddy.fragmentation_index([0, 0, 0], 2) == 0
+    # Plenty of free memory, all of it in order 0 blocks
+    assert buddy.fragmentation_index([1000, 0, 0], 2) == 0.749
+    # Little free memory, failure is mostly due to a lack of memory rather than fragmentation
+    assert buddy.fragmentation_index([2, 0, 0], 2) == 0.25
+    assert buddy.unusable_index([4, 0, 1], 2) == 0.5
+    assert buddy.unusable_index([0, 0, 0], 2) == 1
+
 
-    sc_mock.return_value = out, err, return_code
+@patch('os.sysconf')
+def test_get_page_size(sysconf_mock):
+    sysconf_mock.return_value = 4096
     buddy = BuddyInfo()
     assert buddy._getpagesize() == 4096
+    sysconf_mock.assert_called_once_with('SC_PAGE_SIZE')
@@ -1,19 +1,105 @@
 # Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
 # See LICENSE in the project root for license information.
 
+import os
+import time
+import json
+import tempfile
+
 from unittest.mock import patch
+from collections import namedtuple
+
+from fossor.checks.diskusage import DiskUsage, Mount
+
+example_mountinfo = '''23 28 0:22 / /proc rw,relatime - proc proc rw
+25 28 0:6 / /dev rw,relatime - devtmpfs devtmpfs rw,size=3071872k,nr_inodes=767968,mode=755
+26 25 0:24 / /dev/shm rw,relatime - tmpfs tmpfs rw,size=6158152k
+28 1 8:2 / / rw,relatime shared:1 - ext4 /dev/sda2 rw
+29 28 8:2 /home /mnt/home\\040dir rw,relatime shared:1 - ext4 /dev/sda2 rw
+30 25 0:27 / /dev/shm rw,relatime - tmpfs tmpfs rw,size=6158152k
+31 28 0:44 / /mnt/nfs rw,relatime - nfs4 filer:/export rw
+'''
+
+
+def _statvfs(blocks, bfree, files=1000, ffree=900):
+    '''Create a statvfs result with 1K blocks'''
+    return os.statvfs_result((1024, 1024, blocks, bfree, bfree, files, ffree, ffree, 0, 255))
+
+
+def _run(statvfs, variables=None):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        mountinfo_path = os.path.join(tmpdir, 'mountinfo')
+        with open(mountinfo_path, 'w') as f:
+            f.write(example_mountinfo)
+        variables = variables or {'state_dir': tmpdir}
+        with patch.object(DiskUsage, 'MOUNTINFO_PATH', mountinfo_path), patch('os.statvfs', side_effect=statvfs):
+            return DiskUsage().run(variables)
+
+
+def test_get_mounts():
+    with tempfile.NamedTemporaryFile('w') as f:
+        f.write(example_mountinfo)
+        f.flush()
+        with patch.object(DiskUsage, 'MOUNTINFO_PATH', f.name):
+            mounts = DiskUsage().get_mounts()
+    assert [m.mount_point for m in mounts] == ['/dev', '/', '/dev/shm', '/mnt/nfs']
+    assert mounts[1] == Mount(device='8:2', mount_point='/', fs_type='ext4', source='/dev/sda2')
+    assert mounts[2].device == '0:27'  # The second /dev/shm mount hides the first
+
+
+def test_get_mounts_without_mountinfo():
+    Partition = namedtuple('Partition', 'device, mountpoint, fstype, opts')  # Fields of psutil.disk_partitions()
+    partitions = [Partition('/dev/disk1s1', '/', 'apfs', 'rw'), Partition('/dev/disk1s1', '/System/Volumes/Data', 'apfs', 'rw'),
+                  Partition('/dev/disk2s1', '/Volumes/Image', 'iso9660', 'ro')]
+    with patch.object(DiskUsage, 'MOUNTINFO_PATH', '/nonexistent/mountinfo'), patch('psutil.disk_partitions', return_value=partitions):
+        mounts = DiskUsage().get_mounts()
+    assert mounts == [Mount(device='/dev/disk1s1', mount_point='/', fs_type='apfs', source='/dev/disk1s1')]
+
+
+def test_disk_usage():
+    def statvfs(path):
+        if path == '/':
+            return _statvfs(blocks=407000, bfree=4000)
+        return _statvfs(blocks=1000, bfree=990)
+    assert _run(statvfs) == 'Disk utilization is at critical state (> 98). partition=/dev/sda2 at utilization=100%'
+
+
+def test_disk_usage_ok():
+    assert _run(lambda path: _statvfs(blocks=1000, bfree=500)) is None
+
+
+def test_inode_usage():
+    def statvfs(path):
+        if path == '/mnt/nfs':
+            return _statvfs(blocks=1000, bfree=500, files=1000, ffree=10)
+        return _statvfs(blocks=1000, bfree=500)
+    assert _run(statvfs) == 'Inode utilization is at critical state (> 95). partition=filer:/export at inode utilization=99%'
+
+
+def test_hung_mount():
+    def statvfs(path):
+        if path == '/mnt/nfs':
+            time.sleep(3)
+        return _statvfs(blocks=1000, bfree=500)
+    start = time.time()
+    with patch.object(DiskUsage, 'STATFS_TIMEOUT', 0.5):
+        result = _run(statvfs)
+    assert time.time() - start < 2
+    assert result == 'partition=filer:/export mounted on /mnt/nfs (nfs4) did not respond to statfs within 0.5 seconds'
 
-from fossor.checks.diskusage import DiskUsage
 
+def test_fill_rate_projection():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Used space grew from 100K to 600K over the last 10 hours with 400K left
+        now = time.time()
+        history = {'/': [[now - 36000, 100 * 1024], [now - 18000, 350 * 1024]]}
+        with open(os.path.join(tmpdir, DiskUsage.HISTORY_FILE), 'w') as f:
+            json.dump(history, f)
 
-@patch('fossor.plugin.Plugin.shell_call')
-def test_disk_usage(sc_mock):
-    out = 'Filesystem     1K-blocks      Used Available Use% Mounted on\n' \
-          '/dev/sda2       407G  318G   69G  99% /\n' \
-          'tmpfs            32G  161M   32G   1% /dev/shm'
-    err = ''
-    return_code = 0
+        result = _run(lambda path: _statvfs(blocks=1000, bfree=400), variables={'state_dir': tmpdir})
+        assert result.startswith('partition=/dev/sda2 mounted on / is projected to be full in 8.0 hours')
 
-    sc_mock.return_value = out, err, return_code
-    c = DiskUsage()
-    assert c.run({}) == 'Disk utilization is at critical state (> 98). partition=/dev/sda2 at utilization=99%'
+        with open(os.path.join(tmpdir, DiskUsage.HISTORY_FILE)) as f:
+            history = json.load(f)
+        assert len(history['/']) == 3
+        assert len(history['/mnt/nfs']) == 1
@@ -6,6 +6,7 @@ import logging
 from io import StringIO
 from importlib import reload
 from fossor.checks import dmesg
+from fossor.utils import kmsg
 from unittest.mock import patch
 
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
@@ -23,13 +24,13 @@ example_dmesg_output = '''[2047964.712926] usb 2-1.3.4: New USB device strings:
 
 
 def test_dmesg():
-    with patch('fossor.utils.misc.common_path', return_value='/usr/bin/dmesg'):
+    with patch('fossor.plugin.Plugin.snapshot', side_effect=PermissionError), patch('fossor.utils.misc.common_path', return_value='/usr/bin/dmesg'):
         reload(dmesg)
         variables = {}
         d = dmesg.Dmesg()
-        with patch('fossor.plugin.Plugin.shell_call') as mocked_shell_call:
+        with patch('fossor.plugin.Plugin.shell_stream') as mocked_shell_stream:
             text = StringIO(initial_value=example_dmesg_output)
-            mocked_shell_call.return_value = (text, '', 0)
+            mocked_shell_stream.return_value = text  # Iterates over lines like a ShellStream
             result = d.run(variables)
             assert 'high-speed' in result
 
@@ -38,14 +39,32 @@ def test_dmesg_with_start_end_times():
     variables = {}
     variables['start_time'] = 1509647158.0
     variables['end_time'] = 1509647160.0
-    with patch('fossor.utils.misc.common_path', return_value='/usr/bin/dmesg'):
+    with patch('fossor.plugin.Plugin.snapshot', side_effect=PermissionError), patch('fossor.utils.misc.common_path', return_value='/usr/bin/dmesg'):
         reload(dmesg)
         d = dmesg.Dmesg()
-        with patch('fossor.plugin.Plugin.shell_call') as mocked_shell_call:
+        with patch('fossor.plugin.Plugin.shell_stream') as mocked_shell_stream:
             with patch('fossor.checks.dmesg.Dmesg._get_boot_time') as mocked_get_boot_time:
                 mocked_get_boot_time.return_value = 1509664739.8043845 - 2069605.89
                 text = StringIO(initial_value=example_dmesg_output)
-                mocked_shell_call.return_value = (text, '', 0)
+                mocked_shell_stream.return_value = text  # Iterates over lines like a ShellStream
                 result = d.run(variables)
                 assert 'USB disconnect, device number 39' in result
                 assert len(result.splitlines()) == 1
+
+
+def test_dmesg_from_kmsg():
+    records = [kmsg.parse_record(b'6,1,1000000,-;first message\n'),
+               kmsg.parse_record(b'4,2,5000000,-;second message\n SUBSYSTEM=pci\n'),
+               kmsg.parse_record(b'3,3,9000000,-;third message\n')]
+    boot_time = 1509664739.0
+    variables = {}
+    variables['start_time'] = boot_time + 2
+    variables['end_time'] = boot_time + 9
+    with patch('fossor.plugin.Plugin.snapshot', return_value=records), patch('fossor.utils.kmsg.get_boot_time', return_value=boot_time):
+        with patch('fossor.plugin.Plugin.shell_stream') as mocked_shell_stream:
+            result = dmesg.Dmesg().run(variables)
+            mocked_shell_stream.assert_not_called()
+    lines = result.splitlines()
+    assert len(lines) == 2
+    assert lines[0].endswith('third message')  # Newest messages first
+    assert lines[1].endswith('second message')
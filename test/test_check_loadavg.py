@@ -0,0 +1,97 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+import os
+import tempfile
+
+from unittest.mock import patch
+
+from fossor.checks.loadavg import LoadAvg
+
+cpu_pressure = {'some': {'avg10': 40.0, 'avg60': 30.0, 'avg300': 10.0, 'total': 1000}}
+io_pressure = {'some': {'avg10': 1.0, 'avg60': 2.0, 'avg300': 3.0, 'total': 1000},
+               'full': {'avg10': 0.5, 'avg60': 1.0, 'avg300': 1.5, 'total': 100}}
+stat_samples = [{'cpu': {'user': 100, 'system': 0, 'idle': 100, 'iowait': 0, 'steal': 0}, 'procs_running': 2, 'procs_blocked': 0},
+                {'cpu': {'user': 150, 'system': 10, 'idle': 110, 'iowait': 30, 'steal': 0}, 'procs_running': 6, 'procs_blocked': 3}]
+
+
+@patch('time.sleep')
+@patch('os.cpu_count', return_value=4)
+@patch('fossor.checks.loadavg.read_stat')
+@patch('fossor.checks.loadavg.read_pressure')
+@patch('fossor.checks.loadavg.LoadAvg.get_cgroup_cpu')
+@patch('fossor.checks.loadavg.LoadAvg.get_cpu_quota')
+@patch('os.sched_getaffinity')
+@patch('fossor.plugin.Plugin.snapshot')
+def test_loadavg(snapshot_mock, affinity_mock, quota_mock, cgroup_mock, pressure_mock, stat_mock, cpu_count_mock, sleep_mock):
+    snapshot_mock.return_value = (3.5, 2.0, 1.0)
+    affinity_mock.return_value = {0, 1, 2, 3}
+    quota_mock.return_value = 2.5
+    cgroup_mock.return_value = None
+    pressure_mock.return_value = None
+    c = LoadAvg()
+    # The host wide load is compared with the CPUs of the host, not with the quota of a cgroup
+    assert c.run({'Pid': 1234}) is None
+    stat_mock.assert_not_called()
+
+    cgroup_mock.return_value = {'path': '/sys/fs/cgroup/app', 'pressure': cpu_pressure,
+                                'stat': {'usage_usec': 1000, 'nr_periods': 200, 'nr_throttled': 50, 'throttled_usec': 12500000}}
+    pressure_mock.side_effect = lambda resource: {'cpu': None, 'io': io_pressure}[resource]
+    stat_mock.side_effect = stat_samples
+    assert c.run({'Pid': 1234}) == (
+        'Load average shows processes queued beyond CPU count!\nCPU Count: 4\nLoad averages: 3.5 2.0 1.0'
+        '\nCPU limits: 4 CPUs in affinity mask, cgroup quota of 2.5 CPUs'
+        '\ncgroup: /sys/fs/cgroup/app'
+        '\ncgroup cpu pressure: some avg10=40.00 avg60=30.00 avg300=10.00'
+        '\ncgroup throttled in 50 of 200 periods, 12.5 seconds in total since it was created'
+        '\nTasks runnable: 6, blocked on io: 3'
+        '\nCPU time: busy 60%, iowait 30%, steal 0%, idle 10%'
+        '\nio pressure: some avg10=1.00 avg60=2.00 avg300=3.00, full avg10=0.50 avg60=1.00 avg300=1.50')
+    affinity_mock.assert_called_with(1234)
+    quota_mock.assert_called_with(1234)
+    cgroup_mock.assert_called_with(1234)
+
+    cgroup_mock.return_value = None
+    snapshot_mock.return_value = (4.5, 2.0, 1.0)
+    stat_mock.side_effect = stat_samples
+    assert c.run({}).startswith('Load average shows processes queued beyond CPU count!\nCPU Count: 4\nLoad averages: 4.5 2.0 1.0')
+
+
+def test_cgroup_cpu():
+    c = LoadAvg()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with patch('fossor.utils.cgroup.get_cgroup_dir', return_value=tmpdir):
+            assert c.get_cgroup_cpu(1234) is None
+            with open(os.path.join(tmpdir, 'cpu.stat'), 'w') as f:
+                f.write('usage_usec 1000\nnr_periods 10\nnr_throttled 2\nthrottled_usec 300000\n')
+            with open(os.path.join(tmpdir, 'cpu.pressure'), 'w') as f:
+                f.write('some avg10=1.00 avg60=2.00 avg300=3.00 total=100\nfull avg10=0.00 avg60=0.00 avg300=0.00 total=0\n')
+            cgroup_cpu = c.get_cgroup_cpu(1234)
+    assert cgroup_cpu['path'] == tmpdir
+    assert cgroup_cpu['pressure']['some']['avg60'] == 2.0
+    assert cgroup_cpu['stat']['nr_throttled'] == 2
+
+
+def test_cpu_quota():
+    c = LoadAvg()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with open(os.path.join(tmpdir, 'cpu.max'), 'w') as f:
+            f.write('150000 100000\n')
+        with patch('fossor.utils.cgroup.get_cgroup_dir', return_value=tmpdir):
+            assert c.get_cpu_quota() == 1.5
+
+            with open(os.path.join(tmpdir, 'cpu.max'), 'w') as f:
+                f.write('max 100000\n')
+            assert c.get_cpu_quota() is None
+
+            # cgroup v1
+            os.remove(os.path.join(tmpdir, 'cpu.max'))
+            with open(os.path.join(tmpdir, 'cpu.cfs_period_us'), 'w') as f:
+                f.write('100000\n')
+            with open(os.path.join(tmpdir, 'cpu.cfs_quota_us'), 'w') as f:
+                f.write('-1\n')
+            assert c.get_cpu_quota() is None
+
+            with open(os.path.join(tmpdir, 'cpu.cfs_quota_us'), 'w') as f:
+                f.write('400000\n')
+            assert c.get_cpu_quota() == 4
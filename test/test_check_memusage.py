@@ -1,15 +1,22 @@
 # Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
 # See LICENSE in the project root for license information.
 
+import os
+import tempfile
+
 from unittest.mock import patch
 
+from fossor.utils.kmsg import KernelLogRecord
+
 
+@patch('fossor.checks.memusage.MemUsage.get_pressure', return_value=None)
+@patch('fossor.plugin.Plugin.snapshot', side_effect=PermissionError)
 @patch('platform.system')
 @patch('fossor.checks.memusage.MemUsage.get_meminfo')
 @patch('fossor.checks.memusage.MemUsage.get_time')
 @patch('fossor.plugin.Plugin.shell_call')
 @patch('fossor.utils.misc.common_path', return_value='/usr/bin/dmesg')
-def test_mem_usage(cp_mock, sc_mock, time_mock, mem_mock, ps_mock):
+def test_mem_usage(cp_mock, sc_mock, time_mock, mem_mock, ps_mock, kmsg_mock, pressure_mock):
     from fossor.checks.memusage import MemUsage
 
     line1 = '[11686.040460] flasherav invoked oom-killer: gfp_mask=0x201da, order=0, oom_adj=0, oom_score_adj=0'
@@ -70,3 +77,66 @@ def test_mem_usage(cp_mock, sc_mock, time_mock, mem_mock, ps_mock):
         '\nWed, 11 Oct 2017 23:41:04[4680581.563150] perl invoked oom-killer: gfp_mask=0x380da, order=0, oom_score_adj=0\n'
         'Wed, 11 Oct 2017 23:41:05[4680582.563150] perl invoked oom-killer: gfp_mask=0x380da, order=0, oom_score_adj=0\n'
         )
+
+
+@patch('platform.system', return_value='Linux')
+def test_mem_usage_available_and_pressure(ps_mock):
+    from fossor.checks.memusage import MemUsage
+
+    meminfo = {'MemTotal': 100, 'MemFree': 2, 'Buffers': 0, 'Cached': 60, 'MemAvailable': 40}
+    pressure = {'some': {'avg10': 30.0, 'avg60': 12.5, 'avg300': 3.0, 'total': 1000},
+                'full': {'avg10': 1.0, 'avg60': 0.5, 'avg300': 0.25, 'total': 100}}
+    kernel_log = [KernelLogRecord(level=3, facility=0, sequence=1, timestamp_usec=1000000, message='perl invoked oom-killer')]
+    snapshots = {'meminfo': meminfo, 'vmstat': {'oom_kill': 0}, 'kernel_log': kernel_log}
+
+    c = MemUsage()
+    with patch('fossor.plugin.Plugin.snapshot', side_effect=snapshots.get), \
+            patch('fossor.checks.memusage.MemUsage.get_pressure', return_value=None):
+        # MemFree + Buffers + Cached would be 38% used, MemAvailable is 60% used. No oom kills counted, so the kernel log is ignored.
+        assert c.run({}) is None
+
+        meminfo['MemAvailable'] = 5
+        assert c.run({}) == 'High Memory Use!\nMemTotal: 100 kib\nUsed: 95 kib (95%)'
+
+    meminfo['MemAvailable'] = 40
+    with patch('fossor.plugin.Plugin.snapshot', side_effect=snapshots.get), \
+            patch('fossor.checks.memusage.MemUsage.get_pressure', return_value=pressure):
+        assert c.run({}) == ('High Memory Use!\nMemTotal: 100 kib\nUsed: 60 kib (60%)'
+                             '\nPressure: some avg10=30.00 avg60=12.50 avg300=3.00, full avg10=1.00 avg60=0.50 avg300=0.25')
+
+
+@patch('platform.system', return_value='Linux')
+@patch('fossor.checks.memusage.MemUsage.get_pressure', return_value=None)
+def test_mem_usage_cgroup(pressure_mock, ps_mock):
+    from fossor.checks.memusage import MemUsage
+
+    snapshots = {'meminfo': {'MemTotal': 100, 'MemAvailable': 90}, 'vmstat': {'oom_kill': 0}}
+    with tempfile.TemporaryDirectory() as tmpdir, tempfile.TemporaryDirectory() as state_dir:
+        variables = {'Pid': 1234, 'state_dir': state_dir}
+        for name, content in (('memory.current', '1048576\n'), ('memory.max', 'max\n'),
+                              ('memory.events', 'low 0\nhigh 0\nmax 0\noom 0\noom_kill 0\n')):
+            with open(os.path.join(tmpdir, name), 'w') as f:
+                f.write(content)
+
+        c = MemUsage()
+        with patch('fossor.plugin.Plugin.snapshot', side_effect=snapshots.get), \
+                patch('fossor.utils.cgroup.get_cgroup_dir', return_value=tmpdir):
+            assert c.run(variables) is None
+
+            with open(os.path.join(tmpdir, 'memory.max'), 'w') as f:
+                f.write('1126400\n')
+            with open(os.path.join(tmpdir, 'memory.events'), 'w') as f:
+                f.write('low 0\nhigh 0\nmax 7\noom 1\noom_kill 1\n')
+            assert c.run(variables) == (
+                'High Memory Use!\nMemTotal: 100 kib\nUsed: 10 kib (10%)'
+                f'\n\ncgroup of pid 1234: {tmpdir}'
+                '\nUsed: 1024 kib\nLimit: 1100 kib (93% used)\nEvents: oom=1 oom_kill=1 max=7 high=0'
+                '\nSince the last run: oom=1 oom_kill=1')
+
+            # The oom counters are cumulative, an oom kill already seen by the last run is not alerted on again
+            with open(os.path.join(tmpdir, 'memory.max'), 'w') as f:
+                f.write('max\n')
+            assert c.run(variables) is None
+            with open(os.path.join(tmpdir, 'memory.events'), 'w') as f:
+                f.write('low 0\nhigh 0\nmax 7\noom 1\noom_kill 2\n')
+            assert c.run(variables).endswith('Events: oom=1 oom_kill=2 max=7 high=0\nSince the last run: oom=0 oom_kill=1')
@@ -1,9 +1,20 @@
 # Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
 # See LICENSE in the project root for license information.
 
+import os
+import time
+import tempfile
+
 from unittest.mock import patch
 
-from fossor.checks.netiface_errors import NetIFace
+from fossor.checks.netiface_errors import NetIFace, read_net_counters
+from fossor.utils.sampler import RingBufferSampler
+
+example_proc_net_dev = '''Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed
+    lo: 13163466    1318    0    0    0     0          0         0 13163466    1318    0    0    0     0       0          0
+  eth0: 3432551     287    4    0    0     0          0         0    39815     280    0    2    0     0       6          0
+'''
 
 
 def test_parse_sar():
@@ -32,5 +43,69 @@ def test_disk_usage(isdir_mock, system_mock, sc_mock):
     isdir_mock.return_value = True
     sc_mock.return_value = out, err, return_code
 
-    c = NetIFace().run({})
+    c = NetIFace().run({'netiface_mode': 'sar'})
     assert c == 'stat=txdrop, interface=ppp0 has surpassed threshold. value=1.0\n'
+
+
+@patch('fossor.plugin.Plugin.shell_call')
+@patch('platform.system')
+def test_sar_reports_every_interface(system_mock, sc_mock):
+    out = 'Average:         eth0      0.00      0.00      0.00      0.00      1.00      0.00      0.00      0.00      0.00\n' \
+          'Average:         eth1      2.00      0.00      0.00      0.00      0.00      0.00      0.00      0.00      0.00'
+    system_mock.return_value = 'Linux'
+    sc_mock.return_value = out, '', 0
+
+    c = NetIFace().run({'netiface_mode': 'sar'})
+    assert c == 'stat=txdrop, interface=eth0 has surpassed threshold. value=1.0\n' \
+                'stat=rxerr, interface=eth1 has surpassed threshold. value=2.0\n'
+
+
+def test_read_net_counters():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        proc_net_dev = os.path.join(tmpdir, 'dev')
+        with open(proc_net_dev, 'w') as f:
+            f.write(example_proc_net_dev)
+        os.makedirs(os.path.join(tmpdir, 'eth0', 'statistics'))
+        with open(os.path.join(tmpdir, 'eth0', 'statistics', 'rx_crc_errors'), 'w') as f:
+            f.write('17\n')
+
+        counters = read_net_counters(proc_net_dev_path=proc_net_dev, sys_class_net_path=tmpdir)
+    assert sorted(counters) == ['eth0', 'lo']
+    assert counters['eth0']['rxbyt'] == 3432551
+    assert counters['eth0']['rxerr'] == 4
+    assert counters['eth0']['txdrop'] == 2
+    assert counters['eth0']['txcarr'] == 6
+    assert counters['eth0']['rx_crc_errors'] == 17
+    assert 'rx_crc_errors' not in counters['lo']
+
+
+@patch('time.sleep')
+@patch('platform.system')
+@patch('fossor.checks.netiface_errors.read_net_counters')
+def test_native_rates(counters_mock, system_mock, sleep_mock):
+    system_mock.return_value = 'Linux'
+    first = {'eth0': {'rxerr': 10, 'txdrop': 5, 'rx_crc_errors': 1}, 'eth1': {'rxerr': 0, 'txdrop': 0}}
+    last = {'eth0': {'rxerr': 10, 'txdrop': 5, 'rx_crc_errors': 3}, 'eth1': {'rxerr': 4, 'txdrop': 0}, 'eth2': {'rxerr': 100}}
+    counters_mock.side_effect = [first, last]
+
+    with patch('time.time', side_effect=[1000.0, 1002.0]):
+        c = NetIFace().run({'netiface_interval': 2})
+    sleep_mock.assert_called_once_with(2.0)
+    assert c == 'stat=rx_crc_errors, interface=eth0 has surpassed threshold. value=1.0/s\n' \
+                'stat=rxerr, interface=eth1 has surpassed threshold. value=2.0/s\n'
+
+    counters_mock.side_effect = [first, first]
+    assert NetIFace().run({}) is None
+
+
+@patch('platform.system')
+@patch('fossor.checks.netiface_errors.read_net_counters')
+def test_native_uses_sampler(counters_mock, system_mock):
+    system_mock.return_value = 'Linux'
+    counters_mock.return_value = {'eth0': {'txdrop': 30}}
+    sampler = RingBufferSampler(function=lambda: {'eth0': {'txdrop': 0}})
+    sampler._samples.append((time.time() - 10, {'eth0': {'txdrop': 0}}))
+    with patch.dict('fossor.utils.sampler.samplers', {'netiface': sampler}), patch('time.sleep') as sleep_mock:
+        c = NetIFace().run({})
+        sleep_mock.assert_not_called()
+    assert c.startswith('stat=txdrop, interface=eth0 has surpassed threshold. value=3.0')
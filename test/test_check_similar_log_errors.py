@@ -55,7 +55,7 @@ def test_basic_output():
         filepath = create_tmp_log_file(text=example_file_text, dir_path=tmpdir)
         variables = {}
         variables['LogFiles'] = [filepath]
-        result = sle.run(variables)
+        result = sle.run_helper(variables)
     print(f"Result:\n{result}")
 
     assert 'filename' in result
@@ -80,7 +80,7 @@ def test_max_unique_lines():
         filepath = create_tmp_log_file(text=log_text, dir_path=tmpdir)
         variables = {}
         variables['LogFiles'] = [filepath]
-        result = sle.run(variables)
+        result = sle.run_helper(variables)
     print(f"Result:\n{result}")
     assert 'Other Error Lines' in result
     assert 'Count: 5' in result
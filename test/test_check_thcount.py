@@ -4,14 +4,33 @@
 from unittest.mock import patch
 
 from fossor.checks.thcount import Thcount
+from fossor.utils.snapshot import ProcessInfo
 
 
-@patch('fossor.plugin.Plugin.shell_call')
-def test_thcount(sc_mock):
-    out = 'THCNT USER\n1 root\n2 ermanuel\n1001 scallist\n10000 fossor \n1 fossor\n1 root\n1 root\n1 root\n1 root\n1 root\n1 root'
-    err = ''
-    return_code = 0
-
-    sc_mock.return_value = out, err, return_code
+@patch('fossor.plugin.Plugin.snapshot')
+def test_thcount(snapshot_mock):
+    processes = [(1, 'root'), (2, 'ermanuel'), (1001, 'scallist'), (10000, 'fossor'), (1, 'fossor'), (1, 'root'), (1, None), (None, 'root')]
+    snapshot_mock.return_value = tuple(ProcessInfo(pid=pid, name='foo', username=user, num_threads=count) for pid, (count, user) in enumerate(processes))
     c = Thcount()
-    assert c.run({}) == 'user fossor currently has 10001 threads\n'
+    assert c.run({}) == ('user fossor currently has 10001 threads\n'
+                         '    pid 3 (foo) has 10000 threads\n'
+                         '    pid 4 (foo) has 1 threads\n')
+    snapshot_mock.assert_called_with('processes')
+
+
+@patch('fossor.plugin.Plugin.snapshot')
+def test_thcount_reports_every_user(snapshot_mock):
+    processes = [ProcessInfo(pid=pid, name=f'java{pid}', username=user, num_threads=6000) for pid, user in enumerate(['a', 'a', 'b', 'b', 'b', 'c'])]
+    snapshot_mock.return_value = tuple(processes)
+    result = Thcount().run({})
+    lines = result.splitlines()
+    assert lines[0] == 'user b currently has 18000 threads'  # Users with the most threads first
+    assert 'user a currently has 12000 threads' in lines
+    assert 'user c' not in result
+    assert len([line for line in lines if 'pid' in line]) == 5
+
+
+@patch('fossor.plugin.Plugin.snapshot')
+def test_thcount_under_limit(snapshot_mock):
+    snapshot_mock.return_value = (ProcessInfo(pid=1, name='init', username='root', num_threads=1),)
+    assert Thcount().run({}) is None
@@ -1,8 +1,10 @@
 # Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
 # See LICENSE in the project root for license information.
 
+import os
 import sys
 import logging
+import tempfile
 
 from fossor.cli import main
 from click.testing import CliRunner
@@ -48,3 +50,11 @@ def test_fossor_invalid_kwarg():
     result = runner.invoke(main, args=['--time-out', '1', 'foobar=5', '--not-a-valid-flag', '--another-invalid-flag', '6'])
     assert result.exit_code == -1
     assert '' == result.output
+
+
+def test_fossor_profile_plugins():
+    runner = CliRunner()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        result = runner.invoke(main, args=['--time-out', '5', '--white-list', 'LoadAvg', '--profile-plugins', 'loadavg', '--profile-dir', tmpdir])
+        assert result.exit_code == 0
+        assert os.listdir(tmpdir) == ['fossor.checks.loadavg.LoadAvg.pstats']
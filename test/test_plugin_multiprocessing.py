@@ -1,13 +1,19 @@
 # Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
 # See LICENSE in the project root for license information.
 
+import os
 import sys
+import time
+import asyncio
 import logging
+import psutil
 
 from time import sleep
 
 from fossor.checks.check import Check
+from fossor.variables.variable import Variable
 from fossor.engine import Fossor
+from fossor.utils.misc import run_coroutine
 
 
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
@@ -99,3 +105,312 @@ def test_short_running_plugin():
     f.add_variable('verbose', True)
     result = f.run(report='DictObject')
     assert 'ShortCheck' in result.keys()
+
+
+def test_run_status():
+    '''Confirm the runner publishes the lifecycle of every plugin'''
+    f = Fossor()
+    f.check_plugins = [LongCheck, ShortCheck]
+    f.variable_plugins = set()
+    f.add_variable('timeout', 1)
+    f.run(report='DictObject')
+
+    plugins = f.run_status.plugins
+    assert plugins[ShortCheck.get_full_name()].state == 'finished'
+    assert plugins[LongCheck.get_full_name()].state == 'timed_out'
+    assert 1 <= plugins[LongCheck.get_full_name()].elapsed() < 10
+    assert plugins[LongCheck.get_full_name()].pid
+    assert f.run_status.running() == []
+    assert [event.event for event in f.run_status.events if event.name == ShortCheck.get_full_name()] == ['queued', 'started', 'delivered', 'finished']
+
+
+def test_run_stats():
+    '''Confirm the outcome and resource usage of every plugin is recorded'''
+    f = Fossor()
+    f.check_plugins = [LongCheck, ShortCheck, FailCheck]
+    f.variable_plugins = set()
+    f.add_variable('timeout', 1)
+    f.run(report='DictObject')
+
+    plugins = f.run_status.plugins
+    assert plugins[ShortCheck.get_full_name()].outcome == 'ok'
+    assert plugins[ShortCheck.get_full_name()].output_size == len('This plugin slept for 0 seconds')
+    assert plugins[ShortCheck.get_full_name()].max_rss > 0
+    assert plugins[ShortCheck.get_full_name()].user_cpu is not None
+    assert plugins[FailCheck.get_full_name()].outcome == 'crashed'
+    assert plugins[LongCheck.get_full_name()].outcome == 'timed_out'
+    assert plugins[LongCheck.get_full_name()].max_rss > 0
+    assert plugins[LongCheck.get_full_name()].as_dict()['elapsed'] >= 1
+
+
+class HostnameVariable(Variable):
+    def run(self, variables):
+        return 'example-host'
+
+
+def test_run_stats_count():
+    '''Confirm the Stats box counts the variable plugins it lists too'''
+    f = Fossor()
+    f.check_plugins = [ShortCheck, FailCheck]
+    f.variable_plugins = [HostnameVariable]
+    f.add_variable('timeout', 10)
+    result = f.run(report='DictObject')
+
+    assert result['Stats'].startswith('Ran 3 plugins.')
+    assert len(f.run_status.stats()) == 3
+
+
+def test_shared_plugin_name(tmpdir):
+    '''A variable and a check with the same name are kept apart in the run status, history and Stats box'''
+    from fossor.checks import other_users as check
+    from fossor.variables import other_users as variable
+    f = Fossor()
+    f.check_plugins = [check.OtherUsers]
+    f.variable_plugins = [variable.OtherUsers]
+    f.add_variable('timeout', 10)
+    result = f.run(report='DictObject', state_dir=str(tmpdir))
+
+    names = ['fossor.checks.other_users.OtherUsers', 'fossor.variables.other_users.OtherUsers']
+    assert sorted(status.name for status in f.run_status.stats()) == names
+    assert result['Stats'].startswith('Ran 2 plugins.')
+    assert sorted(f.history.plugins) == names
+
+
+class SpinCheck(Check):
+    resource_limits = {'max_cpu_time': 1}
+
+    def run(self, variables):
+        while True:
+            pass
+
+
+class AllocateCheck(Check):
+    resource_limits = {'max_address_space': 1024 ** 3}
+
+    def run(self, variables):
+        return str(len(bytearray(2 * 1024 ** 3)))
+
+
+def test_resource_limits():
+    '''Confirm plugins breaching their resource limits are reported as such'''
+    f = Fossor()
+    f.check_plugins = [SpinCheck, AllocateCheck, ShortCheck]
+    f.variable_plugins = set()
+    f.add_variable('timeout', 10)
+    f.add_variable('verbose', True)
+    result = f.run(report='DictObject')
+
+    assert 'max_cpu_time of 1 seconds' in result['SpinCheck']
+    assert 'Crash Report' in result['AllocateCheck']
+    assert 'This plugin slept' in result['ShortCheck']
+    plugins = f.run_status.plugins
+    assert plugins[SpinCheck.get_full_name()].outcome == 'limit_exceeded'
+    assert plugins[AllocateCheck.get_full_name()].outcome == 'limit_exceeded'
+    assert plugins[ShortCheck.get_full_name()].outcome == 'ok'
+
+
+def test_max_concurrency():
+    '''Confirm plugins still waiting to start at the timeout are reported as timed out'''
+    f = Fossor()
+    f.check_plugins = [LongCheck, ShortCheck]
+    f.variable_plugins = set()
+    f.add_variable('timeout', 1)
+    f.add_variable('verbose', True)
+    f.add_variable('max_concurrency', 1)
+    result = f.run(report='DictObject')
+
+    # Equal priority and cost, LongCheck starts first as it is listed first and runs longer on previous runs
+    assert 'Timed out' in result['LongCheck']
+    assert 'Timed out waiting to start' in result['ShortCheck']
+    plugins = f.run_status.plugins
+    assert plugins[ShortCheck.get_full_name()].outcome == 'timed_out'
+    assert plugins[ShortCheck.get_full_name()].pid is None
+
+
+class SlowCheck(Check):
+    def run(self, variables):
+        sleep(1.2)
+        return "Slept"
+
+
+def test_runtime_history(tmp_path):
+    '''Confirm plugin durations are recorded and a timeout is suggested when plugins usually need longer'''
+    for timeout, plugins in ((3, [SlowCheck, ShortCheck]), (3, [SlowCheck, ShortCheck]), (1, [LongCheck, ShortCheck]),
+                             (3, [SlowCheck, ShortCheck]), (1, [SlowCheck, LongCheck, ShortCheck])):
+        f = Fossor()
+        f.check_plugins = plugins
+        f.variable_plugins = set()
+        f.add_variable('timeout', timeout)
+        f.add_variable('state_dir', str(tmp_path))
+        result = f.run(report='DictObject')
+        if plugins[0] is LongCheck:
+            assert 'consider --time-out' not in result['Stats']  # A timed out plugin only sets a lower bound
+
+    estimates = f.history.estimates()
+    assert estimates[LongCheck.get_full_name()].count == 0
+    assert estimates[LongCheck.get_full_name()].timeouts == 2
+    assert estimates[LongCheck.get_full_name()].ewma >= 1
+    assert estimates[SlowCheck.get_full_name()].count == 3
+    assert estimates[SlowCheck.get_full_name()].timeouts == 1
+    assert estimates[ShortCheck.get_full_name()].ewma < 1
+    assert 'consider --time-out 2.' in result['Stats']
+
+
+class LightCheck(Check):
+    lightweight = True
+
+    def run(self, variables):
+        return f"Ran in {os.getpid()}"
+
+
+class AsyncCheck(Check):
+    async def run(self, variables):
+        await asyncio.sleep(0)
+        return f"Ran in {os.getpid()}"
+
+
+class StuckLightCheck(Check):
+    lightweight = True
+
+    def run(self, variables):
+        sleep(60)
+
+
+class CrashLightCheck(Check):
+    lightweight = True
+
+    def run(self, variables):
+        raise Exception("Testing lightweight plugin failure")
+
+
+def test_lightweight_plugins():
+    '''Confirm lightweight and async plugins share a worker process and time out on their own'''
+    f = Fossor()
+    f.check_plugins = [LightCheck, AsyncCheck, StuckLightCheck, CrashLightCheck, ShortCheck]
+    f.variable_plugins = set()
+    f.add_variable('timeout', 2)
+    f.add_variable('verbose', True)
+    start = time.time()
+    result = f.run(report='DictObject')
+
+    assert time.time() - start < 10
+    assert result['LightCheck'] == result['AsyncCheck']
+    assert result['LightCheck'] != f"Ran in {os.getpid()}"
+    assert 'Timed out' in result['StuckLightCheck']
+    assert 'Crash Report' in result['CrashLightCheck']
+    assert 'This plugin slept' in result['ShortCheck']
+    plugins = f.run_status.plugins
+    assert plugins[LightCheck.get_full_name()].pid == plugins[AsyncCheck.get_full_name()].pid != plugins[ShortCheck.get_full_name()].pid
+    assert plugins[LightCheck.get_full_name()].outcome == 'ok'
+    assert plugins[LightCheck.get_full_name()].state == 'finished'
+    assert plugins[StuckLightCheck.get_full_name()].outcome == 'timed_out'
+    assert plugins[StuckLightCheck.get_full_name()].state == 'timed_out'
+    assert plugins[CrashLightCheck.get_full_name()].outcome == 'crashed'
+
+
+def test_lightweight_plugin_own_process():
+    '''Confirm plugins selected for profiling keep their own process'''
+    f = Fossor()
+    f.variables['profile'] = 'AsyncCheck'
+    assert f.runs_lightweight(LightCheck)
+    assert not f.runs_lightweight(AsyncCheck)
+    assert not f.runs_lightweight(ShortCheck)
+    assert not f.runs_lightweight(SpinCheck)
+
+
+def test_iter_results():
+    '''Confirm results are yielded as plugins finish and closing early kills the plugins still running'''
+    f = Fossor()
+    f.check_plugins = [LongCheck, ShortCheck, FailCheck]
+    f.variable_plugins = set()
+    f.add_variable('timeout', 60)
+    start = time.time()
+    results = f.iter_results()
+    seen = {}
+    for result in results:
+        seen[result.name] = result
+        if 'ShortCheck' in seen and 'FailCheck' in seen:
+            break
+    results.close()
+
+    assert time.time() - start < 15
+    assert seen['ShortCheck'].status == 'ok'
+    assert seen['ShortCheck'].output.startswith('This plugin slept')
+    assert seen['ShortCheck'].duration is not None
+    assert seen['FailCheck'].status == 'crashed'
+    assert 'LongCheck' not in seen
+    status = f.run_status.plugins[LongCheck.get_full_name()]
+    assert status.outcome == 'cancelled'
+    assert not psutil.pid_exists(status.pid)
+
+
+def test_stream():
+    f = Fossor()
+    f.check_plugins = [ShortCheck, FailCheck]
+    f.variable_plugins = set()
+
+    async def collect():
+        return {result.name: result.status async for result in f.stream(timeout=10)}
+
+    assert run_coroutine(collect()) == {'ShortCheck': 'ok', 'FailCheck': 'crashed'}
+
+
+def test_stream_cancelled():
+    f = Fossor()
+    f.check_plugins = [LongCheck, ShortCheck]
+    f.variable_plugins = set()
+
+    async def first():
+        async for result in f.stream(timeout=60):
+            return result.name
+
+    start = time.time()
+    assert run_coroutine(first()) == 'ShortCheck'
+    assert time.time() - start < 15
+    assert f.run_status.plugins[LongCheck.get_full_name()].outcome == 'cancelled'
+
+
+class PartialCheck(Check):
+    def run(self, variables):
+        yield "Read the first file"
+        yield "Read the first file\nRead the second file"
+        sleep(60)
+        yield "Never reached"
+
+
+class PartialLightCheck(PartialCheck):
+    lightweight = True
+
+
+class FinishedPartialCheck(Check):
+    def run(self, variables):
+        yield "Working"
+        return "Done"
+
+
+def test_partial_results():
+    '''Confirm a plugin ended early keeps the last output it yielded, even without verbose'''
+    f = Fossor()
+    f.check_plugins = [PartialCheck, PartialLightCheck, FinishedPartialCheck]
+    f.variable_plugins = set()
+    f.add_variable('timeout', 2)
+    result = f.run(report='DictObject')
+
+    for Plugin in (PartialCheck, PartialLightCheck):
+        name = Plugin.get_name()
+        assert result[name].startswith("Read the first file\nRead the second file\nTimed out")
+        assert 'last partial result' in result[name]
+        assert f.run_status.plugins[Plugin.get_full_name()].outcome == 'timed_out'
+    assert result['FinishedPartialCheck'] == "Done"
+
+
+def test_iter_partial_results():
+    f = Fossor()
+    f.check_plugins = [PartialCheck, FinishedPartialCheck]
+    f.variable_plugins = set()
+    seen = [(result.name, result.status, result.output) for result in f.iter_results(partial_results=True, timeout=2)]
+
+    assert ('PartialCheck', 'partial', "Read the first file") in seen
+    assert seen.index(('FinishedPartialCheck', 'partial', "Working")) < seen.index(('FinishedPartialCheck', 'ok', "Done"))
+    assert [status for name, status, output in seen if name == 'PartialCheck'] == ['partial', 'partial', 'timed_out']
+    assert 'partial' not in [result.status for result in f.iter_results(timeout=2)]
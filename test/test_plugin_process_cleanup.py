@@ -1,9 +1,12 @@
 # Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
 # See LICENSE in the project root for license information.
 
+import os
 import sys
+import time
 import psutil
 import logging
+import multiprocessing as mp
 
 from time import sleep
 from unittest.mock import patch
@@ -26,6 +29,30 @@ class LongCheck(Check):
         return "This plugin slept for {0} seconds".format(time_to_sleep)
 
 
+class SleepCheck1(Check):
+    def run(self, variables):
+        sleep(30)
+
+
+class SleepCheck2(SleepCheck1):
+    pass
+
+
+class SleepCheck3(SleepCheck1):
+    pass
+
+
+def sleeping_group_leader():
+    os.setsid()
+    sleep(30)
+
+
+def slow_terminate_process_group(self, process, reason=None):
+    sleep(3)
+    process.terminate()
+    process.join()
+
+
 def test_shell_call_properly_kills():
     f = Fossor()
     f.check_plugins = set()
@@ -81,3 +108,32 @@ def test_shell_call_is_needed_to_kill():
         except process_exceptions:
             continue
     assert len(sleeping_pids) == 0
+
+
+def test_timed_out_plugins_terminate_in_parallel():
+    f = Fossor()
+    f.check_plugins = [SleepCheck1, SleepCheck2, SleepCheck3]
+    f.variable_plugins = set()
+    f.add_variable('timeout', 1)
+    f.add_variable('verbose', 'True')
+    start = time.time()
+    with patch('fossor.engine.Fossor._terminate_process_group', slow_terminate_process_group):
+        result = f.run(report='DictObject')
+    log.debug(f"result is: {result}")
+
+    assert all('Timed out' in result[name] for name in ('SleepCheck1', 'SleepCheck2', 'SleepCheck3'))
+    # Terminating one after another would take at least 9 seconds
+    assert time.time() - start < 8
+
+
+def test_terminate_process_group_reason(caplog):
+    '''The signals issued are logged with why the plugin is terminated, e.g. a cancelled run'''
+    caplog.set_level(logging.WARNING)
+    process = mp.Process(target=sleeping_group_leader, name='SleepingGroupLeader')
+    process.start()
+    while os.getpgid(process.pid) != process.pid:
+        sleep(.1)
+    Fossor()._terminate_process_group(process, 'the run was cancelled')
+    assert 'because the run was cancelled' in caplog.text
+    assert 'run for too long' not in caplog.text
+    assert not process.is_alive()
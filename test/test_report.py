@@ -3,9 +3,11 @@
 
 import sys
 import logging
+import pytest
 from multiprocessing import Queue
 
 from fossor.reports.report import Report
+from fossor.utils.run_status import RunStatus, QUEUED, STARTED, FINISHED, RUNNER_FINISHED
 
 
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
@@ -85,3 +87,88 @@ def test_truncation():
             for line in truncated_line_split:
                 assert len(line) <= width
             assert len(truncated_line_split) <= height
+
+
+def test_create_box_middle_matches_prettytable():
+    prettytable = pytest.importorskip('prettytable')
+
+    def _prettytable_box_middle(text, width, align='l'):
+        t = prettytable.PrettyTable()
+        t.hrules = prettytable.NONE
+        t.header = False
+        t.field_names = ['foo']
+        t.align = align
+        t.min_width = width
+        t.max_width = width
+        t.min_table_width = width
+        t.max_table_width = width
+        t.add_row([text])
+        return t.get_string()
+
+    texts = ['', 'foo', 'foo\nbar', 'line\n', '\n\n', 'a\n\nb', 'foo ' * 100, 'x' * 333, '\ttabbed\tline', '  leading', 'trailing  ',
+             '中文' * 40, 'café naı̈ve', '\033[31mred\033[0m text', 'carriage\rreturn', 'Report',
+             'Plugin: SimilarLogErrors', 'odd', 'even', 'Disk utilization is at critical state (> 98). partition=/dev/sda1 at utilization=99%']
+    r = Report()
+    for width in list(range(5, 41)) + [80, 150, 151]:
+        for text in texts:
+            for align in ('l', 'c', 'r'):
+                assert r._create_box_middle(text=text, width=width, align=align) == _prettytable_box_middle(text, width, align)
+
+
+def test_truncation_messages():
+    r = Report()
+    text = '\n'.join(['x' * 30] * 10)
+    assert r._truncate(text=text) == text
+    assert r._truncate(text='foo\n', max_height=5) == 'foo'
+    assert r._truncate(text='foo\n', max_width=5) == 'foo\n'
+    assert r._truncate(text=text, max_width=10, max_height=2) == (
+        'xxxxxxxxxx\nxxxxxxxxxx\nTruncated \n'
+        'Truncated 3 lines to a width of 10. Run with --no-truncate to stop truncation.')
+
+
+def test_format_stats():
+    run_status = RunStatus()
+    run_status.runner_started()
+    for name, wall, rss in (('Fast', 1, 10), ('Slow', 5, 5)):
+        run_status.publish(name, QUEUED, timestamp=100)
+        run_status.publish(name, STARTED, pid=1, timestamp=100.5)
+        run_status.publish(name, FINISHED, pid=1, timestamp=100.5 + wall,
+                           details={'outcome': 'ok', 'user_cpu': 0.25, 'system_cpu': 0.125, 'max_rss': rss * 1024 * 1024, 'output_size': 12})
+    run_status.publish(None, RUNNER_FINISHED)
+
+    input_queue = Queue()
+    input_queue.put(('Stats', 'Ran 2 plugins.'))
+    input_queue.put(('EOF', 'EOF'))
+    result = Report().create_report_text(input_queue, timeout=30, width=120, run_status=run_status, stats_sort='rss')
+    log.debug("result is:\n{0}".format(result))
+    lines = [line.strip('| ') for line in result.splitlines()]
+    assert lines[lines.index('Ran 2 plugins.') + 1].startswith('Sorted by rss')
+    table = lines[lines.index('Ran 2 plugins.') + 2:-1]
+    assert table[0].split('  ')[0] == 'Plugin'
+    assert table[1].split() == ['Fast', 'ok', '0.50', '1.00', '0.25', '0.12', '10.0', '12']
+    assert table[2].split()[:4] == ['Slow', 'ok', '0.50', '5.00']
+
+    # Plugin output is cut at max_lines_per_plugin, the Stats box is not
+    input_queue = Queue()
+    input_queue.put(('Stats', 'Ran 2 plugins.'))
+    input_queue.put(('EOF', 'EOF'))
+    result = Report().create_report_text(input_queue, timeout=30, width=120, max_lines_per_plugin=2, run_status=run_status)
+    assert 'Truncated' not in result
+    assert 'Slow' in result and 'Fast' in result
+
+    assert [status.name for status in run_status.stats('wall')] == ['Slow', 'Fast']
+    with pytest.raises(ValueError):
+        run_status.stats('bogus')
+
+
+def test_format_stats_shared_name():
+    '''Plugins that share a name are listed under their full names'''
+    run_status = RunStatus()
+    run_status.runner_started()
+    for name in ('checks.Users', 'variables.Users', 'checks.Uptime'):
+        run_status.publish(name, STARTED, pid=1, timestamp=100)
+        run_status.publish(name, FINISHED, pid=1, timestamp=101, details={'outcome': 'ok'})
+    run_status.publish(None, RUNNER_FINISHED)
+    run_status.join()
+    table = Report()._format_stats(run_status, sort='name').splitlines()[2:]
+    assert [row.split()[0] for row in table] == ['Uptime', 'checks.Users', 'variables.Users']
@@ -0,0 +1,70 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+import sys
+import json
+import time
+import pickle
+import logging
+
+from fossor.checks.check import Check
+from fossor.engine import Fossor
+from fossor.plugin import PluginResult
+
+
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+log = logging.getLogger(__name__)
+
+
+class OutputCheck(Check):
+    def run(self, variables):
+        return 'foo'
+
+
+class QuietCheck(Check):
+    def run(self, variables):
+        return
+
+
+class CrashCheck(Check):
+    def run(self, variables):
+        raise Exception("Testing plugin failure")
+
+
+class SleepCheck(Check):
+    def run(self, variables):
+        time.sleep(60)
+
+
+def test_plugin_result():
+    result = PluginResult('OutputCheck', 'foo', duration=1.5, status=PluginResult.OK)
+    name, output = result
+    assert (name, output) == ('OutputCheck', 'foo')
+    copy = pickle.loads(pickle.dumps(result))
+    assert copy == ('OutputCheck', 'foo')
+    assert copy.duration == 1.5
+    assert copy.status == 'ok'
+
+
+def test_ndjson_report(capsys, tmp_path):
+    f = Fossor()
+    f.check_plugins = [OutputCheck, QuietCheck, CrashCheck, SleepCheck]
+    f.variable_plugins = set()
+    f.add_variable('timeout', 1)
+    f.add_variable('state_dir', str(tmp_path))  # No runtime history, which could add a timeout suggestion to the Stats
+
+    result = f.run(report='NDJson')
+    log.debug(f"result: {result}")
+
+    assert capsys.readouterr().out.strip() == result
+    records = {record['name']: record for record in map(json.loads, result.splitlines())}
+    assert records['OutputCheck']['status'] == 'ok'
+    assert records['OutputCheck']['output'] == 'foo'
+    assert records['OutputCheck']['duration'] < 1
+    assert records['QuietCheck']['status'] == 'no_output'
+    assert records['QuietCheck']['output'] is None
+    assert records['CrashCheck']['status'] == 'crashed'
+    assert records['CrashCheck']['output'] is None
+    assert records['SleepCheck']['status'] == 'timed_out'
+    assert records['SleepCheck']['duration'] >= 1
+    assert records['Stats']['output'] == 'Ran 4 plugins.'
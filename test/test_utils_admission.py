@@ -0,0 +1,92 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+import os
+import tempfile
+
+from fossor.checks.check import Check
+from fossor.utils import admission, history
+
+
+class UrgentCheck(Check):
+    priority = 10
+    cost = 5
+
+    def run(self, variables):
+        pass
+
+
+class CheapCheck(Check):
+    cost = .1
+
+    def run(self, variables):
+        pass
+
+
+class ShortCheck(Check):
+    def run(self, variables):
+        pass
+
+
+class LongCheck(Check):
+    def run(self, variables):
+        pass
+
+
+class ExpensiveCheck(Check):
+    cost = 20
+
+    def run(self, variables):
+        pass
+
+
+def test_read_signals():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for resource in admission.pressure.RESOURCES:
+            with open(os.path.join(tmpdir, resource), 'w') as f:
+                f.write('some avg10=12.50 avg60=5.00 avg300=1.00 total=123\nfull avg10=3.00 avg60=1.00 avg300=0.00 total=45\n')
+        signals = admission.read_signals(pressure_path=tmpdir)
+    assert signals['cpu_some'] == 12.5
+    assert signals['memory_full'] == 3.0
+    assert signals['io_full'] == 3.0
+    assert 0 <= signals['memory_used'] <= 1
+    assert set(signals) <= set(admission.THRESHOLDS)
+
+
+def test_get_pressure():
+    assert admission.get_pressure({}) == 0
+    assert admission.get_pressure({'load': .5, 'cpu_some': 10, 'memory_used': .5}) == 0
+    assert admission.get_pressure({'load': 2.5, 'cpu_some': 10}) == .5
+    assert admission.get_pressure({'memory_full': 50}) == 1
+
+
+def test_get_concurrency():
+    assert admission.get_concurrency(0, cpu_count=8) is None
+    assert admission.get_concurrency(0, cpu_count=8, max_concurrency=4) == 4
+    assert admission.get_concurrency(.5, cpu_count=8) == 8
+    assert admission.get_concurrency(.5, cpu_count=8, max_concurrency=4) == 4
+    assert admission.get_concurrency(1, cpu_count=8) == admission.MIN_CONCURRENCY
+
+
+def test_admission_order():
+    assert admission.admission_order([ExpensiveCheck, CheapCheck, UrgentCheck]) == [UrgentCheck, CheapCheck, ExpensiveCheck]
+
+
+def test_admission_controller():
+    signals = {'load': 10}
+    controller = admission.AdmissionController(read_signals=lambda: dict(signals), interval=0)
+    assert controller.concurrency == admission.MIN_CONCURRENCY
+    assert controller.may_start(1)
+    assert not controller.may_start(2)
+    # The host recovered
+    signals['load'] = 0
+    assert controller.may_start(2)
+    assert controller.concurrency is None
+
+
+def test_admission_order_predictions():
+    '''Plugins that usually run longest start first among plugins of equal priority and cost'''
+    predictions = {ShortCheck.get_full_name(): history.Estimate(ewma=1, p95=1, count=1),
+                   LongCheck.get_full_name(): history.Estimate(ewma=100, p95=120, count=1)}
+    assert admission.admission_order([ShortCheck, LongCheck], predictions) == [LongCheck, ShortCheck]
+    assert admission.admission_order([ShortCheck, LongCheck, UrgentCheck], predictions) == [UrgentCheck, LongCheck, ShortCheck]
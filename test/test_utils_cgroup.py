@@ -0,0 +1,50 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+import os
+import tempfile
+
+from fossor.utils import cgroup
+
+example_mountinfo = '''\
+25 30 0:23 / /sys rw,nosuid,nodev,noexec,relatime shared:7 - sysfs sysfs rw
+31 25 0:26 / {tmpdir}/unified rw,nosuid,nodev,noexec,relatime shared:4 - cgroup2 cgroup2 rw
+35 25 0:31 /docker/abc {tmpdir}/cpu,cpuacct rw,nosuid,nodev,noexec,relatime shared:9 - cgroup cgroup rw,cpu,cpuacct
+'''
+
+example_cgroup = '''\
+4:cpu,cpuacct:/docker/abc/app
+1:name=systemd:/system.slice/app.service
+0::/system.slice/app.service
+'''
+
+
+def test_get_cgroup_dir():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        mountinfo_path = os.path.join(tmpdir, 'mountinfo')
+        with open(mountinfo_path, 'w') as f:
+            f.write(example_mountinfo.format(tmpdir=tmpdir))
+        os.makedirs(os.path.join(tmpdir, 'proc', '1234'))
+        with open(os.path.join(tmpdir, 'proc', '1234', 'cgroup'), 'w') as f:
+            f.write(example_cgroup)
+        unified = os.path.join(tmpdir, 'unified', 'system.slice', 'app.service')
+        cpu = os.path.join(tmpdir, 'cpu,cpuacct', 'app')
+        os.makedirs(unified)
+        os.makedirs(cpu)
+
+        kwargs = {'proc_path': os.path.join(tmpdir, 'proc'), 'mountinfo_path': mountinfo_path}
+        assert cgroup.get_cgroup_dir(1234, **kwargs) == unified
+        # The hierarchy is mounted from /docker/abc, like inside a container
+        assert cgroup.get_cgroup_dir(1234, controller='cpu', **kwargs) == cpu
+        assert cgroup.get_cgroup_dir(1234, controller='memory', **kwargs) is None
+        assert cgroup.get_cgroup_dir(4321, **kwargs) is None
+
+        with open(os.path.join(unified, 'memory.max'), 'w') as f:
+            f.write('max\n')
+        with open(os.path.join(unified, 'memory.current'), 'w') as f:
+            f.write('4096\n')
+        with open(os.path.join(unified, 'memory.events'), 'w') as f:
+            f.write('low 0\nhigh 2\nmax 0\noom 0\noom_kill 0\n')
+        assert cgroup.read_value(unified, 'memory.max') is None
+        assert cgroup.read_value(unified, 'memory.current') == 4096
+        assert cgroup.read_keyed(unified, 'memory.events')['high'] == 2
@@ -5,10 +5,11 @@ import os
 import sys
 import logging
 import time
+import tempfile
 
 from datetime import datetime
 from io import StringIO
-from fossor.utils.filetools import FileTools
+from fossor.utils.filetools import FileTools, find_rotated_logs
 from unittest.mock import patch
 
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
@@ -315,3 +316,38 @@ def test_get_logs_in_time_range():
         lines = [line for line in log_generator]
         assert 'message #13\n' in lines[0]
         assert 'message #23\n' in lines[-1]
+
+
+def _touch(path, mtime, content=''):
+    with open(path, 'w') as f:
+        f.write(content)
+    os.utime(path, (mtime, mtime))
+
+
+def test_find_rotated_logs():
+    now = time.time()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        rotated = ['app.log.2.gz', 'app.log-20170901', 'app.log.1', 'app.2017-09-02.log', 'app.2017-09-03.log.gz']
+        for age, name in enumerate(rotated):
+            _touch(os.path.join(tmpdir, name), now - 1000 + age * 100)
+        _touch(os.path.join(tmpdir, 'app.log'), now, content='current\n')
+        for name in ['app.log.bak', 'other.log.1', 'app.logger', 'app.json.1']:
+            _touch(os.path.join(tmpdir, name), now)
+
+        log_files = find_rotated_logs(os.path.join(tmpdir, 'app.log'))
+        assert [os.path.basename(log_file.path) for log_file in log_files] == rotated + ['app.log']
+        assert log_files[-1].size == len('current\n')
+        assert log_files[-1].mtime == now
+
+        assert find_rotated_logs(os.path.join(tmpdir, 'missing', 'app.log')) == []
+
+
+def test_get_logs_skips_files_by_mtime():
+    ft = FileTools()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'old.log')
+        _touch(path, time.time() - 3600, content=f"{datetime.now().strftime(ft.date_format)} INFO message\n")
+        with patch('fossor.utils.filetools.FileTools._open_log_file') as mo:
+            assert list(ft.get_logs_in_time_range(file_paths=[path], start_time=time.time() - 60)) == []
+            mo.assert_not_called()
+        assert len(list(ft.get_logs_in_time_range(file_paths=[path], start_time=time.time() - 7200))) == 1
@@ -0,0 +1,110 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+import time
+import tempfile
+
+from unittest.mock import patch
+
+from fossor.utils import history, run_status
+from fossor.utils.misc import StatusPrinter
+
+
+def test_record():
+    h = history.RuntimeHistory(host='host1')
+    h.record('Check', 10)
+    h.record('Check', 20)
+    estimate = h.estimates()['Check']
+    assert estimate.ewma == 13
+    assert estimate.p95 == 20
+    assert estimate.count == 2
+
+    for duration in range(100):
+        h.record('Check', duration)
+    assert len(h.plugins['Check']['samples']) == history.MAX_SAMPLES
+    assert h.estimates()['Check'].p95 == 98
+
+
+def test_load_and_save():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        variables = {'state_dir': tmpdir}
+        h = history.RuntimeHistory.load(variables, host='host1')
+        assert h.estimates() == {}
+        h.record('Check', 5)
+        h.save()
+
+        assert history.RuntimeHistory.load(variables, host='host1').estimates()['Check'].ewma == 5
+        assert history.RuntimeHistory.load(variables, host='host2').estimates() == {}
+
+        with open(h.path, 'w') as f:
+            f.write('{not json')
+        assert history.RuntimeHistory.load(variables, host='host1').estimates() == {}
+
+
+def test_record_run():
+    status = run_status.RunStatus()
+    status.runner_started()
+    now = time.time()
+    for name in ('Fast', 'Slow', 'Crash', 'Waiting'):
+        status.publish(name, run_status.QUEUED, timestamp=now - 10)
+    for pid, name in enumerate(('Fast', 'Slow', 'Crash')):
+        status.publish(name, run_status.STARTED, pid=pid + 100, timestamp=now - 10)
+    status.publish('Fast', run_status.FINISHED, timestamp=now - 8, details={'outcome': 'ok'})
+    status.publish('Slow', run_status.TIMED_OUT, timestamp=now, details={'outcome': 'timed_out'})
+    status.publish('Crash', run_status.FINISHED, timestamp=now - 9, details={'outcome': 'crashed'})
+    status.publish('Waiting', run_status.TIMED_OUT, timestamp=now, details={'outcome': 'timed_out'})
+    status.publish(None, run_status.RUNNER_FINISHED)
+    status.join()
+
+    h = history.RuntimeHistory(host='host1')
+    h.record_run(status)
+    estimates = h.estimates()
+    assert sorted(estimates) == ['Fast', 'Slow']
+    assert round(estimates['Fast'].ewma) == 2
+    assert round(estimates['Slow'].ewma) == 10
+    assert estimates['Slow'].count == 0
+    assert estimates['Slow'].timeouts == 1
+    assert estimates['Slow'].p95 is None
+
+
+def test_predictions():
+    status = run_status.RunStatus()
+    status.runner_started()
+    now = time.time()
+    status.predictions = {'Slow': history.Estimate(ewma=30, p95=40, count=5), 'Done': history.Estimate(ewma=60, p95=60, count=5)}
+    status.publish('Slow', run_status.QUEUED, timestamp=now - 10)
+    status.publish('Done', run_status.QUEUED, timestamp=now - 10)
+    status.publish('Slow', run_status.STARTED, pid=100, timestamp=now - 10)
+    status.publish('Done', run_status.STARTED, pid=101, timestamp=now - 10)
+    status.publish('Done', run_status.FINISHED, pid=101, timestamp=now - 5)
+    status.publish(None, run_status.RUNNER_FINISHED)
+    status.join()
+
+    assert round(status.predict_remaining(now)) == 20
+    with patch('time.time', return_value=now):
+        assert StatusPrinter(timeout=60, run_status=status).get_prediction() == ' Predicted completion in 20s.'
+    assert StatusPrinter(timeout=60, run_status=run_status.RunStatus()).get_prediction() == ''
+
+
+def test_suggest_timeout():
+    estimates = {'Fast': history.Estimate(ewma=1, p95=2, count=3), 'Slow': history.Estimate(ewma=30, p95=50, count=3)}
+    assert history.suggest_timeout(estimates, 60) == 75
+    assert history.suggest_timeout(estimates, 600) is None
+    assert history.suggest_timeout({}, 1) is None
+
+
+def test_suggest_timeout_ignores_timeouts():
+    '''A plugin that keeps timing out does not keep raising the suggested timeout'''
+    h = history.RuntimeHistory(host='host1')
+    for run in range(5):
+        h.record('Hung', 60, timed_out=True)
+    h.record('Check', 100)
+    h.record('Check', 100)
+    estimates = h.estimates()
+    assert estimates['Hung'] == history.Estimate(ewma=60, p95=None, count=0, timeouts=5)
+    assert history.suggest_timeout(estimates, 60) is None  # Check has too few completed runs
+
+    h.record('Check', 100)
+    assert history.suggest_timeout(h.estimates(), 60) == 150
+    h.record('Check', 50, timed_out=True)
+    assert h.estimates()['Check'].ewma == 100  # Only raised by a timeout, never lowered
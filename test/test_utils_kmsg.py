@@ -0,0 +1,71 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+import sys
+import logging
+
+from unittest.mock import patch
+from fossor.utils import kmsg
+
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+log = logging.getLogger(__name__)
+
+
+def test_parse_record():
+    record = kmsg.parse_record(b'6,339,5140900,-;virtio_blk virtio2: [vdb] new size\n SUBSYSTEM=virtio\n DEVICE=+virtio:virtio2\n')
+    assert record.level == 6
+    assert record.facility == 0
+    assert record.sequence == 339
+    assert record.timestamp_usec == 5140900
+    assert record.uptime == 5.1409
+    assert record.message == 'virtio_blk virtio2: [vdb] new size'
+
+    record = kmsg.parse_record(b'12,340,5140901,-;user space message\n')
+    assert record.level == 4
+    assert record.facility == 1
+
+
+def test_parse_dmesg_output():
+    lines = ['[    0.000000] Linux version 4.14',
+             '[2052025.266882] usb 2-1.3.4: USB disconnect, device number 39',
+             'not a dmesg line']
+    records = kmsg.parse_dmesg_output(lines)
+    assert len(records) == 2
+    assert records[0].timestamp_usec == 0
+    assert records[1].timestamp_usec == 2052025266882
+    assert records[1].message == 'usb 2-1.3.4: USB disconnect, device number 39'
+
+
+def test_records_in_time_range():
+    kl = kmsg.KernelLog()
+    kl._records = [kmsg.KernelLogRecord(level=6, facility=0, sequence=i, timestamp_usec=i * 1000000, message=f'message #{i}') for i in range(100)]
+    boot_time = 1509664739.0
+    with patch('fossor.utils.kmsg.get_boot_time', return_value=boot_time):
+        records = list(kl.records())
+        assert len(records) == 100
+
+        records = list(kl.records(start_time=boot_time + 20, end_time=boot_time + 30))
+        assert records[0][0] == boot_time + 20
+        assert records[0][1].message == 'message #20'
+        assert records[-1][1].message == 'message #30'
+        assert len(records) == 11
+
+        assert list(kl.records(start_time=boot_time + 200)) == []
+        assert list(kl.records(end_time=boot_time - 1)) == []
+
+
+def test_read_records_is_shared():
+    kl = kmsg.get_kernel_log()
+    kl._records = ['cached']
+    assert kmsg.get_kernel_log().read_records() == ['cached']
+    kl._records = None
+
+
+def test_read_records_refresh(tmp_path):
+    path = tmp_path / 'kmsg'
+    path.write_bytes(b'6,1,1000000,-;first message\n')
+    kl = kmsg.KernelLog(path=str(path))
+    assert [record.message for record in kl.read_records()] == ['first message']
+    path.write_bytes(b'6,2,2000000,-;second message\n')
+    assert [record.message for record in kl.read_records()] == ['first message']
+    assert [record.message for record in kl.read_records(refresh=True)] == ['second message']
@@ -0,0 +1,87 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+import os
+import signal
+import resource
+import tempfile
+import multiprocessing as mp
+
+import pytest
+
+from fossor.checks.check import Check
+from fossor.utils import limits
+
+
+class LimitedCheck(Check):
+    resource_limits = {'nice': 19, 'max_cpu_time': 30}
+
+    def run(self, variables):
+        pass
+
+
+class UnknownLimitCheck(Check):
+    resource_limits = {'max_threads': 4}
+
+    def run(self, variables):
+        pass
+
+
+def test_get_limits():
+    assert limits.get_limits(Check) == limits.DEFAULT_LIMITS
+    plugin_limits = limits.get_limits(LimitedCheck)
+    assert plugin_limits['nice'] == 19
+    assert plugin_limits['max_cpu_time'] == 30
+    assert plugin_limits['max_address_space'] is None  # Opt in, it breaks programs reserving large address ranges
+    with pytest.raises(ValueError):
+        limits.get_limits(UnknownLimitCheck)
+
+
+def _apply_and_report(plugin_limits, queue):
+    applied = limits.apply_limits(plugin_limits)
+    queue.put((applied, os.getpriority(os.PRIO_PROCESS, 0), resource.getrlimit(resource.RLIMIT_AS)[0], resource.getrlimit(resource.RLIMIT_CPU)[0]))
+
+
+def test_apply_limits():
+    '''Limits are applied in a child process, so they do not affect the tests'''
+    plugin_limits = dict(limits.DEFAULT_LIMITS, nice=os.getpriority(os.PRIO_PROCESS, 0) + 1, max_address_space=8 * 1024 ** 3, max_cpu_time=60)
+    queue = mp.Queue()
+    process = mp.Process(target=_apply_and_report, args=(plugin_limits, queue))
+    process.start()
+    applied, nice, address_space, cpu_time = queue.get(timeout=10)
+    process.join()
+    assert nice == plugin_limits['nice']
+    assert 'max_cpu_time 60' in applied
+    assert cpu_time == 60
+    assert address_space <= 8 * 1024 ** 3
+
+
+def test_cgroup_leaf():
+    with tempfile.TemporaryDirectory() as parent:
+        # Controllers not enabled for children
+        with open(os.path.join(parent, 'cgroup.subtree_control'), 'w') as f:
+            f.write('cpu\n')
+        assert limits.create_cgroup_leaf(1234, memory_max=1024, parent=parent) is None
+
+        with open(os.path.join(parent, 'cgroup.subtree_control'), 'w') as f:
+            f.write('cpu memory pids\n')
+        leaf = limits.create_cgroup_leaf(1234, memory_max=1024, cpu_max=0.5, parent=parent)
+        assert leaf == os.path.join(parent, 'fossor-1234')
+        with open(os.path.join(leaf, 'memory.max')) as f:
+            assert f.read() == '1024'
+        with open(os.path.join(leaf, 'cpu.max')) as f:
+            assert f.read() == '50000 100000'
+        with open(os.path.join(leaf, 'cgroup.procs')) as f:
+            assert f.read() == '1234'
+
+        assert limits.get_cgroup_breaches(leaf) == []
+        with open(os.path.join(leaf, 'memory.events'), 'w') as f:
+            f.write('low 0\nhigh 0\nmax 3\noom 1\noom_kill 1\n')
+        assert limits.get_cgroup_breaches(leaf) == ['killed for exceeding its cgroup memory.max of 1024 bytes']
+
+
+def test_describe_exit():
+    assert limits.describe_exit({'max_cpu_time': 5}, -signal.SIGXCPU) == 'killed for exceeding its max_cpu_time of 5 seconds'
+    assert limits.describe_exit({'max_cpu_time': None}, -signal.SIGXCPU) is None
+    assert limits.describe_exit({'max_cpu_time': 5}, -signal.SIGKILL) is None
+    assert limits.describe_exit({'max_cpu_time': 5}, 0) is None
@@ -2,6 +2,7 @@
 # See LICENSE in the project root for license information.
 
 import sys
+import asyncio
 import time
 import logging
 import pytest
@@ -13,6 +14,7 @@ from unittest.mock import patch
 from fossor.checks import dmesg
 from fossor.utils.misc import iswithintimerange
 from fossor.utils.misc import common_path
+from fossor.utils.misc import run_coroutine
 from fossor.utils.misc import comparetimerange
 
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
@@ -74,8 +76,8 @@ class TestTimeWithinRange(unittest.TestCase):
 
 def test_get_variables():
     '''Confirm we get the correct variables back if an exception occurs.'''
-    with patch('fossor.plugin.Plugin.shell_call') as patched_shell_call:
-        patched_shell_call.side_effect = Exception('foobar')
+    with patch('fossor.plugin.Plugin.shell_stream') as patched_shell_stream, patch('fossor.plugin.Plugin.snapshot', side_effect=PermissionError):
+        patched_shell_stream.side_effect = Exception('foobar')
         with patch('fossor.utils.misc.common_path', return_value='/usr/bin/dmesg'):
             reload(dmesg)
             d = dmesg.Dmesg()
@@ -96,3 +98,21 @@ def test_common_path_is_not_found():
     with patch('os.path.isfile', return_value=False):
         with pytest.raises(FileNotFoundError):
             common_path(['amiga/1200/GuruMeditationError'])
+
+
+def test_run_coroutine():
+    async def subprocess_output():
+        process = await asyncio.create_subprocess_exec('echo', 'foo', stdout=asyncio.subprocess.PIPE)
+        out, err = await process.communicate()
+        return out
+
+    assert run_coroutine(subprocess_output()) == b'foo\n'
+    assert run_coroutine(subprocess_output()) == b'foo\n'  # Every call gets a loop of its own
+
+
+def test_run_coroutine_cancels_tasks():
+    async def start_task():
+        return asyncio.ensure_future(asyncio.sleep(30))
+
+    task = run_coroutine(start_task())
+    assert task.cancelled()
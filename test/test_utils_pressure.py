@@ -0,0 +1,19 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+import os
+import tempfile
+
+from fossor.utils import pressure
+
+
+def test_read_pressure():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'memory')
+        with open(path, 'w') as f:
+            f.write('some avg10=1.50 avg60=0.25 avg300=0.00 total=123456\nfull avg10=0.00 avg60=0.00 avg300=0.00 total=42\n')
+        p = pressure.read_pressure('memory', path=path)
+        assert p == {'some': {'avg10': 1.5, 'avg60': 0.25, 'avg300': 0.0, 'total': 123456},
+                     'full': {'avg10': 0.0, 'avg60': 0.0, 'avg300': 0.0, 'total': 42}}
+        assert pressure.format_pressure(p) == 'some avg10=1.50 avg60=0.25 avg300=0.00, full avg10=0.00 avg60=0.00 avg300=0.00'
+        assert pressure.read_pressure('memory', path=os.path.join(tmpdir, 'missing')) is None
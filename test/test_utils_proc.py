@@ -0,0 +1,158 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+import os
+import sys
+import time
+import logging
+import tempfile
+import subprocess
+import psutil
+import pytest
+
+from fossor.utils import proc
+
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+log = logging.getLogger(__name__)
+
+example_status = '''Name:\tjava
+Umask:\t0022
+State:\tS (sleeping)
+Tgid:\t4242
+Pid:\t4242
+PPid:\t1
+Uid:\t1000\t1001\t1001\t1001
+Gid:\t1000\t1000\t1000\t1000
+''' + 'VmPeak:\t 1234 kB\n' * 100 + '''Threads:\t215
+SigQ:\t0/63448
+'''
+
+
+def _create_proc(tmpdir):
+    os.makedirs(os.path.join(tmpdir, '4242'))
+    os.makedirs(os.path.join(tmpdir, 'sys'))
+    with open(os.path.join(tmpdir, '4242', 'status'), 'w') as f:
+        f.write(example_status)
+
+
+def test_read_status():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        _create_proc(tmpdir)
+        status = proc.read_status(4242, proc_path=tmpdir)
+        assert status == proc.ProcessStatus(pid=4242, name='java', uid=1001, threads=215)
+        assert proc.read_status(1, proc_path=tmpdir) is None  # Process exited
+
+
+def test_iter_processes():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        _create_proc(tmpdir)
+        assert list(proc.iter_pids(proc_path=tmpdir)) == [4242]
+        assert [p.pid for p in proc.iter_processes(proc_path=tmpdir)] == [4242]
+
+
+def test_iter_processes_live():
+    processes = {p.pid: p for p in proc.iter_processes()}
+    me = processes[os.getpid()]
+    assert me.uid == os.geteuid()
+    assert me.threads >= 1
+
+
+def test_get_username():
+    assert proc.get_username(os.geteuid())
+    assert proc.get_username(987654) == '987654'
+
+
+def test_read_stat():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with open(os.path.join(tmpdir, 'stat'), 'w') as f:
+            f.write('cpu  13753 0 3462 95923 148 0 2 227 0 0\n'
+                    'cpu0 13753 0 3462 95923 148 0 2 227 0 0\n'
+                    'ctxt 402836\n'
+                    'procs_running 3\n'
+                    'procs_blocked 1\n')
+        stat = proc.read_stat(proc_path=tmpdir)
+    assert stat['cpu']['user'] == 13753
+    assert stat['cpu']['iowait'] == 148
+    assert stat['cpu']['steal'] == 227
+    assert stat['procs_running'] == 3
+    assert stat['procs_blocked'] == 1
+
+
+def _create_process(tmpdir, pid, comm, cmdline, ppid, start_time, rss):
+    os.makedirs(os.path.join(tmpdir, str(pid)))
+    with open(os.path.join(tmpdir, str(pid), 'comm'), 'w') as f:
+        f.write(comm[:15] + '\n')
+    with open(os.path.join(tmpdir, str(pid), 'cmdline'), 'w') as f:
+        f.write('\0'.join(cmdline) + '\0')
+    with open(os.path.join(tmpdir, str(pid), 'stat'), 'w') as f:
+        f.write(f'{pid} ({comm[:15]}) S {ppid} {pid} {pid} 0 -1 4194304 80 0 0 0 0 0 0 0 20 0 1 0 {start_time} 2703360 {rss} 0 0\n')
+
+
+def test_find_pids():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        _create_process(tmpdir, 100, 'java', ['java', '-jar', 'frontend.jar'], ppid=1, start_time=500, rss=1000)
+        _create_process(tmpdir, 200, 'java', ['java', '-jar', 'backend.jar'], ppid=1, start_time=300, rss=9000)
+        _create_process(tmpdir, 300, 'python3', ['python3', 'backend.py'], ppid=1, start_time=100, rss=10)
+        _create_process(tmpdir, 400, 'my (odd) name', ['odd'], ppid=1, start_time=100, rss=10)
+        comms = dict(proc.iter_comms(proc_path=tmpdir))
+        assert comms[400] == 'my (odd) name'
+        assert proc.read_process_stat(400, proc_path=tmpdir).ppid == 1
+        assert proc.read_cmdline(100, proc_path=tmpdir) == 'java -jar frontend.jar'
+
+        assert proc.find_pids(comms, proc_path=tmpdir) == []
+        assert proc.find_pids(comms, name='Java', proc_path=tmpdir) == [200, 100]
+        assert proc.find_pids(comms, name='java', sort='rss', proc_path=tmpdir) == [200, 100]
+        assert proc.find_pids(comms, name='javaserver', sort='start_time', proc_path=tmpdir) == [200, 100]
+        assert proc.find_pids(comms, pattern=r'backend\.', proc_path=tmpdir) == [300, 200]
+        assert proc.find_pids(comms, name='java', pattern='frontend', proc_path=tmpdir) == [100]
+        assert proc.find_pids(comms, name='ruby', proc_path=tmpdir) == []
+        with pytest.raises(ValueError):
+            proc.find_pids(comms, name='java', sort='name', proc_path=tmpdir)
+
+
+def test_find_pids_excludes_own_processes():
+    comms = dict(proc.iter_comms())
+    assert os.getpid() not in proc.find_pids(comms, pattern='.')
+    assert os.getpid() in proc.get_ancestors()
+
+
+def test_find_pids_without_proc():
+    '''Without /proc command lines and stats come from psutil'''
+    shell = subprocess.Popen(['sh', '-c', 'sleep 31.4159 & wait'])
+    try:
+        for attempt in range(50):
+            comms = {p.pid: p.info['name'] for p in psutil.process_iter(attrs=['name'])}
+            pids = proc.find_pids(comms, name='sleep', pattern=r'31\.4159', proc_path='/nonexistent')
+            if pids:
+                break
+            time.sleep(.1)
+        assert len(pids) == 1
+        assert psutil.Process(pids[0]).ppid() == shell.pid
+        assert proc.read_process_stat(pids[0], proc_path='/nonexistent').ppid == shell.pid
+        assert os.getpid() in proc.get_ancestors(proc_path='/nonexistent')
+    finally:
+        for child in psutil.Process(shell.pid).children():
+            child.kill()
+        shell.wait()
+
+
+def test_iter_open_files():
+    read_fd, write_fd = os.pipe()
+    try:
+        with tempfile.NamedTemporaryFile() as f, tempfile.NamedTemporaryFile(delete=False) as deleted:
+            os.unlink(deleted.name)
+            open_files = list(proc.iter_open_files(os.getpid()))
+            assert f.name in open_files
+            assert deleted.name not in open_files
+            assert not [path for path in open_files if path.startswith('pipe:')]
+            assert len(open_files) == len(set(open_files))
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+
+def test_iter_open_files_without_proc():
+    with tempfile.NamedTemporaryFile() as f:
+        assert f.name in list(proc.iter_open_files(os.getpid(), proc_path='/nonexistent'))
+    with pytest.raises(FileNotFoundError):
+        list(proc.iter_open_files(2 ** 22 + 1, proc_path='/nonexistent'))
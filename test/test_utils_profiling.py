@@ -0,0 +1,80 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+import os
+import sys
+import pstats
+import logging
+import tempfile
+
+from fossor.engine import Fossor
+from fossor.checks.check import Check
+from fossor.utils import profiling
+
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+log = logging.getLogger(__name__)
+
+
+class ProfiledCheck(Check):
+    def run(self, variables):
+        self.data = [str(i) for i in range(10000)]
+        return 'profiled'
+
+
+class UnprofiledCheck(Check):
+    def run(self, variables):
+        return 'not profiled'
+
+
+def test_get_selection():
+    assert profiling.get_selection(None) == set()
+    assert profiling.get_selection(True) == {'all'}
+    assert profiling.get_selection('LoadAvg, MemUsage') == {'loadavg', 'memusage'}
+    assert profiling.get_selection(['LoadAvg']) == {'loadavg'}
+    assert profiling.should_profile('LoadAvg', {'profile': ['all']})
+    assert profiling.should_profile('LoadAvg', {'profile': 'loadavg'})
+    assert not profiling.should_profile('MemUsage', {'profile': 'loadavg'})
+    assert profiling.should_profile('LoadAvg', {'profile': False, 'profile_plugins': ['LoadAvg']})
+    assert profiling.should_profile('LoadAvg', {'profile': True, 'profile_plugins': None})
+    assert profiling.get_profiled({'profile': False, 'profile_plugins': None}) == set()
+
+
+def test_profile_plugins():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        f = Fossor()
+        f.check_plugins = [ProfiledCheck, UnprofiledCheck]
+        f.variable_plugins = set()
+        result = f.run(report='DictObject', profile='profiledcheck', profile_memory=True, profile_dir=tmpdir)
+
+        name = ProfiledCheck.get_full_name()
+        pstats_path = os.path.join(tmpdir, name + '.pstats')
+        allocations_path = os.path.join(tmpdir, name + '.allocations.txt')
+        assert sorted(os.listdir(tmpdir)) == [name + '.allocations.txt', name + '.pstats']
+        assert pstats_path in result['Stats']
+        assert allocations_path in result['Stats']
+        functions = [function for filename, line, function in pstats.Stats(pstats_path).stats]
+        assert 'run_helper' in functions
+        with open(allocations_path) as allocations:
+            summary = allocations.read()
+        log.debug(summary)
+        assert 'test_utils_profiling.py' in summary
+        assert 'Peak traced memory' in summary
+
+
+def test_profile_dir_per_run():
+    '''Runs started within the same second, or by the same instance, each list only the profiles they wrote'''
+    with tempfile.TemporaryDirectory() as tmpdir:
+        runs = []
+        f = Fossor()
+        for fossor, profile in ((f, 'profiledcheck'), (Fossor(), 'unprofiledcheck'), (f, 'unprofiledcheck')):
+            fossor.check_plugins = [ProfiledCheck, UnprofiledCheck]
+            fossor.variable_plugins = set()
+            result = fossor.run(report='DictObject', profile=profile, state_dir=tmpdir)
+            runs.append((fossor.variables['profile_dir'], result['Stats']))
+
+        assert len({directory for directory, stats in runs}) == 3
+        for (directory, stats), Plugin in zip(runs, (ProfiledCheck, UnprofiledCheck, UnprofiledCheck)):
+            name = Plugin.get_full_name()
+            assert os.path.dirname(directory) == os.path.join(tmpdir, 'profiles')
+            assert os.listdir(directory) == [name + profiling.PSTATS_SUFFIX]
+            assert stats.endswith(os.path.join(directory, name + profiling.PSTATS_SUFFIX))
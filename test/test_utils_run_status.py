@@ -0,0 +1,51 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+import sys
+import time
+import logging
+
+from unittest.mock import patch
+
+from fossor.utils import run_status
+from fossor.utils.misc import StatusPrinter
+
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+log = logging.getLogger(__name__)
+
+
+def test_run_status():
+    status = run_status.RunStatus()
+    status.runner_started()
+    now = time.time()
+    status.publish('Slow', run_status.QUEUED, timestamp=now - 10)
+    status.publish('Fast', run_status.QUEUED, timestamp=now - 10)
+    status.publish('Done', run_status.QUEUED, timestamp=now - 10)
+    status.publish('Slow', run_status.STARTED, pid=100, timestamp=now - 9)
+    status.publish('Fast', run_status.STARTED, pid=101, timestamp=now - 2)
+    status.publish('Done', run_status.STARTED, pid=102, timestamp=now - 9)
+    status.publish('Done', run_status.FINISHED, pid=102, timestamp=now - 8)
+
+    status.join(timeout=1)  # Runner has not finished, so this waits for the timeout
+    assert [s.name for s in status.running()] == ['Slow', 'Fast']
+    assert status.plugins['Done'].elapsed() == 1
+    assert status.plugins['Slow'].pid == 100
+    assert len(status.events) == 7
+
+    with patch('time.time', return_value=now):
+        assert StatusPrinter(timeout=10, run_status=status).get_running_plugins() == 'Slow (9s), Fast (2s)'
+
+    status.publish('Slow', run_status.TIMED_OUT, pid=100)
+    status.publish('Fast', run_status.FINISHED, pid=101)
+    status.publish(None, run_status.RUNNER_FINISHED)
+    status.join()
+    assert status.running() == []
+    assert [s.name for s in status.with_state(run_status.TIMED_OUT)] == ['Slow']
+
+    # Queued again, e.g. variable plugins in the next round
+    status.runner_started()
+    status.publish('Done', run_status.QUEUED)
+    status.publish(None, run_status.RUNNER_FINISHED)
+    status.join()
+    assert status.plugins['Done'].started is None
+    assert status.plugins['Done'].elapsed() == 0
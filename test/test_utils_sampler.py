@@ -0,0 +1,34 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+import sys
+import time
+import logging
+
+from unittest.mock import patch
+
+from fossor.utils import sampler
+
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+log = logging.getLogger(__name__)
+
+
+def test_ring_buffer_size():
+    values = iter(range(10))
+    s = sampler.RingBufferSampler(function=lambda: next(values), size=3)
+    for i in range(5):
+        s.sample()
+    assert [value for timestamp, value in s.samples] == [2, 3, 4]
+
+
+def test_start_sampler():
+    with patch.dict(sampler.samplers, clear=True):
+        assert sampler.get_sampler('counter') is None
+        s = sampler.start_sampler('counter', function=time.time, interval=0.01)
+        try:
+            assert sampler.start_sampler('counter', function=time.time) is s
+            assert sampler.get_sampler('counter') is s
+            time.sleep(0.1)
+            assert len(s.samples) > 1
+        finally:
+            s.stop()
@@ -0,0 +1,117 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+import sys
+import time
+import asyncio
+import subprocess
+import psutil
+
+import pytest
+
+from fossor.checks.check import Check
+from fossor.utils import shell
+from fossor.utils.misc import run_coroutine
+
+# Writes more to stderr than a pipe holds before writing stdout, which blocks if stderr is not read
+CHATTY = [sys.executable, '-c', 'import sys; sys.stderr.write("e" * 1000000); print("first"); print("second"); sys.exit(3)']
+
+
+class ShellCheck(Check):
+    def run(self, variables):
+        pass
+
+
+def test_shell_call():
+    out, err, returncode = shell.shell_call(CHATTY, timeout=10)
+    assert out == 'first\nsecond\n'
+    assert len(err) == 1000000
+    assert returncode == 3
+
+    out, err, returncode = shell.shell_call('echo foo bar')
+    assert out == 'foo bar\n'
+    assert returncode == 0
+
+
+def test_shell_call_timeout():
+    start = time.time()
+    with pytest.raises(subprocess.TimeoutExpired):
+        shell.shell_call('sleep 30', timeout=.5)
+    assert time.time() - start < 5
+
+
+def test_shell_stream():
+    with shell.ShellStream(CHATTY, timeout=10) as stream:
+        assert stream.returncode is None
+        assert list(stream) == ['first\n', 'second\n']
+        assert stream.returncode == 3
+        assert len(stream.err) == 1000000
+
+    with shell.ShellStream([sys.executable, '-c', 'print("no newline", end="")']) as stream:
+        assert list(stream) == ['no newline']
+        assert stream.wait() == 0
+
+
+def test_shell_stream_timeout():
+    with shell.ShellStream([sys.executable, '-u', '-c', 'import time; print("started"); time.sleep(30)'], timeout=1) as stream:
+        lines = iter(stream)
+        assert next(lines) == 'started\n'
+        with pytest.raises(subprocess.TimeoutExpired):
+            next(lines)
+        assert stream.process.poll() is not None
+
+
+def test_shell_stream_stopped_early():
+    with shell.ShellStream('yes') as stream:
+        for line in stream:
+            break
+    assert stream.process.poll() is not None
+
+
+def test_shell_call_async():
+    async def run_all():
+        return await asyncio.gather(shell.shell_call_async(CHATTY), shell.shell_call_async('echo foo'))
+
+    (out, err, returncode), (out2, err2, returncode2) = run_coroutine(run_all())
+    assert out == 'first\nsecond\n'
+    assert returncode == 3
+    assert out2 == 'foo\n'
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        run_coroutine(shell.shell_call_async('sleep 30', timeout=.5))
+
+
+def test_shell_call_async_cancelled():
+    '''A cancelled call kills its command instead of leaving it running'''
+    async def cancel():
+        task = asyncio.ensure_future(shell.shell_call_async(['sleep', '31.4159']))
+        await asyncio.sleep(.5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    run_coroutine(cancel())
+    assert not [p for p in psutil.process_iter(attrs=['cmdline']) if p.info['cmdline'] == ['sleep', '31.4159']]
+
+
+def test_open_streams_timeout():
+    out, err, returncode = shell.open_streams('sleep 30', timeout=.5)
+    start = time.time()
+    assert out.read() == ''  # EOF once the command is killed
+    assert time.time() - start < 10
+    out.close()
+    err.close()
+
+
+def test_plugin_shell_call():
+    c = ShellCheck()
+    assert c.shell_call('echo foo') == ('foo\n', '', 0)
+    with c.shell_stream('echo foo') as stream:
+        assert list(stream) == ['foo\n']
+    out, err, returncode = c.shell_call('echo foo', stream=True)
+    assert returncode is None
+    assert out.read() == 'foo\n'
+    assert err.read() == ''
+    out.close()
+    err.close()
+    assert run_coroutine(c.shell_call_async('echo foo')) == ('foo\n', '', 0)
@@ -0,0 +1,79 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+import os
+import sys
+import time
+import pickle
+import logging
+
+import pytest
+
+from fossor.checks.check import Check
+from fossor.engine import Fossor
+from fossor.plugin import PluginResult
+from fossor.utils import shm
+
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+log = logging.getLogger(__name__)
+
+pytestmark = pytest.mark.skipif(shm.shared_memory is None or not os.path.isdir(shm.SHM_PATH), reason='Requires shared memory in /dev/shm')
+
+
+def get_segments(pid=None):
+    prefix = shm.segment_prefix(pid) if pid else shm.SEGMENT_PREFIX
+    return [name for name in os.listdir(shm.SHM_PATH) if name.startswith(prefix)]
+
+
+class BigCheck(Check):
+    def run(self, variables):
+        return 'big ' * shm.THRESHOLD
+
+
+class AbandonedCheck(Check):
+    def run(self, variables):
+        shm.pack('abandoned ' * shm.THRESHOLD)
+        time.sleep(30)
+
+
+def test_pack():
+    assert shm.pack('small') == 'small'
+    assert shm.pack(None) is None
+    text = 'é' * shm.THRESHOLD  # Large once encoded
+    payload = shm.pack(text)
+    assert isinstance(payload, shm.SharedPayload)
+    assert payload.name in get_segments(os.getpid())
+    assert shm.unpack(pickle.loads(pickle.dumps(payload))) == text
+    assert payload.name not in get_segments()
+    assert shm.unpack(payload) is None  # Already removed
+
+
+def test_pack_result():
+    result = shm.pack_result(PluginResult('BigCheck', 'x' * (shm.THRESHOLD + 1), duration=1, status=PluginResult.OK))
+    assert shm.payload_names(result) == {result.output.name}
+    result = shm.unpack_result(result)
+    assert result == ('BigCheck', 'x' * (shm.THRESHOLD + 1))
+    assert result.duration == 1
+    assert shm.unpack_result(('EOF', 'EOF')) == ('EOF', 'EOF')
+
+
+def test_remove_segments():
+    kept = shm.pack('x' * (shm.THRESHOLD + 1))
+    removed = shm.pack('y' * (shm.THRESHOLD + 1))
+    assert shm.remove_segments(os.getpid(), keep={kept.name}) == [removed.name]
+    assert get_segments(os.getpid()) == [kept.name]
+    shm.unpack(kept)
+
+
+def test_large_outputs_through_shared_memory():
+    f = Fossor()
+    f.check_plugins = [BigCheck, AbandonedCheck]
+    f.variable_plugins = set()
+    f.add_variable('timeout', 1)
+    result = f.run(report='DictObject')
+
+    assert result['BigCheck'] == 'big ' * shm.THRESHOLD
+    assert 'AbandonedCheck' not in result
+    assert f.run_status.plugins[AbandonedCheck.get_full_name()].state == 'timed_out'
+    assert not get_segments(f.run_status.plugins[AbandonedCheck.get_full_name()].pid)
+    assert not get_segments(f.run_status.plugins[BigCheck.get_full_name()].pid)
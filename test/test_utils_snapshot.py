@@ -0,0 +1,65 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+import sys
+import logging
+import pytest
+
+from unittest.mock import patch
+
+from fossor.utils import snapshot
+
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+log = logging.getLogger(__name__)
+
+
+def _counting_source():
+    _counting_source.calls += 1
+    return _counting_source.calls
+
+
+_counting_source.calls = 0
+
+
+def _failing_source():
+    raise PermissionError('Not allowed')
+
+
+def test_snapshot_is_memoised():
+    with patch.dict(snapshot.sources, {'counter': _counting_source}):
+        _counting_source.calls = 0
+        s = snapshot.Snapshot()
+        s.capture(['counter'])
+        assert _counting_source.calls == 1
+        assert s.get('counter') == 1
+        assert s.get('counter') == 1
+        assert _counting_source.calls == 1
+
+
+def test_snapshot_ttl():
+    with patch.dict(snapshot.sources, {'counter': _counting_source}):
+        _counting_source.calls = 0
+        s = snapshot.Snapshot(ttl=0)
+        s.capture(['counter'])
+        with patch('time.time', return_value=snapshot.time.time() + 1):
+            assert s.get('counter') == 2
+
+
+def test_snapshot_exceptions():
+    with patch.dict(snapshot.sources, {'failing': _failing_source}):
+        s = snapshot.Snapshot()
+        s.capture()  # Capturing should not raise, the exception is kept for whoever uses the source
+        with pytest.raises(PermissionError):
+            s.get('failing')
+    with pytest.raises(KeyError):
+        s.get('not-a-source')
+
+
+def test_snapshot_sources_are_read_only():
+    s = snapshot.Snapshot()
+    s.capture(['meminfo', 'loadavg'])
+    meminfo = s.get('meminfo')
+    assert 'MemTotal' in meminfo
+    with pytest.raises(TypeError):
+        meminfo['MemTotal'] = 0
+    assert len(s.get('loadavg')) == 3
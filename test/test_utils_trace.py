@@ -0,0 +1,61 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+import os
+import sys
+import json
+import time
+import logging
+import tempfile
+
+from fossor.engine import Fossor
+from fossor.checks.check import Check
+from fossor.variables.variable import Variable
+
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+log = logging.getLogger(__name__)
+
+
+class TraceVariable(Variable):
+    def run(self, variables):
+        return 'value'
+
+
+class TraceCheck(Check):
+    def run(self, variables):
+        return 'found'
+
+
+class SlowTraceCheck(Check):
+    def run(self, variables):
+        time.sleep(30)
+
+
+def test_trace():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'trace.json')
+        f = Fossor()
+        f.variable_plugins = {TraceVariable}
+        f.check_plugins = [TraceCheck, SlowTraceCheck]
+        f.run(report='DictObject', timeout=1, trace=path)
+        with open(path) as trace:
+            events = json.load(trace)['traceEvents']
+
+    engine_spans = [event['name'] for event in events if event.get('cat') == 'engine']
+    assert engine_spans == ['capture snapshots', 'variable round 1', 'variable round 2', 'get variables', 'start checks', 'report']
+
+    process_names = [event['args']['name'] for event in events if event['name'] == 'process_name']
+    assert process_names == ['fossor', 'Plugin-Runner 1', 'Plugin-Runner 2', 'Plugin-Runner 3']
+
+    # Plugin events carry the full plugin name, including the module
+    plugin_spans = {event['name'].rsplit('.', 1)[-1]: event for event in events if event.get('cat') == 'plugin'}
+    assert set(plugin_spans) == {'TraceVariable', 'TraceCheck', 'SlowTraceCheck'}
+    assert plugin_spans['TraceCheck']['args']['outcome'] == 'ok'
+    assert plugin_spans['SlowTraceCheck']['args']['state'] == 'timed_out'
+    assert plugin_spans['SlowTraceCheck']['dur'] >= 1000000
+
+    thread_names = {event['tid']: event['args']['name'].rsplit('.', 1)[-1] for event in events if event['name'] == 'thread_name'}
+    instants = [(thread_names[event['tid']], event['name'].rsplit('.', 1)[-1]) for event in events if event['ph'] == 'i']
+    assert ('TraceCheck', 'delivered') in instants
+    assert ('runner', 'SlowTraceCheck timed out') in instants
+    assert ('SlowTraceCheck', 'SIGTERM') in instants
@@ -0,0 +1,33 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+import os
+import tempfile
+
+from unittest.mock import patch
+from fossor.variables.logfiles import LogFiles, LogFileHistory
+
+
+def test_log_files():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_path = os.path.join(tmpdir, 'app.log')
+        with open(log_path, 'w') as log_file, open(os.path.join(tmpdir, 'app.json'), 'w'):
+            log_file.write('line\n')
+            log_file.flush()
+            with open(log_path + '.1', 'w') as rotated:
+                rotated.write('old line\n')
+            os.utime(log_path + '.1', (0, 0))
+
+            log_files = LogFiles().run({'Pid': os.getpid()})
+            assert log_files == [log_path]
+
+            history = LogFileHistory().run({'LogFiles': log_files})
+            assert [(log_file.path, log_file.size) for log_file in history] == [(log_path + '.1', 9), (log_path, 5)]
+
+    assert LogFiles().run({}) is None
+    assert LogFileHistory().run({}) is None
+
+
+@patch('fossor.variables.logfiles.iter_open_files', side_effect=PermissionError)
+def test_log_files_permission_denied(open_files_mock):
+    assert LogFiles().run({'Pid': 1}) is None
@@ -0,0 +1,30 @@
+# Copyright 2017 LinkedIn Corporation. All rights reserved. Licensed under the BSD-2 Clause license.
+# See LICENSE in the project root for license information.
+
+from unittest.mock import patch
+from fossor.variables.pid import Pid, Pids
+
+
+@patch('fossor.plugin.Plugin.snapshot')
+@patch('fossor.variables.pid.find_pids')
+def test_pids(find_mock, snapshot_mock):
+    comms = {100: 'java', 200: 'java'}
+    snapshot_mock.return_value = comms
+    find_mock.return_value = [200, 100]
+
+    assert Pids().run({}) is None
+    assert Pids().run({'Pid': 5}) == [5]
+    find_mock.assert_not_called()
+
+    assert Pids().run({'Product': 'java', 'PidSort': 'rss'}) == [200, 100]
+    find_mock.assert_called_with(comms, name='java', pattern=None, sort='rss')
+    assert Pid().run({'PidMatch': 'backend'}) == 200
+    find_mock.assert_called_with(comms, name=None, pattern='backend', sort='start_time')
+
+    # Pid uses Pids when it has already been found
+    find_mock.reset_mock()
+    assert Pid().run({'Product': 'java', 'Pids': [100]}) == 100
+    find_mock.assert_not_called()
+
+    find_mock.return_value = []
+    assert Pid().run({'Product': 'java'}) is None